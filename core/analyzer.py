@@ -2,42 +2,202 @@ from PyQt6.QtCore import QThread, pyqtSignal
 from androguard.core.bytecodes.apk import APK
 from androguard.core.bytecodes.dvm import DalvikVMFormat
 from androguard.core.analysis.analysis import Analysis
+from core.cache import file_sha256
+from core.incremental import fingerprint_classes
+from core.instrumentation import PhaseRecorder, profile_capture
+from core.parallel import parse_dex_parallel
+from contextlib import nullcontext
+import os
 import traceback
 
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+def create_xrefs(dx, on_class=None):
+    """Builds cross references class by class so callers can report progress.
+
+    Uses Analysis' per-class step and its private "xrefs created" flag as
+    found in androguard 3.3 (pinned in requirements.txt); falls back to a
+    single create_xref() call when the step is missing.
+    """
+    step = getattr(dx, "_create_xref", None)
+    if step is None:
+        dx.create_xref()
+        return
+    classes = [c for vm in dx.vms for c in vm.get_classes()]
+    total = len(classes)
+    for i, current_class in enumerate(classes):
+        step(current_class)
+        if on_class:
+            on_class(i + 1, total)
+    if hasattr(dx, "_Analysis__created_xrefs"):
+        dx._Analysis__created_xrefs = True
+
+
+def analyze_apk(apk_path, progress=None, structure_ready=None, parallel=False,
+                max_workers=None, recorder=None, check_cancelled=None, xrefs=True):
+    """Runs the full APK -> DEX -> Analysis -> XREF pipeline without any Qt objects.
+
+    progress(msg, percent) and structure_ready(apk, dex_files, dx) are optional
+    callbacks; recorder, if given, is a PhaseRecorder that receives timing and
+    memory figures for every phase and every DEX. check_cancelled() is called
+    between DEX files and between classes of the XREF pass and should raise
+    AnalysisCancelled to stop. xrefs=False skips the XREF pass, which is enough
+    for decompilation. Returns (apk, dex_files, dx).
+    """
+    progress = progress or (lambda msg, val: None)
+    check_cancelled = check_cancelled or (lambda: None)
+    recorder = recorder or PhaseRecorder(os.path.basename(apk_path), count_objects=False)
+
+    progress(f"Loading APK: {apk_path}...", 10)
+    with recorder.phase("load_apk", apk_size=os.path.getsize(apk_path)):
+        a = APK(apk_path)
+    check_cancelled()
+
+    progress("Parsing DEX files...", 30)
+    with recorder.phase("parse_dex", parallel=bool(parallel)):
+        all_dex = list(a.get_all_dex())
+        total_dex = len(all_dex)
+
+        if parallel and total_dex > 1:
+            dex_sizes = [len(d) for d in all_dex]
+
+            def on_parsed(done, total, index, metrics):
+                recorder.add({"phase": f"parse_dex:{index+1}", "dex_size": dex_sizes[index], **metrics})
+                progress(f"Parsed DEX {done}/{total} (parallel)...", 30 + int((done/total) * 20))
+            dex_files = parse_dex_parallel(all_dex, max_workers, on_parsed, check_cancelled)
+        else:
+            dex_files = []
+            for i, dex_data in enumerate(all_dex):
+                check_cancelled()
+                progress(f"Parsing DEX {i+1}/{total_dex}...", 30 + int((i/total_dex) * 20))
+                with recorder.phase(f"parse_dex:{i+1}", dex_size=len(dex_data)) as info:
+                    dex_files.append(DalvikVMFormat(dex_data))
+                    info["classes"] = len(dex_files[-1].get_classes())
+        del all_dex
+
+    progress("Initializing Analysis engine...", 60)
+    with recorder.phase("add_dex"):
+        dx = Analysis()
+        for i, d in enumerate(dex_files):
+            check_cancelled()
+            progress(f"Adding DEX {i+1} to Analysis...", 60 + int((i/total_dex) * 10))
+            with recorder.phase(f"add_dex:{i+1}"):
+                dx.add(d)
+
+    if structure_ready:
+        structure_ready(a, dex_files, dx)
+    if not xrefs:
+        return a, dex_files, dx
+
+    progress("Creating Cross-References (XREFs)...", 70)
+
+    def on_xref_class(done, total):
+        check_cancelled()
+        if done % 500 == 0 or done == total:
+            progress(f"Creating XREFs: {done}/{total} classes...", 70 + int((done/total) * 25))
+    with recorder.phase("create_xref"):
+        create_xrefs(dx, on_xref_class)
+
+    return a, dex_files, dx
+
+
 class AnalysisThread(QThread):
+    # Emitted once DEX files are parsed and added, before XREFs are built
+    structure_ready = pyqtSignal(object, object, object)
     finished = pyqtSignal(object, object, object)
     progress = pyqtSignal(str, int)
+    metrics = pyqtSignal(dict)
     error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    # ClassChanges against the previous version, emitted before finished in incremental mode
+    class_changes = pyqtSignal(object)
+
+    # Pickling/unpickling androguard objects recurses deeply, give it room
+    STACK_SIZE = 256 * 1024 * 1024
 
-    def __init__(self, apk_path):
+    def __init__(self, apk_path, cache=None, parallel=False, max_workers=None, profile_dir=None,
+                 artifacts=None):
         super().__init__()
         self.apk_path = apk_path
+        self.cache = cache
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self.profile_dir = profile_dir
+        self.artifacts = artifacts
+        self.apk_hash = None
+        self.cache_key = None
+        self.recorder = PhaseRecorder(os.path.basename(apk_path), on_record=self.metrics.emit)
+        if cache is not None or parallel:
+            self.setStackSize(self.STACK_SIZE)
 
     def run(self):
         try:
-            self.progress.emit(f"Loading APK: {self.apk_path}...", 10)
-            a = APK(self.apk_path)
-            
-            self.progress.emit("Parsing DEX files...", 30)
-            dex_files = []
-            all_dex = list(a.get_all_dex())
-            total_dex = len(all_dex)
-            
-            for i, dex_data in enumerate(all_dex):
-                self.progress.emit(f"Parsing DEX {i+1}/{total_dex}...", 30 + int((i/total_dex) * 20))
-                dex_files.append(DalvikVMFormat(dex_data))
-            
-            self.progress.emit("Initializing Analysis engine...", 60)
-            dx = Analysis()
-            for i, d in enumerate(dex_files):
-                self.progress.emit(f"Adding DEX {i+1} to Analysis...", 60 + int((i/total_dex) * 10))
-                dx.add(d)
-            
-            self.progress.emit("Creating Cross-References (XREFs)...", 80)
-            dx.create_xref()
-            
-            self.progress.emit("Analysis finished. building UI...", 100)
-            self.finished.emit(a, dex_files, dx)
+            if self.profile_dir:
+                capture = profile_capture(self.profile_dir, os.path.basename(self.apk_path))
+            else:
+                capture = nullcontext()
+            with capture:
+                self.analyze()
+        except AnalysisCancelled:
+            # Leaving this frame drops the last references to the partial analysis
+            self.cancelled.emit()
         except Exception as e:
             traceback.print_exc()
-            self.error.emit(str(e))
\ No newline at end of file
+            self.error.emit(str(e))
+
+    def cancel(self):
+        self.requestInterruption()
+
+    def check_cancelled(self):
+        if self.isInterruptionRequested():
+            raise AnalysisCancelled()
+
+    def analyze(self):
+        recorder = self.recorder
+        cache_key = None
+        self.progress.emit("Hashing APK...", 5)
+        with recorder.phase("hash_apk"):
+            self.apk_hash = file_sha256(self.apk_path)
+        if self.cache is not None:
+            cache_key = self.cache_key = self.cache.key_for(self.apk_path, self.apk_hash)
+            if self.cache.contains(cache_key):
+                self.progress.emit("Loading cached analysis...", 50)
+                with recorder.phase("cache_load"):
+                    cached = self.cache.load(cache_key)
+                self.check_cancelled()
+                if cached is not None:
+                    self.progress.emit("Loaded analysis from cache. building UI...", 100)
+                    self.structure_ready.emit(*cached)
+                    self.compare_classes(*cached)
+                    self.finished.emit(*cached)
+                    return
+
+        a, dex_files, dx = analyze_apk(self.apk_path, progress=self.progress.emit,
+                                       structure_ready=self.structure_ready.emit,
+                                       parallel=self.parallel, max_workers=self.max_workers,
+                                       recorder=recorder, check_cancelled=self.check_cancelled)
+        self.check_cancelled()
+
+        if cache_key is not None:
+            self.progress.emit("Writing analysis cache...", 95)
+            with recorder.phase("cache_store"):
+                self.cache.store(cache_key, a, dex_files, dx)
+
+        self.compare_classes(a, dex_files, dx)
+        self.progress.emit("Cross-References ready.", 100)
+        self.finished.emit(a, dex_files, dx)
+
+    def compare_classes(self, a, dex_files, dx):
+        if self.artifacts is None: return
+        self.progress.emit("Fingerprinting classes for incremental analysis...", 97)
+        with self.recorder.phase("class_digest") as info:
+            digests = fingerprint_classes(dex_files, self.artifacts, self.check_cancelled)
+            changes = self.artifacts.compare(a.get_package(), self.apk_hash, digests)
+            info["classes"] = len(digests)
+            info["changed"] = len(changes.modified) + len(changes.added)
+        if changes.has_previous:
+            self.progress.emit(f"Changes since previous version: {changes.summary()}", 99)
+        self.class_changes.emit(changes)
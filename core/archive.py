@@ -0,0 +1,106 @@
+import io
+import json
+import os
+import tarfile
+import zipfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_SUFFIXES = (".zip", ".tar.zst")
+# Fixed timestamp so the same APK always produces byte-identical archives
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+# Archive entry listing the classes that could not be exported, next to the sources
+FAILURES_ENTRY = "export-failures.json"
+
+
+def is_archive_path(path):
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def entry_name(class_name):
+    """Lcom/a/B; -> com/a/B.java"""
+    return class_name[1:-1] + ".java"
+
+
+class SourceArchiveWriter:
+    """Streams decompiled sources into a .zip or .tar.zst archive.
+
+    Entries are written as they are added through a large write buffer, so
+    only the current class is ever held in memory. Callers add classes in a
+    deterministic (sorted) order. With index=True, a <archive>.index.json
+    sidecar maps each class name to the byte offset of its entry header: in
+    the .zip file itself, or in the decompressed tar stream for .tar.zst.
+    Classes that failed are listed in a FAILURES_ENTRY entry at the end.
+    """
+
+    BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, path, index=False, compress_level=6):
+        self.path = path
+        self.index = {} if index else None
+        self.compress_level = compress_level
+        self.format = "zip" if path.lower().endswith(".zip") else "tar.zst"
+        if self.format == "tar.zst" and zstandard is None:
+            raise RuntimeError("Exporting to .tar.zst requires the 'zstandard' package")
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self.tmp_path = path + ".part"
+        self._raw = open(self.tmp_path, "wb")
+        self._buffered = io.BufferedWriter(self._raw, self.BUFFER_SIZE)
+        if self.format == "zip":
+            self._zstd = None
+            self._archive = zipfile.ZipFile(self._buffered, "w", zipfile.ZIP_DEFLATED, compresslevel=compress_level)
+        else:
+            self._zstd = zstandard.ZstdCompressor(level=compress_level).stream_writer(self._buffered, closefd=False)
+            self._archive = tarfile.open(fileobj=self._zstd, mode="w|", format=tarfile.PAX_FORMAT)
+
+    def add(self, class_name, source):
+        name = entry_name(class_name)
+        offset, size = self._write(name, source.encode("utf-8"))
+        if self.index is not None:
+            self.index[class_name] = {"entry": name, "offset": offset, "size": size}
+
+    def _write(self, name, data):
+        if self.format == "zip":
+            info = zipfile.ZipInfo(name, ZIP_EPOCH)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            # writestr() ignores the archive's compresslevel for a ZipInfo
+            self._archive.writestr(info, data, compresslevel=self.compress_level)
+            offset = info.header_offset
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o644
+            offset = self._archive.offset
+            self._archive.addfile(info, io.BytesIO(data))
+        return offset, len(data)
+
+    def close(self, keep=True, failures=None):
+        """Finishes the archive; keep=False discards it (e.g. after a cancel or an error).
+
+        failures maps class names to their error and is written as FAILURES_ENTRY.
+        """
+        try:
+            if keep and failures:
+                self._write(FAILURES_ENTRY, json.dumps(failures, indent=1, sort_keys=True).encode("utf-8"))
+            self._archive.close()
+            if self._zstd is not None:
+                self._zstd.close()
+            self._buffered.close()
+        except BaseException:
+            keep = False
+            raise
+        finally:
+            if not keep:
+                self._raw.close()
+                if os.path.exists(self.tmp_path):
+                    os.remove(self.tmp_path)
+        if not keep: return
+        os.replace(self.tmp_path, self.path)
+        if self.index is not None:
+            with open(self.path + ".index.json", "w") as f:
+                json.dump({"format": self.format, "classes": self.index}, f, indent=1, sort_keys=True)
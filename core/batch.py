@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from collections import Counter
+from multiprocessing.connection import wait
+
+logger = logging.getLogger("Batch")
+
+PHASES = ["load_apk", "parse_dex", "add_dex", "create_xref", "manifest", "certificates", "scan"]
+
+
+def find_apks(path):
+    """Returns every .apk under path (or [path] if it is a single file), sorted."""
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.lower().endswith(".apk"):
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+
+def report_path(out_dir, apk_path):
+    # Disambiguate identically named APKs coming from different directories
+    digest = hashlib.sha1(os.path.abspath(apk_path).encode()).hexdigest()[:8]
+    name = os.path.splitext(os.path.basename(apk_path))[0]
+    return os.path.join(out_dir, f"{name}-{digest}.json")
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def build_report(apk_path):
+    """Analyzes one APK and returns its JSON report. Never touches any widget."""
+    from core.analyzer import analyze_apk
+    from core.cache import file_sha256
+    from core.instrumentation import PhaseRecorder
+    from core.report import certificate_info, manifest_info
+    from core.rules import load_ruleset, scan
+
+    recorder = PhaseRecorder(os.path.basename(apk_path), count_objects=False)
+    a, dex_files, dx = analyze_apk(apk_path, recorder=recorder)
+
+    with recorder.phase("manifest"):
+        manifest = manifest_info(a)
+
+    with recorder.phase("certificates"):
+        try:
+            certificates = certificate_info(a)
+        except Exception as e:
+            certificates = {"error": str(e)}
+
+    with recorder.phase("scan"):
+        hotspots = [finding.to_dict() for finding in scan(dx, load_ruleset(), a)]
+
+    return {
+        "apk": os.path.abspath(apk_path),
+        "sha256": file_sha256(apk_path),
+        "status": "ok",
+        "dex_count": len(dex_files),
+        "class_count": sum(1 for _ in dx.get_classes()),
+        "manifest": manifest,
+        "certificates": certificates,
+        "hotspot_counts": dict(Counter(h["category"] for h in hotspots)),
+        "hotspots": hotspots,
+        "timings": recorder.timings,
+        "metrics": recorder.records,
+    }
+
+
+def limit_memory(memory_limit_mb):
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+    except ImportError:
+        return
+    limit = memory_limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker(apk_path, out_path, memory_limit_mb, conn):
+    # Runs in a child process; only a small status dict goes back over the pipe
+    try:
+        limit_memory(memory_limit_mb)
+        report = build_report(apk_path)
+        with open(out_path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        conn.send({"status": "ok", "timings": report["timings"]})
+    except MemoryError:
+        conn.send({"status": "memory_limit", "error": "Memory limit exceeded"})
+    except Exception as e:
+        conn.send({"status": "error", "error": str(e), "traceback": traceback.format_exc()})
+    finally:
+        conn.close()
+
+
+def _write_failure(out_path, apk_path, result):
+    with open(out_path, "w") as f:
+        json.dump({"apk": os.path.abspath(apk_path), **result}, f, indent=2)
+
+
+def run_batch(src, out_dir, jobs=None, timeout=600, memory_limit_mb=None, log=None):
+    """Analyzes every APK under src across a pool of worker processes.
+
+    Each APK gets its own process so a timeout or memory blowup only kills that
+    APK. Writes one JSON report per APK plus summary.json and returns the summary.
+    """
+    log = log or logger.info
+    apks = find_apks(src)
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    ctx = multiprocessing.get_context("spawn")
+
+    pending = list(apks)
+    running = {}  # sentinel -> (process, conn, apk_path, started)
+    results = {}
+    started_all = time.perf_counter()
+
+    def finish(sentinel, result):
+        proc, conn, apk_path, started = running.pop(sentinel)
+        conn.close()
+        proc.join()
+        result["wall_time"] = time.perf_counter() - started
+        results[apk_path] = result
+        if result["status"] != "ok":
+            _write_failure(report_path(out_dir, apk_path), apk_path, result)
+        log(f"[{len(results)}/{len(apks)}] {result['status']}: {apk_path} ({result['wall_time']:.1f}s)")
+
+    while pending or running:
+        while pending and len(running) < jobs:
+            apk_path = pending.pop(0)
+            recv_conn, send_conn = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_worker, args=(apk_path, report_path(out_dir, apk_path),
+                                                     memory_limit_mb, send_conn), daemon=True)
+            proc.start()
+            send_conn.close()
+            running[proc.sentinel] = (proc, recv_conn, apk_path, time.perf_counter())
+
+        ready = wait(list(running.keys()), timeout=0.5)
+        for sentinel in ready:
+            proc, conn, apk_path, _ = running[sentinel]
+            try:
+                result = conn.recv() if conn.poll() else None
+            except EOFError:
+                result = None
+            if result is None:
+                result = {"status": "crashed", "error": f"Worker exited with code {proc.exitcode}"}
+            finish(sentinel, result)
+
+        now = time.perf_counter()
+        for sentinel, (proc, conn, apk_path, started) in list(running.items()):
+            if timeout and now - started > timeout:
+                proc.terminate()
+                finish(sentinel, {"status": "timeout", "error": f"Exceeded {timeout}s"})
+
+    summary = summarize(results, time.perf_counter() - started_all)
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def summarize(results, elapsed):
+    statuses = Counter(r["status"] for r in results.values())
+    phases = {}
+    for phase in PHASES + ["wall_time"]:
+        if phase == "wall_time":
+            values = [r["wall_time"] for r in results.values() if r["status"] == "ok"]
+        else:
+            values = [r["timings"][phase] for r in results.values()
+                      if r["status"] == "ok" and phase in r.get("timings", {})]
+        if values:
+            phases[phase] = {"p50": percentile(values, 50), "p95": percentile(values, 95)}
+    return {
+        "total": len(results),
+        "statuses": dict(statuses),
+        "elapsed": elapsed,
+        "apks_per_min": (len(results) / elapsed * 60) if elapsed else 0.0,
+        "phases": phases,
+    }
@@ -0,0 +1,182 @@
+import fnmatch
+import re
+from array import array
+from bisect import bisect_right
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+
+class IndexCancelled(Exception):
+    pass
+
+
+def invoke_target(output):
+    """'v0, v1, Lcom/a/B;->m(I)V' -> 'Lcom/a/B;->m(I)V'"""
+    return output.rsplit(", ", 1)[-1]
+
+
+def glob_matcher(pattern, substring=True):
+    """Case-sensitive matcher for a glob; without wildcards, substring=True matches anywhere."""
+    if substring and not any(ch in pattern for ch in "*?["):
+        return lambda text: pattern in text
+    return re.compile(fnmatch.translate(pattern)).match
+
+
+class BytecodeIndex:
+    """Every instruction of every method, laid out for repeated opcode / operand / call queries.
+
+    Instructions are numbered in method order and stored as parallel arrays of
+    opcode ids, operand ids and byte offsets; a method's instructions are one
+    contiguous id range. Operand texts are interned, so an operand regex runs
+    once per distinct operand instead of once per instruction. Postings map each
+    opcode and each invoke target ('Lcom/a/B;->m(I)V') to instruction ids.
+    """
+
+    def __init__(self):
+        self.opcodes = []
+        self.opcode_ids = {}
+        self.operands = []
+        self.operand_ids = {}
+        self.ins_opcode = array("H")
+        self.ins_operand = array("I")
+        self.ins_offset = array("I")
+        self.methods = []
+        # First instruction id of every method, plus the total as a sentinel
+        self.method_starts = array("I")
+        self.by_opcode = []
+        self.by_target = {}
+
+    def __len__(self):
+        return len(self.ins_opcode)
+
+    def _intern(self, table, ids, text):
+        i = ids.get(text)
+        if i is None:
+            i = ids[text] = len(table)
+            table.append(text)
+        return i
+
+    def add_method(self, method):
+        code = method.get_code()
+        if not code: return
+        self.methods.append(method)
+        self.method_starts.append(len(self.ins_opcode))
+        offset = 0
+        for ins in code.get_bc().get_instructions():
+            name = ins.get_name()
+            output = str(ins.get_output())
+            op = self._intern(self.opcodes, self.opcode_ids, name)
+            if op == len(self.by_opcode):
+                self.by_opcode.append(array("I"))
+            ins_id = len(self.ins_opcode)
+            self.ins_opcode.append(op)
+            self.ins_operand.append(self._intern(self.operands, self.operand_ids, output))
+            self.ins_offset.append(offset)
+            self.by_opcode[op].append(ins_id)
+            if name.startswith("invoke"):
+                target = invoke_target(output)
+                posting = self.by_target.get(target)
+                if posting is None:
+                    posting = self.by_target[target] = array("I")
+                posting.append(ins_id)
+            offset += ins.get_length()
+
+    @classmethod
+    def build(cls, classes, check_cancelled=None):
+        index = cls()
+        for c in classes:
+            if check_cancelled: check_cancelled()
+            for m in c.get_methods():
+                index.add_method(m)
+        index.method_starts.append(len(index.ins_opcode))
+        # Operand lookups are only needed while building
+        index.operand_ids = None
+        return index
+
+    def method_of(self, ins_id):
+        return bisect_right(self.method_starts, ins_id) - 1
+
+    def match_opcodes(self, patterns):
+        """Opcode ids matching any of the comma-separated globs (invoke-*, const-string)."""
+        ids = set()
+        for pattern in patterns.split(","):
+            pattern = pattern.strip().lower()
+            if not pattern: continue
+            matcher = glob_matcher(pattern, substring=False)
+            ids.update(i for i, name in enumerate(self.opcodes) if matcher(name))
+        return ids
+
+    def target_hits(self, pattern):
+        """Instruction ids of invokes whose target matches the glob or substring."""
+        matcher = glob_matcher(pattern)
+        hits = array("I")
+        for target, posting in self.by_target.items():
+            if matcher(target):
+                hits.extend(posting)
+        return sorted(hits)
+
+    def search(self, opcodes="", operand=None, target="", check_cancelled=None):
+        """Yields matching instruction ids in method order.
+
+        opcodes and operand (a regex, searched case-insensitively) filter
+        instructions. With a target pattern, only methods invoking a matching
+        target are considered; in those that also have an instruction passing
+        the filters, the matching invoke sites are included.
+        """
+        if operand:
+            regex = re.compile(operand, re.IGNORECASE).search
+            operand_ok = {i for i, text in enumerate(self.operands) if regex(text)}
+        else:
+            operand_ok = None
+        opcode_ok = self.match_opcodes(opcodes) if opcodes.strip() else None
+
+        def passes(i):
+            if opcode_ok is not None and self.ins_opcode[i] not in opcode_ok: return False
+            return operand_ok is None or self.ins_operand[i] in operand_ok
+
+        if target.strip():
+            ordered_hits = self.target_hits(target.strip())
+            if opcode_ok is None and operand_ok is None:
+                yield from ordered_hits
+                return
+            hits = set(ordered_hits)
+            for n, m in enumerate(sorted({self.method_of(i) for i in ordered_hits})):
+                if check_cancelled and n % 1000 == 0: check_cancelled()
+                body = range(self.method_starts[m], self.method_starts[m + 1])
+                matched = [i for i in body if passes(i)]
+                if matched:
+                    yield from sorted(hits.intersection(body).union(matched))
+            return
+        if opcode_ok is not None:
+            candidates = sorted(i for op in opcode_ok for i in self.by_opcode[op])
+        else:
+            candidates = range(len(self.ins_opcode))
+
+        for n, i in enumerate(candidates):
+            if check_cancelled and n % 50000 == 0: check_cancelled()
+            if passes(i):
+                yield i
+
+    def entry(self, ins_id):
+        """(method, byte offset, opcode, operand text) of an instruction."""
+        return (self.methods[self.method_of(ins_id)], self.ins_offset[ins_id],
+                self.opcodes[self.ins_opcode[ins_id]], self.operands[self.ins_operand[ins_id]])
+
+
+class BytecodeIndexThread(QThread):
+    finished = pyqtSignal(object)
+
+    def __init__(self, classes):
+        super().__init__()
+        self.classes = classes
+
+    def check_cancelled(self):
+        if self.isInterruptionRequested():
+            raise IndexCancelled()
+
+    def run(self):
+        try:
+            index = BytecodeIndex.build(self.classes, self.check_cancelled)
+        except IndexCancelled:
+            return
+        self.finished.emit(index)
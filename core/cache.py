@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import zlib
+from contextlib import contextmanager
+
+try:
+    from androguard import __version__ as ANDROGUARD_VERSION
+except ImportError:
+    ANDROGUARD_VERSION = "unknown"
+
+logger = logging.getLogger("AnalysisCache")
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "androguard_gui")
+CACHE_FORMAT_VERSION = 1
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Returns the hex SHA-256 digest of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@contextmanager
+def deep_recursion(limit=50000):
+    # androguard object graphs are deeply nested, pickle needs the headroom
+    old = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old, limit))
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(old)
+
+
+class AnalysisCache:
+    """Content-addressed on-disk store of finished (APK, DEX list, Analysis) tuples.
+
+    Entries are keyed by the SHA-256 of the APK plus the androguard version and
+    evicted least-recently-used first once the directory exceeds max_bytes.
+    """
+
+    SUFFIX = ".agc"
+
+    def __init__(self, cache_dir=None, max_bytes=2 * 1024 ** 3, compress_level=1):
+        self.cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, "analysis")
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for(self, apk_path, apk_hash=None):
+        apk_hash = apk_hash or file_sha256(apk_path)
+        return f"{apk_hash}-{ANDROGUARD_VERSION}-v{CACHE_FORMAT_VERSION}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def contains(self, key):
+        return os.path.exists(self._path(key))
+
+    def load(self, key):
+        """Returns the cached (apk, dex_files, dx) tuple or None on a miss."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                blob = zlib.decompress(f.read())
+            with deep_recursion():
+                result = pickle.loads(blob)
+            # Touch the entry so eviction sees it as recently used
+            os.utime(path, None)
+            return result
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {key}: {e}")
+            self._remove(path)
+            return None
+
+    def store(self, key, apk, dex_files, dx):
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        try:
+            with deep_recursion():
+                blob = pickle.dumps((apk, dex_files, dx), protocol=pickle.HIGHEST_PROTOCOL)
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(blob, self.compress_level))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache entry {key}: {e}")
+            self._remove(tmp_path)
+            return False
+        self.evict()
+        return True
+
+    def entries(self):
+        """Returns (path, size, last_used) for every entry, oldest first."""
+        result = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            result.append((path, st.st_size, st.st_mtime))
+        return sorted(result, key=lambda e: e[2])
+
+    def total_size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        # Always keep the newest entry, even if it alone is over budget
+        for path, size, _ in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
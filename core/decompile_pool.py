@@ -0,0 +1,392 @@
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+logger = logging.getLogger("DecompilerPool")
+
+
+def load_analysis(apk_path, analysis_cache_dir=None, cache_key=None):
+    """Returns the Analysis of apk_path, from the analysis cache when possible.
+
+    Decompilation does not need XREFs, so a fresh analysis skips that phase.
+    """
+    from core.analyzer import analyze_apk
+    from core.cache import AnalysisCache
+    loaded = None
+    if analysis_cache_dir and cache_key:
+        loaded = AnalysisCache(analysis_cache_dir).load(cache_key)
+    if loaded is None:
+        loaded = analyze_apk(apk_path, xrefs=False)
+    return loaded[2]
+
+
+def _find_method(dx, class_name, method):
+    name, descriptor = method
+    ma = dx.get_method_analysis_by_name(class_name, name, descriptor)
+    if ma is None:
+        raise LookupError(f"{class_name}->{name}{descriptor} not found")
+    return ma.get_method()
+
+
+def smali_lines(method_obj):
+    code = method_obj.get_code()
+    if not code:
+        return []
+    return [f"{ins.get_name()} {ins.get_output()}" for ins in code.get_bc().get_instructions()]
+
+
+def _run_task(dx, kind, class_name, method):
+    from core.decompiler_cache import decompile
+    if kind == "class":
+        return decompile(dx.get_class_analysis(class_name).get_vm_class(), dx)
+    if kind == "grep":
+        from core.text_index import line_matcher, match_lines
+        # method carries (query, regex) for searches
+        source = decompile(dx.get_class_analysis(class_name).get_vm_class(), dx)
+        matcher = line_matcher(*method)
+        matches = [(line_no, snippet) for _, line_no, snippet in match_lines(class_name, source, matcher)]
+        return matches, source
+    method_obj = _find_method(dx, class_name, method)
+    if kind == "method":
+        return decompile(method_obj, dx, is_method=True)
+    return "\n".join(smali_lines(method_obj))
+
+
+def _worker_main(conn, apk_path, analysis_cache_dir, cache_key, memory_limit_mb):
+    # Runs in a child process; tasks and results travel as small tuples
+    from core.batch import limit_memory
+    try:
+        limit_memory(memory_limit_mb)
+        dx = load_analysis(apk_path, analysis_cache_dir, cache_key)
+    except BaseException as e:
+        conn.send(("init_failed", "error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", "ok", None))
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        task_id, kind, class_name, method = msg
+        try:
+            conn.send((task_id, "ok", _run_task(dx, kind, class_name, method)))
+        except MemoryError:
+            conn.send((task_id, "memory", "memory limit exceeded"))
+        except Exception as e:
+            conn.send((task_id, "error", f"{type(e).__name__}: {e}"))
+
+
+class PoolClosed(RuntimeError):
+    pass
+
+
+class _Task:
+    __slots__ = ("id", "kind", "class_name", "method", "methods", "timeout", "future", "parent", "started", "reason")
+
+    def __init__(self, kind, class_name, method=None, methods=None, timeout=None, future=None, parent=None):
+        self.id = None
+        self.kind = kind
+        self.class_name = class_name
+        self.method = method
+        self.methods = methods or []
+        self.timeout = timeout
+        self.future = future
+        # (group, index) when this task decompiles one method of a class retried per method
+        self.parent = parent
+        self.started = None
+        # Why a smali fallback task was needed
+        self.reason = None
+
+    @property
+    def label(self):
+        if self.method and self.kind != "grep":
+            return f"{self.class_name}->{self.method[0]}{self.method[1]}"
+        return self.class_name
+
+
+class _MethodGroup:
+    """Collects per-method results of a class whose whole-class decompilation failed."""
+
+    def __init__(self, task, reason):
+        self.task = task
+        self.reason = reason
+        self.parts = [None] * len(task.methods)
+        self.remaining = len(task.methods)
+
+
+class _Worker:
+    def __init__(self, proc, conn):
+        self.proc = proc
+        self.conn = conn
+        self.ready = False
+        self.task = None
+
+
+class DecompilerPool:
+    """Supervised worker processes that decompile classes of one APK.
+
+    Every task runs under a wall-clock timeout, and workers run under an
+    address-space limit. A class that times out, runs out of memory or fails
+    is retried method by method, and a method that fails falls back to its
+    smali listing. Each stall is reported through on_stall(message), so every
+    request finishes in bounded time. Workers are started lazily and restarted
+    after being killed.
+    """
+
+    def __init__(self, apk_path, workers=1, class_timeout=30, method_timeout=10, memory_limit_mb=None,
+                 analysis_cache_dir=None, cache_key=None, on_stall=None):
+        self.apk_path = apk_path
+        self.workers = max(1, workers)
+        self.class_timeout = class_timeout
+        self.method_timeout = method_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.analysis_cache_dir = analysis_cache_dir
+        # May be set once the analysis has been cached; used by workers started afterwards
+        self.cache_key = cache_key
+        self.on_stall = on_stall
+        self.stalls = []
+        self._ctx = multiprocessing.get_context("spawn")
+        self._ids = itertools.count()
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wake_recv, self._wake_send = self._ctx.Pipe(duplex=False)
+        self._pool = []
+        self._supervisor = None
+        self._closed = False
+
+    def submit(self, class_name, methods=(), method=None):
+        """Queues a class (or, with method=(name, descriptor), one method).
+
+        methods lists the (name, descriptor) pairs of the class for the
+        per-method retry. The returned Future resolves to (source, complete);
+        complete is False when part of the source is a fallback.
+        """
+        future = Future()
+        if method is not None:
+            task = _Task("method", class_name, method=method, timeout=self.method_timeout, future=future)
+        else:
+            task = _Task("class", class_name, methods=list(methods), timeout=self.class_timeout, future=future)
+        self._enqueue(task)
+        return future
+
+    def submit_search(self, class_name, query, regex=False):
+        """Queues decompiling a class and matching query against its lines in the worker.
+
+        The Future resolves to ((matches, source), True), matches being
+        [(line_no, snippet)], or to (error comment, False) if the class
+        stalled or failed; searches are not retried per method.
+        """
+        future = Future()
+        self._enqueue(_Task("grep", class_name, method=(query, regex), timeout=self.class_timeout, future=future))
+        return future
+
+    def resize(self, workers):
+        """Changes the number of workers; extra workers are started on demand and retired once idle."""
+        self.workers = max(1, workers)
+        self._wake()
+
+    def decompile(self, obj, dx, is_method=False):
+        """Blocking (source, complete) for a class or method object."""
+        if is_method:
+            future = self.submit(str(obj.get_class_name()), method=(str(obj.get_name()), str(obj.get_descriptor())))
+        else:
+            methods = [(str(m.get_name()), str(m.get_descriptor())) for m in obj.get_methods()]
+            future = self.submit(str(obj.get_name()), methods)
+        return future.result()
+
+    @property
+    def closed(self):
+        """True once closed, including by the supervisor giving up (e.g. workers that cannot start)."""
+        return self._closed
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._wake()
+        if self._supervisor is not None:
+            self._supervisor.join(5)
+
+    def _enqueue(self, task):
+        with self._lock:
+            if self._closed:
+                raise PoolClosed("Decompiler pool is closed")
+            task.id = next(self._ids)
+            self._queue.append(task)
+            if self._supervisor is None:
+                self._supervisor = threading.Thread(target=self._supervise, name="DecompilerPool", daemon=True)
+                self._supervisor.start()
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_send.send_bytes(b"")
+        except OSError:
+            pass
+
+    def _spawn(self):
+        recv_conn, send_conn = self._ctx.Pipe(duplex=True)
+        proc = self._ctx.Process(target=_worker_main, daemon=True,
+                                 args=(send_conn, self.apk_path, self.analysis_cache_dir, self.cache_key,
+                                       self.memory_limit_mb))
+        proc.start()
+        send_conn.close()
+        self._pool.append(_Worker(proc, recv_conn))
+
+    def _kill(self, worker):
+        self._pool.remove(worker)
+        worker.proc.terminate()
+        worker.proc.join(1)
+        worker.conn.close()
+
+    def _supervise(self):
+        try:
+            self._loop()
+        except Exception:
+            logger.error(traceback.format_exc())
+        finally:
+            with self._lock:
+                self._closed = True
+            orphans = []
+            for worker in list(self._pool):
+                if worker.task is not None:
+                    orphans.append(worker.task)
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+                self._kill(worker)
+            with self._lock:
+                orphans += list(self._queue)
+                self._queue.clear()
+            for task in orphans:
+                self._resolve(task, f"/* Decompiler pool closed before {task.label} was processed */", False)
+
+    def _loop(self):
+        init_failures = 0
+        while True:
+            with self._lock:
+                if self._closed: return
+                busy = sum(1 for w in self._pool if w.task is not None)
+                wanted = min(self.workers, busy + len(self._queue))
+            while len(self._pool) < wanted:
+                self._spawn()
+
+            # Retire idle workers beyond a reduced worker count
+            idle = [w for w in self._pool if w.ready and w.task is None]
+            while len(self._pool) > self.workers and idle:
+                self._kill(idle.pop())
+
+            for worker in self._pool:
+                if not worker.ready or worker.task is not None: continue
+                with self._lock:
+                    # Skip requests their caller gave up on
+                    while self._queue and self._queue[0].future is not None and self._queue[0].future.cancelled():
+                        self._queue.popleft()
+                    if not self._queue: break
+                    task = self._queue.popleft()
+                task.started = time.monotonic()
+                worker.task = task
+                worker.conn.send((task.id, task.kind, task.class_name, task.method))
+
+            sentinels = {w.proc.sentinel: w for w in self._pool}
+            wait([self._wake_recv] + [w.conn for w in self._pool] + list(sentinels), timeout=0.5)
+            while self._wake_recv.poll():
+                self._wake_recv.recv_bytes()
+
+            now = time.monotonic()
+            for worker in list(self._pool):
+                msg = None
+                try:
+                    if worker.conn.poll():
+                        msg = worker.conn.recv()
+                except (EOFError, OSError):
+                    msg = None
+                if msg is not None:
+                    task_id, status, payload = msg
+                    if task_id == "ready":
+                        worker.ready = True
+                        init_failures = 0
+                    elif task_id == "init_failed":
+                        self._kill(worker)
+                        init_failures += 1
+                        logger.error(f"Decompiler worker failed to load {self.apk_path}: {payload}")
+                        if init_failures >= 3:
+                            raise RuntimeError(payload)
+                    else:
+                        task, worker.task = worker.task, None
+                        if status == "ok":
+                            self._resolve(task, payload, True)
+                        else:
+                            if status == "memory":
+                                self._kill(worker)
+                            self._failed(task, status, payload, now)
+                elif not worker.proc.is_alive():
+                    task = worker.task
+                    self._kill(worker)
+                    if not worker.ready:
+                        # Died while loading the analysis (killed for memory, crashed unpickling, ...)
+                        init_failures += 1
+                        logger.error(f"Decompiler worker exited with code {worker.proc.exitcode} while loading "
+                                     f"{self.apk_path}")
+                        if init_failures >= 3:
+                            raise RuntimeError(f"workers keep exiting while loading {self.apk_path}")
+                    if task is not None:
+                        self._failed(task, "crashed", f"worker exited with code {worker.proc.exitcode}", now)
+                elif worker.task is not None and now - worker.task.started > worker.task.timeout:
+                    task = worker.task
+                    self._kill(worker)
+                    self._failed(task, "timeout", f"no result after {task.timeout}s", now)
+
+    def _failed(self, task, status, detail, now):
+        elapsed = now - task.started
+        if status != "error":
+            message = f"{task.kind} {task.label}: {status} ({detail}, {elapsed:.1f}s)"
+            self.stalls.append(message)
+            logger.warning(message)
+            if self.on_stall:
+                self.on_stall(message)
+        reason = f"{status}: {detail}"
+        if task.kind == "class" and task.methods:
+            group = _MethodGroup(task, reason)
+            with self._lock:
+                for i, method in enumerate(task.methods):
+                    sub = _Task("method", task.class_name, method=method, timeout=self.method_timeout,
+                                parent=(group, i))
+                    sub.id = next(self._ids)
+                    self._queue.append(sub)
+        elif task.kind == "method":
+            fallback = _Task("smali", task.class_name, method=task.method, timeout=self.method_timeout,
+                             future=task.future, parent=task.parent)
+            fallback.reason = reason
+            with self._lock:
+                fallback.id = next(self._ids)
+                self._queue.appendleft(fallback)
+        elif task.kind == "smali":
+            self._resolve(task, f"/* {task.label}: decompilation and smali rendering failed ({reason}) */", False)
+        else:
+            self._resolve(task, f"/* Decompilation of {task.label} failed ({reason}) */", False)
+
+    def _resolve(self, task, text, complete):
+        if task.kind == "smali" and complete:
+            body = "\n".join(f" *   {line}" for line in text.splitlines())
+            text = f"/* {task.method[0]}{task.method[1]}: decompilation {task.reason}, smali:\n{body}\n */"
+            complete = False
+        if task.parent is not None:
+            group, index = task.parent
+            group.parts[index] = (text, complete)
+            group.remaining -= 1
+            if group.remaining == 0:
+                source = "\n\n".join(part for part, _ in group.parts)
+                header = f"// {group.task.class_name}: whole-class decompilation {group.reason}; decompiled per method\n"
+                self._resolve(group.task, header + source, False)
+            return
+        if task.future is not None and not task.future.done():
+            task.future.set_result((text, complete))
@@ -0,0 +1,220 @@
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+
+from core.cache import ANDROGUARD_VERSION, DEFAULT_CACHE_DIR
+from core.decompile_pool import PoolClosed
+from core.incremental import SOURCE_KIND
+
+logger = logging.getLogger("DecompileCache")
+
+
+def source_name(obj, is_method=False):
+    """Cache key of a class ('Lcom/a/B;') or method ('Lcom/a/B;->m(I)V')."""
+    if is_method:
+        return f"{obj.get_class_name()}->{obj.get_name()}{obj.get_descriptor()}"
+    return str(obj.get_name())
+
+
+def decompile(obj, dx, is_method=False):
+    from androguard.decompiler.dad.decompile import DvClass, DvMethod
+    dv = DvMethod(obj, dx) if is_method else DvClass(obj, dx)
+    dv.process()
+    return dv.get_source()
+
+
+class DecompileCache:
+    """Decompiled source shared by the code editor, full-text search and exporter.
+
+    Sources are keyed by (APK SHA-256, class or method name) and kept in a
+    bounded in-memory LRU backed by an optional SQLite store, so a class is
+    decompiled at most once per APK no matter which view asks for it first.
+    With an incremental artifact store, class sources are also looked up by
+    class digest to reuse them across versions of the same package.
+
+    backends maps an APK hash to a DecompilerPool that decompiles out of
+    process. Partial (fallback) sources it returns are kept apart in memory:
+    get() and cached_names() never return them, and only source_complete()
+    tells them from complete ones.
+    listeners are called as listener(apk_hash, name, source) for every newly
+    decompiled source, e.g. to keep a search index up to date.
+    """
+
+    FLUSH_EVERY = 64
+    # Fallback sources kept so a stalling class is not waited on again every time it is opened
+    MAX_FALLBACKS = 256
+
+    def __init__(self, cache_dir=None, max_bytes=64 * 1024 * 1024, persist=True, artifacts=None):
+        self.max_bytes = max_bytes
+        self.artifacts = artifacts
+        self.backends = {}
+        self.listeners = []
+        self.path = os.path.join(cache_dir or DEFAULT_CACHE_DIR, "sources.sqlite") if persist else None
+        self._lru = OrderedDict()
+        self._lru_bytes = 0
+        self._fallbacks = OrderedDict()
+        self._pending = []
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.hits = self.disk_hits = self.decompilations = 0
+        if self.path:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._conn() as conn:
+                conn.execute("""CREATE TABLE IF NOT EXISTS sources (
+                    apk_hash TEXT, name TEXT, version TEXT, data BLOB,
+                    PRIMARY KEY (apk_hash, name, version))""")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, source):
+        with self._lock:
+            old = self._lru.pop(key, None)
+            if old is not None:
+                self._lru_bytes -= len(old)
+            self._lru[key] = source
+            self._lru_bytes += len(source)
+            while self._lru_bytes > self.max_bytes and len(self._lru) > 1:
+                _, evicted = self._lru.popitem(last=False)
+                self._lru_bytes -= len(evicted)
+
+    def get(self, apk_hash, name):
+        """Returns the cached source or None without decompiling."""
+        key = (apk_hash, name)
+        with self._lock:
+            source = self._lru.get(key)
+            if source is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return source
+            for pending_key, pending_source in self._pending:
+                if pending_key == key:
+                    self._remember(key, pending_source)
+                    return pending_source
+        if not self.path: return None
+        row = self._conn().execute("SELECT data FROM sources WHERE apk_hash=? AND name=? AND version=?",
+                                   (apk_hash, name, ANDROGUARD_VERSION)).fetchone()
+        if row is None: return None
+        source = zlib.decompress(row[0]).decode()
+        self._remember(key, source)
+        with self._lock:
+            self.disk_hits += 1
+        return source
+
+    def cached_names(self, apk_hash, names):
+        """Returns the subset of names with a cached source, without loading them."""
+        wanted = set(names)
+        with self._lock:
+            found = {name for name in names if (apk_hash, name) in self._lru}
+            found.update(name for (h, name), _ in self._pending if h == apk_hash and name in wanted)
+        if not self.path: return found
+        names = [n for n in names if n not in found]
+        conn = self._conn()
+        for i in range(0, len(names), 500):
+            chunk = names[i:i+500]
+            rows = conn.execute(f"SELECT name FROM sources WHERE apk_hash=? AND version=? AND name IN ({','.join('?' * len(chunk))})",
+                                [apk_hash, ANDROGUARD_VERSION] + chunk)
+            found.update(name for (name,) in rows)
+        return found
+
+    def _notify(self, apk_hash, name, source):
+        for listener in self.listeners:
+            listener(apk_hash, name, source)
+
+    def put(self, apk_hash, name, source):
+        key = (apk_hash, name)
+        self._remember(key, source)
+        self._notify(apk_hash, name, source)
+        if not self.path: return
+        with self._lock:
+            self._pending.append((key, source))
+            if len(self._pending) < self.FLUSH_EVERY: return
+        self.flush()
+
+    def flush(self):
+        """Writes buffered sources to disk in one transaction."""
+        if not self.path: return
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending: return
+        rows = [(apk_hash, name, ANDROGUARD_VERSION, zlib.compress(source.encode(), 1))
+                for (apk_hash, name), source in pending]
+        try:
+            with self._conn() as conn:
+                conn.executemany("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist decompiled sources: {e}")
+
+    def source(self, apk_hash, obj, dx, is_method=False, digest=None):
+        """Returns the source of a class or method, decompiling it only on a miss."""
+        return self.source_complete(apk_hash, obj, dx, is_method, digest)[0]
+
+    def source_complete(self, apk_hash, obj, dx, is_method=False, digest=None):
+        """(source, complete) of a class or method; complete is False for a pool fallback (smali or an error)."""
+        if not apk_hash:
+            return decompile(obj, dx, is_method), True
+        name = source_name(obj, is_method)
+        source = self.get(apk_hash, name)
+        if source is not None:
+            return source, True
+        with self._lock:
+            source = self._fallbacks.get((apk_hash, name))
+        if source is not None:
+            return source, False
+        artifacts = self.artifacts if digest and not is_method else None
+        if artifacts is not None:
+            source = artifacts.get(digest, SOURCE_KIND)
+            if source is not None:
+                self.put(apk_hash, name, source)
+                return source, True
+        source = complete = None
+        backend = self.backends.get(apk_hash)
+        if backend is not None and not backend.closed:
+            try:
+                source, complete = backend.decompile(obj, dx, is_method)
+            except PoolClosed:
+                pass
+        if backend is not None and backend.closed:
+            # The pool shut down, e.g. its workers kept dying while loading: decompile here from now on.
+            # What it returned meanwhile is only its "pool closed" placeholder
+            source = None
+            if self.backends.get(apk_hash) is backend:
+                del self.backends[apk_hash]
+                logger.warning(f"Decompiler pool for {apk_hash[:12]} closed, decompiling in-process")
+        if source is None:
+            source, complete = decompile(obj, dx, is_method), True
+        with self._lock:
+            self.decompilations += 1
+        if not complete:
+            # Fallback sources are neither persisted nor passed to listeners (e.g. the persisted text index)
+            with self._lock:
+                self._fallbacks[(apk_hash, name)] = source
+                while len(self._fallbacks) > self.MAX_FALLBACKS:
+                    self._fallbacks.popitem(last=False)
+            return source, False
+        self.put(apk_hash, name, source)
+        if artifacts is not None:
+            artifacts.put(digest, SOURCE_KIND, source)
+        return source, True
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._lru_bytes = 0
+            self._fallbacks.clear()
+            self._pending = []
+        if self.path:
+            with self._conn() as conn:
+                conn.execute("DELETE FROM sources")
+
+    def stats(self):
+        return {"entries": len(self._lru), "bytes": self._lru_bytes, "hits": self.hits,
+                "disk_hits": self.disk_hits, "decompilations": self.decompilations}
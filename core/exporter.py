@@ -1,35 +1,303 @@
 from PyQt6.QtCore import QThread, pyqtSignal
-from androguard.decompiler.dad.decompile import DvClass
+from core.archive import SourceArchiveWriter, is_archive_path
+from core.decompile_pool import DecompilerPool
+from core.decompiler_cache import decompile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+import json
 import os
+import time
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def write_class_source(out_dir, name, source):
+    """Writes Lcom/a/B; as <out_dir>/com/a/B.java."""
+    path = os.path.join(out_dir, name[1:-1] + ".java")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(source)
+
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+
+class ExportManifest:
+    """Append-only JSON-lines log of exported classes inside the export directory.
+
+    An interrupted export re-reads it and only exports classes that have not
+    been written successfully yet; classes written with a partial (fallback)
+    source are retried too. A manifest written for a different APK is
+    discarded.
+    """
+
+    FILENAME = ".export-manifest.jsonl"
+
+    def __init__(self, out_dir, apk_hash):
+        self.path = os.path.join(out_dir, self.FILENAME)
+        self.apk_hash = apk_hash
+        self.completed = set()
+        self.failed = {}
+        if self._read():
+            self._file = open(self.path, "a")
+        else:
+            self._file = open(self.path, "w")
+            self._write({"apk_hash": apk_hash})
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path) as f:
+                header = json.loads(f.readline() or "{}")
+                if not self.apk_hash or header.get("apk_hash") != self.apk_hash:
+                    return False
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of an interrupted run
+                    if entry.get("error"):
+                        self.failed[entry["class"]] = entry["error"]
+                    elif entry.get("partial"):
+                        self.completed.discard(entry["class"])
+                        self.failed.pop(entry["class"], None)
+                    else:
+                        self.completed.add(entry["class"])
+                        self.failed.pop(entry["class"], None)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + "\n")
+
+    def record(self, results):
+        """Logs [(class_name, error or None, complete)] and flushes them to disk."""
+        for name, error, complete in results:
+            if error:
+                self.failed[name] = error
+                self._write({"class": name, "error": error})
+            elif not complete:
+                self.completed.discard(name)
+                self.failed.pop(name, None)
+                self._write({"class": name, "partial": True})
+            else:
+                self.completed.add(name)
+                self.failed.pop(name, None)
+                self._write({"class": name})
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
 
 class ExportThread(QThread):
-    progress = pyqtSignal(str)
-    finished = pyqtSignal()
+    # done, total, status text with throughput and ETA
+    progress = pyqtSignal(int, int, str)
+    # A class or method that timed out or crashed its worker
+    stalled = pyqtSignal(str)
+    # {"total", "exported", "resumed", "failed", "partial", "stalled", "elapsed", "cancelled", "output"}
+    finished = pyqtSignal(dict)
+
+    # Below this many classes, starting worker processes costs more than it saves
+    PARALLEL_MIN_CLASSES = 500
 
-    def __init__(self, dx, out_dir):
+    def __init__(self, dx, out_path, decompiler=None, apk_hash=None, apk_path=None, max_workers=None,
+                 analysis_cache=None, cache_key=None, class_timeout=30, method_timeout=10, memory_limit_mb=None,
+                 index=False):
         super().__init__()
         self.dx = dx
-        self.out_dir = out_dir
+        # A directory, or a .zip / .tar.zst file to stream into
+        self.out_path = out_path
+        self.decompiler = decompiler
+        self.apk_hash = apk_hash
+        self.apk_path = apk_path
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.analysis_cache = analysis_cache
+        self.cache_key = cache_key
+        self.class_timeout = class_timeout
+        self.method_timeout = method_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.index = index
+
+    def cancel(self):
+        self.requestInterruption()
+
+    def check_cancelled(self):
+        if self.isInterruptionRequested():
+            raise ExportCancelled()
 
     def run(self):
-        classes = list(self.dx.get_classes())
-        for c_analysis in classes:
-            try:
-                cls = c_analysis.get_vm_class()
-                name = cls.get_name()[1:-1]
-                self.progress.emit(name)
-                
-                parts = name.split('/')
-                package_dir = os.path.join(self.out_dir, *parts[:-1])
-                os.makedirs(package_dir, exist_ok=True)
-                
-                dv = DvClass(cls, self.dx)
-                dv.process()
-                
-                file_path = os.path.join(self.out_dir, name + ".java")
-                with open(file_path, "w") as f:
-                    f.write(dv.get_source())
-            except Exception as e:
-                print(f"Error exporting {name}: {e}")
-                
-        self.finished.emit()
+        started = time.perf_counter()
+        names = sorted(str(c.name) for c in self.dx.get_classes() if not c.is_external())
+        archive = manifest = None
+        if is_archive_path(self.out_path):
+            # Archives are rewritten from scratch in sorted order; only directory exports resume
+            archive = SourceArchiveWriter(self.out_path, index=self.index)
+            todo = names
+        else:
+            os.makedirs(self.out_path, exist_ok=True)
+            manifest = ExportManifest(self.out_path, self.apk_hash)
+            todo = [n for n in names if n not in manifest.completed]
+        resumed = len(names) - len(todo)
+        failed = dict(manifest.failed) if manifest else {}
+        state = {"done": resumed, "exported": 0, "partial": 0, "stalled": 0, "last_emit": 0.0}
+        total = len(names)
+
+        def on_result(name, error, complete):
+            if manifest:
+                manifest.record([(name, error, complete)])
+            state["done"] += 1
+            if error:
+                failed[name] = error
+            else:
+                state["exported"] += 1
+                failed.pop(name, None)
+            now = time.perf_counter()
+            if now - state["last_emit"] < 0.2 and state["done"] < total: return
+            state["last_emit"] = now
+            rate = (state["done"] - resumed) / max(now - started, 1e-6)
+            eta = format_eta((total - state["done"]) / rate) if rate else "?"
+            failures = f", {len(failed)} failed" if failed else ""
+            self.progress.emit(state["done"], total,
+                               f"{state['done']}/{total} classes, {rate:.1f} classes/s, ETA {eta}{failures}")
+
+        cancelled = finished = False
+        try:
+            for name, source, error, complete in self.iter_sources(todo, state, ordered=archive is not None):
+                if error is None:
+                    try:
+                        if archive is not None:
+                            archive.add(name, source)
+                        else:
+                            write_class_source(self.out_path, name, source)
+                    except OSError as e:
+                        error = f"{type(e).__name__}: {e}"
+                on_result(name, error, complete)
+            finished = True
+        except ExportCancelled:
+            cancelled = True
+        finally:
+            if manifest:
+                manifest.close()
+            if archive is not None:
+                # Also discards the .part file when the export failed
+                archive.close(keep=finished, failures=failed)
+            if self.decompiler is not None:
+                self.decompiler.flush()
+
+        self.finished.emit({
+            "total": total,
+            "exported": state["exported"],
+            "resumed": resumed,
+            "failed": len(failed),
+            "partial": state["partial"],
+            "stalled": state["stalled"],
+            "elapsed": time.perf_counter() - started,
+            "cancelled": cancelled,
+            "output": manifest.path if manifest else self.out_path,
+        })
+
+    def use_processes(self, count):
+        return self.max_workers > 1 and self.apk_path is not None and count >= self.PARALLEL_MIN_CLASSES
+
+    def cached(self, name):
+        if self.decompiler is None or not self.apk_hash:
+            return None
+        return self.decompiler.get(self.apk_hash, name)
+
+    def iter_sources(self, names, state, ordered):
+        """Yields (name, source, error, complete) for every name; complete is False for fallback sources.
+
+        Sources come from the decompile cache when possible, otherwise from a
+        worker pool (large APKs) or this thread. With ordered=True, results are
+        yielded in the order of names; otherwise in completion order.
+        """
+        uncached = len(names)
+        if self.decompiler is not None and self.apk_hash:
+            uncached -= len(self.decompiler.cached_names(self.apk_hash, names))
+        if self.use_processes(uncached):
+            yield from self.iter_pool_sources(names, state, ordered)
+            return
+        for name in names:
+            self.check_cancelled()
+            source, error, complete = self.decompile_one(name)
+            if not complete:
+                state["partial"] += 1
+            yield name, source, error, complete
+
+    def iter_pool_sources(self, names, state, ordered):
+        # Every worker holds its own copy of the analysis (loaded from the analysis cache when possible),
+        # so the export's memory use grows with max_workers
+        analysis_dir = os.path.dirname(self.analysis_cache.cache_dir) if self.analysis_cache else None
+        pool = DecompilerPool(self.apk_path, self.max_workers, self.class_timeout, self.method_timeout,
+                              self.memory_limit_mb, analysis_dir, self.cache_key, on_stall=self.stalled.emit)
+        pending = iter(names)
+        in_flight = {}  # future -> name
+        ready = {}  # name -> (source, error, complete), not yielded yet
+        # Submission order, for re-sequencing results when ordered
+        order = deque()
+        window = self.max_workers * 4
+
+        def fill():
+            # ready counts against the window so a slow head-of-line class bounds memory
+            while len(in_flight) + len(ready) < window:
+                name = next(pending, None)
+                if name is None: return
+                if ordered:
+                    order.append(name)
+                source = self.cached(name)
+                if source is not None:
+                    ready[name] = (source, None, True)
+                    continue
+                try:
+                    cls = self.dx.get_class_analysis(name).get_vm_class()
+                    methods = [(str(m.get_name()), str(m.get_descriptor())) for m in cls.get_methods()]
+                    in_flight[pool.submit(name, methods)] = name
+                except Exception as e:
+                    ready[name] = (None, f"{type(e).__name__}: {e}", True)
+
+        try:
+            fill()
+            while in_flight or ready:
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=0.2, return_when=FIRST_COMPLETED)
+                    self.check_cancelled()
+                    for future in done:
+                        name = in_flight.pop(future)
+                        source, complete = future.result()
+                        if not complete:
+                            state["partial"] += 1
+                        elif self.decompiler is not None and self.apk_hash:
+                            self.decompiler.put(self.apk_hash, name, source)
+                        ready[name] = (source, None, complete)
+                if ordered:
+                    emit = []
+                    while order and order[0] in ready:
+                        emit.append(order.popleft())
+                else:
+                    emit = list(ready)
+                for name in emit:
+                    yield (name, *ready.pop(name))
+                fill()
+        finally:
+            state["stalled"] += len(pool.stalls)
+            pool.close()
+
+    def decompile_one(self, name):
+        """(source, error, complete); the session's decompiler pool may return a partial fallback."""
+        try:
+            cls = self.dx.get_class_analysis(name).get_vm_class()
+            if self.decompiler is not None:
+                source, complete = self.decompiler.source_complete(self.apk_hash, cls, self.dx)
+                return source, None, complete
+            return decompile(cls, self.dx), None, True
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}", True
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from core.cache import ANDROGUARD_VERSION, DEFAULT_CACHE_DIR
+
+logger = logging.getLogger("Incremental")
+
+SOURCE_KIND = f"source:{ANDROGUARD_VERSION}"
+STRINGS_KIND = "strings:1"
+
+
+def _const_string(ins):
+    get_string = getattr(ins, "get_string", None)
+    if get_string:
+        return str(get_string())
+    # Fall back to the disassembly: 'v0, "value"'
+    output = str(ins.get_output())
+    return output.split(", ", 1)[1].strip('"') if ", " in output else output
+
+
+def fingerprint_class(cls):
+    """Returns (digest, string table) of a class in one pass over its bytecode.
+
+    Instructions are hashed in their resolved text form rather than as raw
+    bytes: string/method/field indices shift whenever the DEX pools change, so
+    an untouched class would otherwise look modified in every new build.
+    """
+    h = hashlib.sha1()
+    strings = set()
+    h.update(f"{cls.get_name()}|{cls.get_superclassname()}|{cls.get_access_flags()}|{cls.get_interfaces()}\n".encode())
+    for f in cls.get_fields():
+        h.update(f"F {f.get_name()} {f.get_descriptor()} {f.get_access_flags()}\n".encode())
+    for m in cls.get_methods():
+        h.update(f"M {m.get_name()}{m.get_descriptor()} {m.get_access_flags()}\n".encode())
+        code = m.get_code()
+        if not code: continue
+        for ins in code.get_bc().get_instructions():
+            name = ins.get_name()
+            h.update(f"{name} {ins.get_output()}\n".encode())
+            if name.startswith("const-string"):
+                strings.add(_const_string(ins))
+    return h.hexdigest(), sorted(strings)
+
+
+def code_digest(cls, salt=""):
+    """Cheap digest of a class's raw bytecode, without decoding instructions.
+
+    Raw instructions refer to the DEX string/method/field pools by index, so
+    the digest is only meaningful within one APK; salt it with the APK hash.
+    """
+    h = hashlib.sha1(f"{salt}|{cls.get_name()}|{cls.get_superclassname()}|{cls.get_access_flags()}\n".encode())
+    for m in cls.get_methods():
+        h.update(f"M {m.get_name()}{m.get_descriptor()} {m.get_access_flags()}\n".encode())
+        code = m.get_code()
+        if not code: continue
+        bc = code.get_bc()
+        get_insn = getattr(bc, "get_insn", None)
+        if get_insn is not None:
+            h.update(bytes(get_insn()))
+        else:
+            for ins in bc.get_instructions():
+                h.update(f"{ins.get_name()} {ins.get_output()}\n".encode())
+    return h.hexdigest()
+
+
+def class_digest(cls):
+    return fingerprint_class(cls)[0]
+
+
+def fingerprint_classes(dex_files, store=None, check_cancelled=None):
+    """Returns {class_name: digest} for every class defined in the DEX files.
+
+    String tables of classes the store has not seen yet are saved alongside.
+    """
+    digests = {}
+    tables = {}
+    for d in dex_files:
+        for cls in d.get_classes():
+            if check_cancelled: check_cancelled()
+            digest, strings = fingerprint_class(cls)
+            digests[str(cls.get_name())] = digest
+            tables[digest] = strings
+    if store is not None:
+        known = store.get_many(tables.keys(), STRINGS_KIND)
+        store.put_many(STRINGS_KIND, {d: v for d, v in tables.items() if d not in known})
+    return digests
+
+
+class ClassChanges:
+    """Result of comparing an APK's class digests with the previous analyzed version."""
+
+    def __init__(self, apk_hash, digests, previous_hash=None, previous_digests=None):
+        self.apk_hash = apk_hash
+        self.digests = digests
+        self.previous_hash = previous_hash
+        self.previous_digests = previous_digests = previous_digests or {}
+        # class name -> string constants the new version introduces
+        self.new_strings = {}
+        self.added = sorted(n for n in digests if n not in previous_digests)
+        self.removed = sorted(n for n in previous_digests if n not in digests)
+        self.modified = sorted(n for n, d in digests.items()
+                               if n in previous_digests and previous_digests[n] != d)
+        self.unchanged = len(digests) - len(self.added) - len(self.modified)
+
+    @property
+    def has_previous(self):
+        return self.previous_hash is not None
+
+    def summary(self):
+        return (f"{len(self.modified)} modified, {len(self.added)} added, "
+                f"{len(self.removed)} removed, {self.unchanged} unchanged")
+
+
+class ClassArtifactStore:
+    """SQLite store of per-class artifacts keyed by class digest.
+
+    Holds the class digests of every analyzed APK version (to find what changed
+    since the previous build of the same package) and artifacts such as
+    decompiled source, scanner hits and string tables. Any class whose digest is
+    unchanged reuses them instead of being reprocessed.
+    """
+
+    def __init__(self, cache_dir=None):
+        path = os.path.join(cache_dir or DEFAULT_CACHE_DIR, "artifacts.sqlite")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    digest TEXT, kind TEXT, data BLOB, PRIMARY KEY (digest, kind));
+                CREATE TABLE IF NOT EXISTS versions (
+                    package TEXT, apk_hash TEXT, analyzed REAL, PRIMARY KEY (package, apk_hash));
+                CREATE TABLE IF NOT EXISTS class_digests (
+                    apk_hash TEXT, class_name TEXT, digest TEXT, PRIMARY KEY (apk_hash, class_name));
+            """)
+
+    def _conn(self):
+        # sqlite3 connections cannot be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, digest, kind):
+        """Returns the stored JSON-decoded artifact or None."""
+        if not digest: return None
+        row = self._conn().execute("SELECT data FROM artifacts WHERE digest=? AND kind=?",
+                                   (digest, kind)).fetchone()
+        if row is None: return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, digest, kind, value):
+        if not digest: return
+        self.put_many(kind, {digest: value})
+
+    def put_many(self, kind, values):
+        """Stores {digest: artifact} in one transaction."""
+        rows = [(digest, kind, zlib.compress(json.dumps(value).encode()))
+                for digest, value in values.items() if digest]
+        with self._conn() as conn:
+            conn.executemany("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?)", rows)
+
+    def get_many(self, digests, kind):
+        """Returns {digest: artifact} for every digest that has one."""
+        result = {}
+        digests = list(set(d for d in digests if d))
+        conn = self._conn()
+        for i in range(0, len(digests), 500):
+            chunk = digests[i:i+500]
+            rows = conn.execute(f"SELECT digest, data FROM artifacts WHERE kind=? AND digest IN ({','.join('?' * len(chunk))})",
+                                [kind] + chunk)
+            for digest, data in rows:
+                result[digest] = json.loads(zlib.decompress(data))
+        return result
+
+    def previous_version(self, package, apk_hash):
+        row = self._conn().execute(
+            "SELECT apk_hash FROM versions WHERE package=? AND apk_hash!=? ORDER BY analyzed DESC LIMIT 1",
+            (package, apk_hash)).fetchone()
+        return row[0] if row else None
+
+    def version_digests(self, apk_hash):
+        rows = self._conn().execute("SELECT class_name, digest FROM class_digests WHERE apk_hash=?", (apk_hash,))
+        return dict(rows)
+
+    def record_version(self, package, apk_hash, digests):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO versions VALUES (?, ?, ?)", (package, apk_hash, time.time()))
+            conn.execute("DELETE FROM class_digests WHERE apk_hash=?", (apk_hash,))
+            conn.executemany("INSERT INTO class_digests VALUES (?, ?, ?)",
+                             [(apk_hash, name, digest) for name, digest in digests.items()])
+
+    def compare(self, package, apk_hash, digests):
+        """Diffs digests against the last other analyzed version of package, then records them."""
+        previous = self.previous_version(package, apk_hash)
+        previous_digests = self.version_digests(previous) if previous else None
+        self.record_version(package, apk_hash, digests)
+        changes = ClassChanges(apk_hash, digests, previous, previous_digests)
+        changed = changes.modified + changes.added
+        tables = self.get_many([digests[n] for n in changed] +
+                               [changes.previous_digests[n] for n in changes.modified], STRINGS_KIND)
+        for name in changed:
+            before = set(tables.get(changes.previous_digests.get(name), []))
+            added = [s for s in tables.get(digests[name], []) if s not in before]
+            if added:
+                changes.new_strings[name] = added
+        return changes
@@ -0,0 +1,129 @@
+import cProfile
+import gc
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("Instrumentation")
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes everywhere else
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def current_rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PhaseRecorder:
+    """Collects wall time, CPU time, RSS and object counts per analysis phase.
+
+    Every finished phase is logged as one JSON line and passed to on_record,
+    which is how AnalysisThread forwards it to the Log Console.
+    """
+
+    def __init__(self, label="", on_record=None, count_objects=True):
+        self.label = label
+        self.on_record = on_record
+        self.count_objects = count_objects
+        self.records = []
+        self.timings = {}
+
+    @contextmanager
+    def phase(self, name, **extra):
+        """Times the with-block; the yielded dict can be filled with extra fields."""
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        rss_before = current_rss_kb()
+        try:
+            yield extra
+        finally:
+            record = {
+                "run": self.label,
+                "phase": name,
+                "wall_s": round(time.perf_counter() - wall, 4),
+                "cpu_s": round(time.process_time() - cpu, 4),
+                "rss_kb": current_rss_kb(),
+                "rss_delta_kb": None,
+                "peak_rss_kb": peak_rss_kb(),
+            }
+            if rss_before is not None and record["rss_kb"] is not None:
+                record["rss_delta_kb"] = record["rss_kb"] - rss_before
+            if self.count_objects:
+                record["gc_objects"] = len(gc.get_objects())
+            record.update(extra)
+            self.add(record)
+
+    def add(self, record):
+        record.setdefault("run", self.label)
+        self.records.append(record)
+        self.timings[record["phase"]] = record.get("wall_s", 0.0)
+        logger.info(json.dumps(record, default=str))
+        if self.on_record:
+            self.on_record(record)
+
+
+def format_record(record):
+    """One-line human readable rendering of a phase record."""
+    parts = [f"{record['phase']}: {record.get('wall_s', 0):.2f}s wall"]
+    if record.get("cpu_s") is not None:
+        parts.append(f"{record['cpu_s']:.2f}s cpu")
+    if record.get("unpickle_s") is not None:
+        parts.append(f"{record['unpickle_s']:.2f}s unpickle")
+    if record.get("peak_rss_kb") is not None:
+        parts.append(f"peak {record['peak_rss_kb'] / 1024:.0f} MB")
+    if record.get("rss_delta_kb") is not None:
+        parts.append(f"Δrss {record['rss_delta_kb'] / 1024:+.0f} MB")
+    if record.get("gc_objects") is not None:
+        parts.append(f"{record['gc_objects']} objects")
+    if record.get("classes") is not None:
+        parts.append(f"{record['classes']} classes")
+    return ", ".join(parts)
+
+
+@contextmanager
+def profile_capture(out_dir, label, top=50):
+    """Profiles the calling thread with cProfile and tracemalloc.
+
+    Writes <label>-<timestamp>.prof (load with pstats/snakeviz) and a matching
+    .tracemalloc.txt with the top allocation sites.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}")
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(25)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield base
+    finally:
+        profiler.disable()
+        profiler.dump_stats(base + ".prof")
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if started_tracemalloc:
+            tracemalloc.stop()
+        with open(base + ".tracemalloc.txt", "w") as f:
+            f.write(f"current={current} peak={peak}\n")
+            for stat in snapshot.statistics("lineno")[:top]:
+                f.write(f"{stat}\n")
+        logger.info(f"Profile written to {base}.prof")
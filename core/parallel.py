@@ -0,0 +1,205 @@
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from core.cache import deep_recursion
+
+
+# Unpickling rebuilds androguard's deeply nested object graphs; like AnalysisThread.STACK_SIZE
+UNPICKLE_STACK_SIZE = 256 * 1024 * 1024
+
+
+def default_workers(n_tasks):
+    return max(1, min(n_tasks, os.cpu_count() or 1))
+
+
+def _parse_dex_worker(index, dex_data):
+    from androguard.core.bytecodes.dvm import DalvikVMFormat
+    from core.instrumentation import peak_rss_kb
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    d = DalvikVMFormat(dex_data)
+    metrics = {
+        "wall_s": round(time.perf_counter() - wall, 4),
+        "cpu_s": round(time.process_time() - cpu, 4),
+        "peak_rss_kb": peak_rss_kb(),
+        "classes": len(d.get_classes()),
+        "worker_pid": os.getpid(),
+    }
+    # Pickle here so the (deep) object graph is serialized under our
+    # recursion limit instead of inside the executor's feeder thread
+    with deep_recursion():
+        return index, pickle.dumps(d, protocol=pickle.HIGHEST_PROTOCOL), metrics
+
+
+def _unpickle_loop(blobs, unpickled, results):
+    while True:
+        item = blobs.get()
+        if item is None: return
+        index, blob, metrics = item
+        started = time.perf_counter()
+        try:
+            with deep_recursion():
+                results[index] = pickle.loads(blob)
+        except BaseException as e:
+            unpickled.put(e)
+            return
+        metrics["unpickle_s"] = round(time.perf_counter() - started, 4)
+        metrics["pickle_bytes"] = len(blob)
+        unpickled.put((index, metrics))
+
+
+def parse_dex_parallel(all_dex, max_workers=None, on_parsed=None, check_cancelled=None):
+    """Parses each DEX blob in its own worker process.
+
+    Returns DalvikVMFormat objects in the original DEX order.
+    on_parsed(done, total, index, metrics) is called as each DEX is parsed and
+    unpickled here, in completion order, with the worker's own timing and
+    memory figures plus unpickle_s. Unpickling runs on a thread with a stack
+    of UNPICKLE_STACK_SIZE, overlapping with the workers still parsing.
+    check_cancelled() is polled while waiting and may raise to abort; queued
+    DEX files are then dropped without being parsed.
+    """
+    total = len(all_dex)
+    results = [None] * total
+    blobs, unpickled = queue.Queue(), queue.Queue()
+    previous = threading.stack_size(UNPICKLE_STACK_SIZE)
+    try:
+        unpickler = threading.Thread(target=_unpickle_loop, args=(blobs, unpickled, results),
+                                     name="dex-unpickle", daemon=True)
+        unpickler.start()
+    finally:
+        threading.stack_size(previous)
+    # spawn: forking a process that hosts Qt threads is not safe
+    ctx = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=max_workers or default_workers(total), mp_context=ctx)
+    try:
+        pending = {pool.submit(_parse_dex_worker, i, data) for i, data in enumerate(all_dex)}
+        done_count = 0
+        while done_count < total:
+            if pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    blobs.put(future.result())
+            if check_cancelled:
+                check_cancelled()
+            while True:
+                try:
+                    item = unpickled.get(block=not pending, timeout=0.2)
+                except queue.Empty:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                done_count += 1
+                if on_parsed:
+                    on_parsed(done_count, total, *item)
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        blobs.put(None)
+    pool.shutdown()
+    unpickler.join()
+    return results
+
+
+def shard_classes(names, dex_classes=None, shard_size=200):
+    """Splits class names into shards of about shard_size classes.
+
+    Shards never span DEX files (dex_classes lists each DEX's class names)
+    and keep a package's classes together unless the package alone exceeds
+    shard_size. Every name lands in exactly one shard.
+    """
+    remaining = set(names)
+    groups = []
+    for dex_names in dex_classes or ():
+        group = [n for n in dex_names if n in remaining]
+        remaining.difference_update(group)
+        groups.append(group)
+    groups.append(remaining)
+    shards = []
+    for group in groups:
+        shard = []
+        for _, package in itertools.groupby(sorted(group), key=lambda n: n.rsplit("/", 1)[0]):
+            package = list(package)
+            if shard and len(shard) + len(package) > shard_size:
+                shards.append(shard)
+                shard = []
+            shard.extend(package)
+            while len(shard) >= shard_size:
+                shards.append(shard[:shard_size])
+                shard = shard[shard_size:]
+        if shard:
+            shards.append(shard)
+    return shards
+
+
+_scan_state = {}
+
+
+def _scan_worker_init(apk_path, analysis_cache_dir, cache_key, rules):
+    from core.decompile_pool import load_analysis
+    from core.rules import Rule, RuleSet
+    _scan_state["dx"] = load_analysis(apk_path, analysis_cache_dir, cache_key)
+    _scan_state["ruleset"] = RuleSet(Rule(spec, pack) for spec, pack in rules)
+
+
+def _scan_shard_worker(names):
+    # Results travel back as plain tuples in the scan cache's record format
+    from core.scanner import instruction_hits
+    dx, ruleset = _scan_state["dx"], _scan_state["ruleset"]
+    results = {}
+    for name in names:
+        c = dx.get_class_analysis(name)
+        if c is None: continue
+        records = ((rule.id, str(m.get_name()), str(m.get_descriptor()), text, offset, count)
+                   for rule, m, text, offset, count in instruction_hits(c, ruleset.instruction_matcher))
+        results[name] = list(dict.fromkeys(records))
+    return len(names), results
+
+
+class ShardedScan:
+    """Runs the instruction pass of a rule scan over class shards in worker processes.
+
+    Workers load the analysis themselves (from the analysis cache when
+    possible), so only class names go out and compact
+    (rule id, method name, descriptor, detail, offset, count) records come back.
+    """
+
+    def __init__(self, names, rules, apk_path, workers=None, analysis_cache_dir=None, cache_key=None,
+                 dex_classes=None):
+        workers = workers or default_workers(len(names))
+        self.total = len(names)
+        shards = shard_classes(names, dex_classes, max(50, -(-self.total // (workers * 4))))
+        # spawn: forking a process that hosts Qt threads is not safe
+        ctx = multiprocessing.get_context("spawn")
+        self.pool = ProcessPoolExecutor(max_workers=min(workers, len(shards) or 1), mp_context=ctx,
+                                        initializer=_scan_worker_init,
+                                        initargs=(apk_path, analysis_cache_dir, cache_key, rules))
+        self.pending = {self.pool.submit(_scan_shard_worker, shard) for shard in shards}
+
+    def results(self, on_progress=None, check_cancelled=None):
+        """Yields (class name, records) in completion order.
+
+        on_progress(done, total) counts classes over all workers;
+        check_cancelled() is polled while waiting and may raise to abort.
+        """
+        done_count = 0
+        while self.pending:
+            done, self.pending = wait(self.pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            if check_cancelled:
+                check_cancelled()
+            for future in done:
+                count, results = future.result()
+                done_count += count
+                if on_progress:
+                    on_progress(done_count, self.total)
+                yield from results.items()
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,47 @@
+def _get_val(obj, attr):
+    # Use getattr to be safe with different androguard versions
+    val = getattr(obj, attr, "N/A")
+    if callable(val):
+        try: val = val()
+        except Exception: val = "N/A"
+    return str(val)
+
+
+def _name(obj):
+    # Issuer/Subject might be objects with human_friendly or just strings
+    if hasattr(obj, 'human_friendly'):
+        return obj.human_friendly
+    return str(obj)
+
+
+def certificate_info(apk):
+    """Returns one dict of printable fields per signing certificate."""
+    # Newer androguard might return a generator or a slightly different list
+    certs = list(apk.get_certificates())
+    return [{
+        "issuer": _name(getattr(cert, 'issuer', None)),
+        "subject": _name(getattr(cert, 'subject', None)),
+        "serial": _get_val(cert, 'serial_number'),
+        "algorithm": _get_val(cert, 'signature_algo'),
+        "valid_from": _get_val(cert, 'not_before'),
+        "valid_until": _get_val(cert, 'not_after'),
+        "sha1": _get_val(cert, 'sha1_fingerprint'),
+        "sha256": _get_val(cert, 'sha256_fingerprint'),
+    } for cert in certs]
+
+
+def manifest_info(apk):
+    """Returns the manifest facts shown on the Dashboard as a JSON-friendly dict."""
+    return {
+        "app_name": apk.get_app_name(),
+        "package": apk.get_package(),
+        "version_code": apk.get_androidversion_code(),
+        "version_name": apk.get_androidversion_name(),
+        "min_sdk": apk.get_min_sdk_version(),
+        "target_sdk": apk.get_target_sdk_version(),
+        "permissions": sorted(str(p) for p in (apk.get_permissions() or [])),
+        "activities": [str(a) for a in (apk.get_activities() or [])],
+        "services": [str(s) for s in (apk.get_services() or [])],
+        "receivers": [str(r) for r in (apk.get_receivers() or [])],
+        "providers": [str(p) for p in (apk.get_providers() or [])],
+    }
@@ -0,0 +1,130 @@
+import re
+from collections import defaultdict
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+HOTSPOTS = {
+    "Crypto": ["Ljavax/crypto/Cipher;", "Ljava/security/MessageDigest;"],
+    "Network": ["Ljava/net/URL;", "Lokhttp3/OkHttpClient;", "Lorg/apache/http/client/HttpClient;"],
+    "Reflection": ["Ljava/lang/reflect/Method;", "Ljava/lang/Class;->forName"],
+    "Execution": ["Ljava/lang/Runtime;->exec", "Ljava/lang/ProcessBuilder;"],
+    "Webview": ["Landroid/webkit/WebView;->loadUrl", "Landroid/webkit/WebView;->addJavascriptInterface"],
+    "File": ["Ljava/io/File;"],
+    "SMS": ["Landroid/telephony/SmsManager;"]
+}
+
+# Bumped whenever the meaning of stored hits changes
+SCANNER_VERSION = 3
+
+# 'Lpkg/Cls;' or 'Lpkg/Cls;->methodPrefix': resolvable through the analysis' xrefs
+API_PATTERN = re.compile(r"(L[^;\s]+;)(?:->(.+))?")
+
+
+class MultiMatcher:
+    """Finds which of many substrings occur in a text in one pass.
+
+    Uses an Aho-Corasick automaton from the optional 'pyahocorasick' package,
+    or one alternation regex otherwise. patterns are (tag, substring) pairs.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = defaultdict(list)
+        for tag, k in patterns:
+            self.patterns[k].append(tag)
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for k in self.patterns:
+                self.automaton.add_word(k, k)
+            self.automaton.make_automaton()
+        else:
+            self.automaton = None
+            # Longest first so a pattern is not hidden by one of its prefixes
+            self.regex = re.compile("|".join(re.escape(k) for k in sorted(self.patterns, key=len, reverse=True)))
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def find(self, text):
+        """Set of patterns occurring in text."""
+        if self.automaton is not None:
+            return {k for _, k in self.automaton.iter(text)}
+        found = set()
+        pos = 0
+        # Overlapping occurrences: restart one character after every match
+        while True:
+            m = self.regex.search(text, pos)
+            if not m: return found
+            found.add(m.group())
+            pos = m.start() + 1
+
+    def tags(self, text):
+        return {tag for k in self.find(text) for tag in self.patterns[k]}
+
+
+def api_targets(dx, api):
+    """Yields (tag, method analysis) for every analyzed method an API pattern resolves to.
+
+    api maps class names to [(tag, method prefix or None)].
+    """
+    for class_name, rules in api.items():
+        ca = dx.get_class_analysis(class_name)
+        if ca is None: continue  # never referenced by this app
+        for ma in ca.get_methods():
+            signature = f"{ma.get_method().get_name()}{ma.get_method().get_descriptor()}"
+            for tag, prefix in rules:
+                if prefix is None or signature.startswith(prefix):
+                    yield tag, ma
+
+
+def method_signature(m):
+    return f"{m.get_class_name()}->{m.get_name()}{m.get_descriptor()}"
+
+
+def xref_hits(dx, api, include=None):
+    """Yields (tag, caller method, target, sorted offsets) per calling method of each API pattern.
+
+    Walks the callers recorded by the cross-reference pass instead of the
+    instructions, so its cost is proportional to the number of call sites of
+    the watched APIs. include(class_name) restricts the callers reported.
+    """
+    seen = set()
+    for tag, ma in api_targets(dx, api):
+        target = method_signature(ma.get_method())
+        sites = defaultdict(list)
+        for caller_class, caller, offset in ma.get_xref_from():
+            if include is not None and not include(str(caller_class.name)): continue
+            sites[caller.get_method()].append(offset)
+        for m_obj, offsets in sites.items():
+            key = (tag, m_obj, target)
+            if key in seen: continue
+            seen.add(key)
+            yield tag, m_obj, target, sorted(offsets)
+
+
+def instruction_hits(c, matcher):
+    """Yields (tag, method, first matching instruction, its offset, match count) for one class."""
+    for method in c.get_methods():
+        m_obj = method.get_method()
+
+        if not hasattr(m_obj, 'get_code'):
+            continue
+
+        code = m_obj.get_code()
+        if not code: continue
+
+        found = {}
+        offset = 0
+        for ins in code.get_bc().get_instructions():
+            output = str(ins.get_output())
+            for tag in matcher.tags(output):
+                hit = found.get(tag)
+                if hit is None:
+                    found[tag] = [f"{ins.get_name()} {output}", offset, 1]
+                else:
+                    hit[2] += 1
+            offset += ins.get_length()
+        for tag, (text, first, count) in found.items():
+            yield tag, m_obj, text, first, count
@@ -0,0 +1,104 @@
+import math
+import re
+from array import array
+from bisect import bisect_right
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Bits of StringTable.kinds; a string can have several
+KINDS = {
+    "url": re.compile(r"\b(?:https?|ftp|wss?)://[^\s\0\"'<>]+", re.IGNORECASE),
+    "ip": re.compile(r"(?<![\d.])(?:(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.){3}(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)(?![\d.])"),
+    "jwt": re.compile(r"\beyJ[A-Za-z0-9_-]{8,}\.eyJ[A-Za-z0-9_-]{8,}\.[A-Za-z0-9_-]*"),
+    "aws": re.compile(r"\b(?:AKIA|ASIA|AGPA|AIDA|AROA|ANPA|ANVA|AIPA)[0-9A-Z]{16}\b"),
+    # A whole string of base64 with both cases and a digit or symbol, so plain identifiers are not blobs
+    "base64": re.compile(r"(?<![^\0])(?=[^\0]*[a-z])(?=[^\0]*[A-Z])(?=[^\0]*[0-9+/])[A-Za-z0-9+/]{16,}={0,2}(?![^\0])"),
+}
+KIND_BITS = {kind: 1 << i for i, kind in enumerate(KINDS)}
+KIND_LABELS = {"url": "URL", "ip": "IP address", "jwt": "JWT", "aws": "AWS key", "base64": "Base64 blob"}
+# One pass over all strings finds the rows worth testing against each kind
+KIND_FILTER = re.compile("|".join(f"(?:{rx.pattern})" for rx in KINDS.values()), re.IGNORECASE)
+
+# Narrowest first; a string gets the first charset all of its characters belong to
+CHARSETS = ("empty", "digits", "hex", "alphanumeric", "base64", "ascii", "unicode", "binary")
+_CHARSET_PATTERNS = [
+    ("digits", re.compile(r"[0-9]+")),
+    ("hex", re.compile(r"[0-9a-fA-F]+")),
+    ("alphanumeric", re.compile(r"[0-9a-zA-Z]+")),
+    ("base64", re.compile(r"[0-9a-zA-Z+/=_-]+")),
+    ("ascii", re.compile(r"[\x20-\x7e\t\r\n]+")),
+    ("unicode", re.compile(r"[^\x00-\x08\x0b\x0c\x0e-\x1f\x7f]+")),
+]
+HIGH_ENTROPY = 4.5
+
+
+def classify(haystack, starts, check_cancelled=None):
+    """Kind bitmask per row of a SEPARATOR-joined haystack (original case); starts ends with a sentinel."""
+    kinds = array("B", bytes(len(starts) - 1))
+    candidates = set()
+    for n, m in enumerate(KIND_FILTER.finditer(haystack)):
+        if check_cancelled and n % 10000 == 0: check_cancelled()
+        candidates.add(bisect_right(starts, m.start()) - 1)
+    for row in candidates:
+        value = haystack[starts[row]:starts[row + 1] - 1]
+        mask = 0
+        for kind, rx in KINDS.items():
+            if rx.search(value):
+                mask |= KIND_BITS[kind]
+        kinds[row] = mask
+    return kinds
+
+
+def _charset(value):
+    if not value: return 0
+    for name, rx in _CHARSET_PATTERNS:
+        if rx.fullmatch(value):
+            return CHARSETS.index(name)
+    return CHARSETS.index("binary")
+
+
+def _entropy(value):
+    n = len(value)
+    return -sum(c / n * math.log2(c / n) for c in Counter(value).values()) if n else 0.0
+
+
+def features(values, lengths):
+    """(Shannon entropy in bits per character, charset index) arrays for values.
+
+    Vectorized over all strings at once with NumPy when it is installed.
+    """
+    if np is None or not values:
+        return array("f", map(_entropy, values)), array("B", map(_charset, values))
+    n = len(values)
+    chars = np.frombuffer("".join(values).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    counts = np.frombuffer(lengths, dtype=np.uint32).astype(np.int64)
+    rows = np.repeat(np.arange(n, dtype=np.int64), counts)
+
+    # Entropy from the number of occurrences of every (row, character) pair
+    pairs, occurrences = np.unique((rows << 21) | chars, return_counts=True)
+    pair_rows = pairs >> 21
+    p = occurrences / counts[pair_rows]
+    entropy = np.bincount(pair_rows, weights=-p * np.log2(p), minlength=n)
+
+    # A row belongs to a charset when none of its characters falls outside it
+    digit = (chars >= 0x30) & (chars <= 0x39)
+    lower = (chars >= 0x61) & (chars <= 0x7a)
+    upper = (chars >= 0x41) & (chars <= 0x5a)
+    hex_letter = ((chars >= 0x61) & (chars <= 0x66)) | ((chars >= 0x41) & (chars <= 0x46))
+    alnum = digit | lower | upper
+    b64 = alnum | np.isin(chars, [0x2b, 0x2f, 0x3d, 0x5f, 0x2d])
+    whitespace = np.isin(chars, [0x09, 0x0a, 0x0d])
+    ascii_ = ((chars >= 0x20) & (chars <= 0x7e)) | whitespace
+    control = ((chars < 0x20) & ~whitespace) | (chars == 0x7f)
+    charset = np.full(n, CHARSETS.index("binary"), dtype=np.uint8)
+    # Assigned widest first so narrower charsets overwrite
+    for name, inside in (("unicode", ~control), ("ascii", ascii_), ("base64", b64), ("alphanumeric", alnum),
+                         ("hex", digit | hex_letter), ("digits", digit)):
+        outside = np.bincount(rows, weights=~inside, minlength=n)
+        charset[outside == 0] = CHARSETS.index(name)
+    charset[counts == 0] = CHARSETS.index("empty")
+    return array("f", entropy.astype(np.float32).tobytes()), array("B", charset.tobytes())
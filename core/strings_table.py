@@ -0,0 +1,273 @@
+import re
+from array import array
+from bisect import bisect_right
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from core.string_features import CHARSETS, HIGH_ENTROPY, KIND_BITS, KIND_LABELS, classify, features
+from core.text_index import required_literals, trigrams
+
+class TableCancelled(Exception):
+    pass
+
+
+# Joins the lowercased strings into one haystack; a query containing it never matches
+SEPARATOR = "\0"
+
+
+class StringTable:
+    """Every string of an analysis as columns, for filtering and sorting without per-row objects.
+
+    Values are lowercased once into one contiguous haystack, so a substring
+    filter is a run of str.find calls instead of a Python loop over all
+    strings. Length is an integer array indexed by row; sort orders are
+    computed as row permutations. Code references form a multimap stored
+    as parallel integer arrays: the xrefs of row r are entries
+    xref_starts[r] to xref_starts[r + 1] of xref_classes, xref_methods and
+    xref_offsets.
+
+    build_index() then adds a trigram index for regex queries, entropy and
+    charset per string and a kind bitmask (URL, IP, JWT, ...); until it has
+    run, regexes scan every string and facets are unavailable.
+    """
+
+    COLUMNS = ("String", "Length", "Xrefs", "First Class", "Entropy", "Kinds")
+    NO_OFFSET = 0xFFFFFFFF
+
+    def __init__(self):
+        self.values = []
+        self.objects = []
+        self.lengths = array("I")
+        self.xref_starts = array("I", [0])
+        # Indexes into class_names and methods, and byte offsets (NO_OFFSET when androguard has none)
+        self.xref_classes = array("I")
+        self.xref_methods = array("I")
+        self.xref_offsets = array("I")
+        self.class_names = []
+        self.class_ids = {}
+        self.methods = []
+        self.method_ids = {}
+        self.haystack = ""
+        # Haystack position of every row, plus the haystack length as a sentinel
+        self.starts = array("I")
+        self.ranks = {}
+        # Filled by build_index()
+        self.postings = None
+        self.entropy = None
+        self.charset = None
+        self.kinds = None
+        # Facet sizes: kind (or "entropy") -> rows, charset -> rows
+        self.kind_counts = {}
+        self.charset_counts = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, s):
+        value = str(s.get_value())
+        self.values.append(value)
+        self.objects.append(s)
+        self.lengths.append(len(value))
+        for xref in s.get_xref_from():
+            name = str(xref[0].name)
+            class_id = self.class_ids.get(name)
+            if class_id is None:
+                class_id = self.class_ids[name] = len(self.class_names)
+                self.class_names.append(name)
+            method = xref[1].get_method()
+            method_id = self.method_ids.get(id(method))
+            if method_id is None:
+                method_id = self.method_ids[id(method)] = len(self.methods)
+                self.methods.append(method)
+            self.xref_classes.append(class_id)
+            self.xref_methods.append(method_id)
+            self.xref_offsets.append(xref[2] if len(xref) > 2 and xref[2] is not None else self.NO_OFFSET)
+        self.xref_starts.append(len(self.xref_classes))
+
+    @classmethod
+    def build(cls, strings, check_cancelled=None):
+        table = cls()
+        for i, s in enumerate(strings):
+            if check_cancelled and i % 10000 == 0: check_cancelled()
+            table.add(s)
+        lowered = [v.lower() for v in table.values]
+        pos = 0
+        for v in lowered:
+            table.starts.append(pos)
+            pos += len(v) + 1
+        table.starts.append(pos)
+        table.haystack = SEPARATOR.join(lowered) + SEPARATOR
+        table.class_ids = table.method_ids = None
+        return table
+
+    def xref_count(self, row):
+        return self.xref_starts[row + 1] - self.xref_starts[row]
+
+    def class_of(self, row):
+        """First referencing class, or "" for strings nothing references."""
+        start = self.xref_starts[row]
+        return self.class_names[self.xref_classes[start]] if start < self.xref_starts[row + 1] else ""
+
+    def xrefs(self, row):
+        """(class name, method, byte offset or None) of every reference to a row's string."""
+        for i in range(self.xref_starts[row], self.xref_starts[row + 1]):
+            offset = self.xref_offsets[i]
+            yield (self.class_names[self.xref_classes[i]], self.methods[self.xref_methods[i]],
+                   None if offset == self.NO_OFFSET else offset)
+
+    @property
+    def indexed(self):
+        return self.kinds is not None
+
+    def build_index(self, check_cancelled=None):
+        entropy, charset = features(self.values, self.lengths)
+        if check_cancelled: check_cancelled()
+        # Kinds are case-sensitive, so they are matched on the original values
+        starts = array("I", [0])
+        for length in self.lengths:
+            starts.append(starts[-1] + length + 1)
+        kinds = classify(SEPARATOR.join(self.values) + SEPARATOR, starts, check_cancelled)
+        postings = {}
+        haystack, starts = self.haystack, self.starts
+        for row in range(len(self.values)):
+            if check_cancelled and row % 10000 == 0: check_cancelled()
+            for gram in trigrams(haystack[starts[row]:starts[row + 1] - 1]):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(row)
+        kind_counts = {kind: sum(1 for mask in kinds if mask & bit) for kind, bit in KIND_BITS.items()}
+        kind_counts["entropy"] = sum(1 for e in entropy if e >= HIGH_ENTROPY)
+        charset_counts = dict.fromkeys(CHARSETS, 0)
+        for c in charset:
+            charset_counts[CHARSETS[c]] += 1
+        self.postings, self.entropy, self.charset = postings, entropy, charset
+        self.kind_counts, self.charset_counts = kind_counts, charset_counts
+        # Set last: indexed is what readers check
+        self.kinds = kinds
+
+    def kind_labels(self, row):
+        mask = self.kinds[row]
+        return ", ".join(label for kind, label in KIND_LABELS.items() if mask & KIND_BITS[kind])
+
+    def cell(self, row, column):
+        if column == 0: return self.values[row]
+        if column == 1: return self.lengths[row]
+        if column == 2: return self.xref_count(row)
+        if column == 3: return self.class_of(row)
+        if not self.indexed: return ""
+        if column == 4: return f"{self.entropy[row]:.2f}"
+        return self.kind_labels(row)
+
+    def find(self, text, check_cancelled=None):
+        """Rows whose value contains text (case-insensitive), in row order."""
+        needle = text.lower()
+        if not needle:
+            return array("I", range(len(self.values)))
+        hits = array("I")
+        if SEPARATOR in needle:
+            return hits
+        starts, find = self.starts, self.haystack.find
+        pos = find(needle)
+        while pos != -1:
+            row = bisect_right(starts, pos) - 1
+            hits.append(row)
+            if check_cancelled and len(hits) % 10000 == 0: check_cancelled()
+            # At most one hit per row: continue from the next row
+            pos = find(needle, starts[row + 1])
+        return hits
+
+    def find_regex(self, pattern, check_cancelled=None):
+        """Rows whose value matches the regex (case-insensitive), in row order; raises re.error.
+
+        With the trigram index, only rows containing the literals every
+        match needs are tried.
+        """
+        search = re.compile(pattern, re.IGNORECASE).search
+        grams = set()
+        for literal in required_literals(pattern):
+            grams |= trigrams(literal)
+        if self.postings is not None and grams:
+            postings = sorted((self.postings.get(g, ()) for g in grams), key=len)
+            rows = set(postings[0])
+            for posting in postings[1:]:
+                if not rows: break
+                rows.intersection_update(posting)
+            candidates = sorted(rows)
+        else:
+            candidates = range(len(self.values))
+        hits = array("I")
+        values = self.values
+        for n, row in enumerate(candidates):
+            if check_cancelled and n % 10000 == 0: check_cancelled()
+            if search(values[row]):
+                hits.append(row)
+        return hits
+
+    def facet_filter(self, rows, kind=None, charset=None):
+        """Rows of the given kind ("entropy" for high-entropy strings) and charset; no-op before build_index()."""
+        if not self.indexed: return rows
+        if kind == "entropy":
+            entropy = self.entropy
+            rows = array("I", (r for r in rows if entropy[r] >= HIGH_ENTROPY))
+        elif kind:
+            bit, kinds = KIND_BITS[kind], self.kinds
+            rows = array("I", (r for r in rows if kinds[r] & bit))
+        if charset:
+            wanted, charsets = CHARSETS.index(charset), self.charset
+            rows = array("I", (r for r in rows if charsets[r] == wanted))
+        return rows
+
+    def query(self, text, regex=False, kind=None, charset=None, check_cancelled=None):
+        rows = self.find_regex(text, check_cancelled) if regex and text else self.find(text, check_cancelled)
+        return self.facet_filter(rows, kind, charset)
+
+    def rank(self, column):
+        """Position of every row in the column's ascending order, computed once per column."""
+        ranks = self.ranks.get(column)
+        if ranks is None:
+            if column >= 4 and not self.indexed:
+                return array("I", bytes(4 * len(self.values)))
+            if column == 0:
+                key = self.values.__getitem__
+            elif column == 3:
+                key = self.class_of
+            elif column == 4:
+                key = self.entropy.__getitem__
+            elif column == 5:
+                key = self.kinds.__getitem__
+            elif column == 2:
+                key = self.xref_count
+            else:
+                key = self.lengths.__getitem__
+            ranks = array("I", bytes(4 * len(self.values)))
+            for position, row in enumerate(sorted(range(len(self.values)), key=key)):
+                ranks[row] = position
+            self.ranks[column] = ranks
+        return ranks
+
+    def sort(self, rows, column, descending=False):
+        return array("I", sorted(rows, key=self.rank(column).__getitem__, reverse=descending))
+
+
+class StringTableThread(QThread):
+    """Builds the table, emits it, then indexes it and emits indexed."""
+    finished = pyqtSignal(object)
+    indexed = pyqtSignal(object)
+
+    def __init__(self, strings):
+        super().__init__()
+        self.strings = strings
+
+    def check_cancelled(self):
+        if self.isInterruptionRequested():
+            raise TableCancelled()
+
+    def run(self):
+        try:
+            table = StringTable.build(self.strings, self.check_cancelled)
+            self.finished.emit(table)
+            table.build_index(self.check_cancelled)
+        except TableCancelled:
+            return
+        self.indexed.emit(table)
@@ -0,0 +1,173 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+KINDS = ("class", "method", "field")
+CLASS, METHOD, FIELD = range(3)
+
+class IndexCancelled(Exception):
+    pass
+
+
+# Characters a camel-case hump may continue with before the next one starts
+HUMP_TAIL = r"[a-z0-9_$]*"
+
+
+def dotted(class_name):
+    """Lcom/a/B; -> com.a.B"""
+    return class_name[1:-1].replace("/", ".")
+
+
+def initials(name):
+    """Lowercased first letter of every camel-case hump: getDeviceId -> 'gdi'."""
+    return "".join(m.group(1) or m.group(2) for m in re.finditer(r"^(.)|[_$]?([A-Z]|(?<=[_$])[a-z0-9])", name)).lower()
+
+
+def camel_humps(query):
+    """'gDI' -> ['g', 'D', 'I']; an all-lowercase query is one hump per letter."""
+    if query.islower():
+        return list(query)
+    return [h for h in re.findall(r"[A-Z]?[^A-Z]*", query) if h]
+
+
+class SymbolIndex:
+    """Class, method and field names of one analysis, laid out for per-keystroke lookup.
+
+    Lookups are exact and prefix matches by bisecting a sorted array of
+    lowercased short names, camel-case hump matches (gDI -> getDeviceId) by
+    bisecting a sorted array of hump initials and verifying the candidates,
+    and substring matches as str.find over one lowercased blob of qualified
+    names. A query over a few hundred thousand symbols takes milliseconds.
+    """
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.keys = []
+        self.displays = []
+        self.objs = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, kind, key, display, obj):
+        self.kinds.append(kind)
+        self.keys.append(key)
+        self.displays.append(display)
+        # Object to open: the class itself for fields
+        self.objs.append(obj)
+
+    @classmethod
+    def build(cls, dex_files, check_cancelled=None):
+        index = cls()
+        for d in dex_files:
+            for c in d.get_classes():
+                if check_cancelled: check_cancelled()
+                name = dotted(str(c.get_name()))
+                index.add(CLASS, name.rsplit(".", 1)[-1], name, c)
+                for m in c.get_methods():
+                    index.add(METHOD, str(m.get_name()), f"{name}.{m.get_name()}{m.get_descriptor()}", m)
+                for f in c.get_fields():
+                    index.add(FIELD, str(f.get_name()), f"{name}.{f.get_name()} : {f.get_descriptor()}", c)
+        index.finalize()
+        return index
+
+    def finalize(self):
+        lowered = [k.lower() for k in self.keys]
+        self.sorted_ids = array("I", sorted(range(len(lowered)), key=lowered.__getitem__))
+        self.sorted_keys = [lowered[i] for i in self.sorted_ids]
+        humps = [initials(k) for k in self.keys]
+        self.initial_ids = array("I", sorted(range(len(humps)), key=humps.__getitem__))
+        self.sorted_initials = [humps[i] for i in self.initial_ids]
+        self.display_blob, self.display_offsets = self._blob(d.lower() for d in self.displays)
+
+    @staticmethod
+    def _blob(strings):
+        # "\n" before every entry so a match offset maps back to its entry by bisection
+        offsets = array("I")
+        parts = []
+        pos = 0
+        for s in strings:
+            offsets.append(pos + 1)
+            parts.append(s)
+            pos += len(s) + 1
+        return "\n" + "\n".join(parts) + "\n", offsets
+
+    def _entry_at(self, offsets, pos):
+        return bisect_right(offsets, pos) - 1
+
+    def _key_range(self, low, high):
+        return bisect_left(self.sorted_keys, low), bisect_left(self.sorted_keys, high)
+
+    def search(self, query, limit=200):
+        """Returns up to limit entry ids ranked exact > prefix > camel-case > substring."""
+        q = query.strip()
+        if not q: return []
+        ql = q.lower()
+        seen = set()
+        ranked = []
+
+        def take(ids, sort=True):
+            ids = [i for i in ids if i not in seen]
+            if sort:
+                ids.sort(key=lambda i: (len(self.keys[i]), self.kinds[i]))
+            for i in ids:
+                if len(ranked) >= limit: return True
+                seen.add(i)
+                ranked.append(i)
+            return len(ranked) >= limit
+
+        lo, hi = self._key_range(ql, ql + "\0")
+        if take(self.sorted_ids[lo:hi]): return ranked
+        lo, hi = self._key_range(ql, ql + "\uffff")
+        # Very broad prefixes: lexical order is good enough and avoids sorting them all
+        if take(self.sorted_ids[lo:min(hi, lo + 5000)], sort=hi - lo <= 5000): return ranked
+
+        humps = camel_humps(q)
+        if len(humps) > 1:
+            match = re.compile("(?i:" + re.escape(humps[0]) + ")" + "".join(
+                HUMP_TAIL + re.escape(h[0].upper()) + re.escape(h[1:]) for h in humps[1:])).match
+            prefix = "".join(h[0] for h in humps).lower()
+            lo = bisect_left(self.sorted_initials, prefix)
+            hi = bisect_left(self.sorted_initials, prefix + "\uffff")
+            ids = []
+            for i in self.initial_ids[lo:min(hi, lo + 20000)]:
+                if match(self.keys[i]):
+                    ids.append(i)
+                    if len(ids) >= limit * 4: break
+            if take(ids): return ranked
+
+        ids = []
+        blob = self.display_blob
+        pos = blob.find(ql)
+        while pos != -1 and len(ids) < limit * 2:
+            i = self._entry_at(self.display_offsets, pos)
+            ids.append(i)
+            # Continue after this entry so each symbol is reported once
+            pos = blob.find(ql, self.display_offsets[i + 1] if i + 1 < len(self.display_offsets) else len(blob))
+        take(ids, sort=False)
+        return ranked
+
+    def entry(self, i):
+        """(kind, display text, object to open) of entry i."""
+        return KINDS[self.kinds[i]], self.displays[i], self.objs[i]
+
+
+class SymbolIndexThread(QThread):
+    finished = pyqtSignal(object)
+
+    def __init__(self, dex_files):
+        super().__init__()
+        self.dex_files = dex_files
+
+    def check_cancelled(self):
+        if self.isInterruptionRequested():
+            raise IndexCancelled()
+
+    def run(self):
+        try:
+            index = SymbolIndex.build(self.dex_files, self.check_cancelled)
+        except IndexCancelled:
+            return
+        self.finished.emit(index)
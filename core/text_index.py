@@ -0,0 +1,323 @@
+import logging
+import os
+import pickle
+import re
+import threading
+import zlib
+from array import array
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from core.cache import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger("TextIndex")
+
+SNIPPET_WIDTH = 160
+
+
+def trigrams(text):
+    return {text[i:i+3] for i in range(len(text) - 2)}
+
+
+# Operand lengths of escapes that stand for one character by code (\x41, \u0041, \U00000041)
+ESCAPE_OPERANDS = {"x": 2, "u": 4, "U": 8}
+QUANTIFIER = re.compile(r"\{(?!\})(\d*)(?:,\d*)?\}")
+SCOPED_FLAGS = re.compile(r"\?[aiLmsu-]+:")
+
+
+def _class_end(pattern, i):
+    """Index just past the "]" closing the character class opened at pattern[i]."""
+    i += 1
+    if pattern[i:i+1] == "^": i += 1
+    if pattern[i:i+1] == "]": i += 1
+    while i < len(pattern) and pattern[i] != "]":
+        i += 2 if pattern[i] == "\\" else 1
+    return i + 1
+
+
+def _group_end(pattern, i):
+    """Index of the ")" closing the group opened at pattern[i]."""
+    depth = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            i = _class_end(pattern, i)
+            continue
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if not depth: return i
+        i += 1
+    return len(pattern)
+
+
+def _has_alternation(pattern):
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "|": return True
+        if c == "\\": i += 2
+        elif c == "[": i = _class_end(pattern, i)
+        elif c == "(": i = _group_end(pattern, i) + 1
+        else: i += 1
+    return False
+
+
+def _quantifier(pattern, i):
+    """(minimum count, index past it) of the quantifier at pattern[i], or None and i without one."""
+    c = pattern[i:i+1]
+    if c and c in "*?+":
+        low, i = (1 if c == "+" else 0), i + 1
+    else:
+        m = QUANTIFIER.match(pattern, i)
+        if not m: return None, i
+        low, i = int(m.group(1) or 0), m.end()
+    if pattern[i:i+1] in ("?", "+"):  # lazy / possessive
+        i += 1
+    return low, i
+
+
+def _group_body(body):
+    """Pattern of a group's contents, or None for lookarounds, conditionals, comments and flag groups."""
+    if not body.startswith("?"):
+        return body
+    if body.startswith("?:"):
+        return body[2:]
+    if body.startswith(("?P<", "?<")) and not body.startswith(("?<=", "?<!")):
+        return body[body.find(">") + 1:]
+    m = SCOPED_FLAGS.match(body)
+    return body[m.end():] if m else None
+
+
+def _flush(runs, current):
+    if current:
+        runs.append("".join(current))
+        current.clear()
+
+
+def _literal_runs(pattern, runs, current):
+    """Appends to runs every literal string the regex must contain; current is the run being extended.
+
+    Conservative: anything not understood ends the current run.
+    """
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "(":
+            end = _group_end(pattern, i)
+            body = _group_body(pattern[i+1:end])
+            low, i = _quantifier(pattern, end + 1)
+            if body is None or low == 0 or _has_alternation(body):
+                _flush(runs, current)
+            elif low is None:
+                _literal_runs(body, runs, current)
+            else:
+                # x(abc)+y : the body appears at least once, but not contiguously with its neighbours
+                _flush(runs, current)
+                _literal_runs(body, runs, current)
+                _flush(runs, current)
+            continue
+        if c == "\\":
+            escaped = pattern[i+1:i+2]
+            i += 2
+            atom = None if escaped.isalnum() else escaped
+            if escaped in ESCAPE_OPERANDS:
+                i += ESCAPE_OPERANDS[escaped]
+            elif escaped == "N" and pattern[i:i+1] == "{":
+                i = pattern.find("}", i) + 1 or len(pattern)
+            elif escaped.isdigit():
+                while i < len(pattern) and pattern[i].isdigit():
+                    i += 1
+        elif c == "[":
+            i, atom = _class_end(pattern, i), None
+        elif c in ".^$":
+            i, atom = i + 1, None
+        else:
+            i, atom = i + 1, c
+        low, i = _quantifier(pattern, i)
+        if atom is None or low == 0:
+            _flush(runs, current)
+        else:
+            current.append(atom)
+            if low is not None:
+                _flush(runs, current)
+    return runs
+
+
+def required_literals(pattern):
+    """Literal substrings (lowercased) that every match of pattern contains."""
+    try:
+        flags = re.compile(pattern).flags
+    except re.error:
+        return []
+    if flags & re.VERBOSE or _has_alternation(pattern):
+        return []
+    current = []
+    runs = _literal_runs(pattern, [], current)
+    _flush(runs, current)
+    return [r.lower() for r in runs if len(r) >= 3]
+
+
+def index_path(apk_hash, cache_dir=None):
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, "text_index", f"{apk_hash}.tri")
+
+
+class TrigramIndex:
+    """Inverted index from lowercased trigrams to the classes whose source contains them.
+
+    Only postings are kept; matching lines are verified against the source
+    returned by source_for(name), normally the shared decompile cache. Classes
+    can be added in any order and from any thread, e.g. as the editor or the
+    exporter decompiles them.
+    """
+
+    VERSION = 1
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.postings = {}
+        self.indexed = set()
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.indexed)
+
+    @property
+    def complete(self):
+        return len(self.indexed) == len(self.names)
+
+    def contains(self, name):
+        return self.ids.get(name) in self.indexed
+
+    def missing(self):
+        return [name for i, name in enumerate(self.names) if i not in self.indexed]
+
+    def add(self, name, source):
+        doc = self.ids.get(name)
+        if doc is None or doc in self.indexed: return
+        grams = trigrams(source.lower())
+        with self._lock:
+            if doc in self.indexed: return
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array("I")
+                posting.append(doc)
+            self.indexed.add(doc)
+            self.dirty = True
+
+    def candidates(self, literals):
+        """Names of indexed classes containing every trigram of every literal."""
+        grams = set()
+        for literal in literals:
+            grams |= trigrams(literal)
+        with self._lock:
+            if not grams:
+                docs = set(self.indexed)
+            else:
+                postings = sorted((self.postings.get(g, ()) for g in grams), key=len)
+                docs = set(postings[0])
+                for posting in postings[1:]:
+                    if not docs: break
+                    docs.intersection_update(posting)
+        return [self.names[d] for d in sorted(docs)]
+
+    def search(self, query, source_for, regex=False, check_cancelled=None):
+        """Yields (name, line_no, snippet) for matching lines of indexed classes."""
+        matcher = line_matcher(query, regex)
+        literals = required_literals(query) if regex else [query.lower()]
+        for name in self.candidates(literals):
+            if check_cancelled: check_cancelled()
+            source = source_for(name)
+            if source is None: continue
+            yield from match_lines(name, source, matcher)
+
+    def save(self, path):
+        with self._lock:
+            state = {
+                "version": self.VERSION,
+                "names": self.names,
+                "indexed": sorted(self.indexed),
+                "postings": {g: p.tobytes() for g, p in self.postings.items()},
+            }
+            self.dirty = False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, names):
+        """Returns the persisted index for names, or None if missing or stale."""
+        try:
+            with open(path, "rb") as f:
+                state = pickle.loads(zlib.decompress(f.read()))
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError) as e:
+            if os.path.exists(path):
+                logger.warning(f"Ignoring unreadable text index {path}: {e}")
+            return None
+        if state.get("version") != cls.VERSION or state.get("names") != list(names):
+            return None
+        index = cls(names)
+        index.indexed = set(state["indexed"])
+        for gram, data in state["postings"].items():
+            posting = index.postings[gram] = array("I")
+            posting.frombytes(data)
+        return index
+
+
+def line_matcher(query, regex=False):
+    """Case-insensitive predicate on one line of source."""
+    if regex:
+        return re.compile(query, re.IGNORECASE).search
+    needle = query.lower()
+    return lambda line: needle in line.lower()
+
+
+def match_lines(name, source, matcher):
+    for line_no, line in enumerate(source.splitlines(), 1):
+        if matcher(line):
+            yield name, line_no, line.strip()[:SNIPPET_WIDTH]
+
+
+class IndexBuildThread(QThread):
+    """Decompiles every class not yet in the index and persists it when done."""
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(bool)
+
+    def __init__(self, index, dx, decompiler, apk_hash, path=None):
+        super().__init__()
+        self.index = index
+        self.dx = dx
+        self.decompiler = decompiler
+        self.apk_hash = apk_hash
+        self.path = path
+
+    def run(self):
+        total = len(self.index.names)
+        for i, name in enumerate(self.index.missing()):
+            if self.isInterruptionRequested(): break
+            try:
+                cls = self.dx.get_class_analysis(name).get_vm_class()
+                source, complete = self.decompiler.source_complete(self.apk_hash, cls, self.dx)
+                # Fallback text would be persisted as the class's source; leave it missing instead
+                if complete:
+                    self.index.add(name, source)
+            except Exception as e:
+                logger.debug(f"Not indexing {name}: {e}")
+            if i % 50 == 0:
+                self.progress.emit(len(self.index), total)
+        self.decompiler.flush()
+        if self.path and self.index.dirty:
+            try:
+                self.index.save(self.path)
+            except OSError as e:
+                logger.warning(f"Could not save text index: {e}")
+        self.finished.emit(self.index.complete)
@@ -0,0 +1,149 @@
+import os
+import time
+
+# Phases whose RSS growth approximates what a session keeps resident
+SESSION_PHASES = ("load_apk", "parse_dex", "add_dex", "create_xref", "cache_load")
+# Rough resident size of a full analysis relative to the APK size, used when
+# no RSS measurement is available
+FALLBACK_SIZE_FACTOR = 40
+
+
+def estimate_session_bytes(apk_path, records=()):
+    """Estimates the memory a loaded session holds from the phase records of its analysis."""
+    delta_kb = sum(r.get("rss_delta_kb") or 0 for r in records if r.get("phase") in SESSION_PHASES)
+    if delta_kb > 0:
+        return delta_kb * 1024
+    try:
+        return os.path.getsize(apk_path) * FALLBACK_SIZE_FACTOR
+    except OSError:
+        return 0
+
+
+def symbol_key(obj, is_method):
+    """Returns a picklable key for a class or method object that survives a reload."""
+    if is_method:
+        return ("method", str(obj.get_class_name()), str(obj.get_name()), str(obj.get_descriptor()))
+    return ("class", str(obj.get_name()))
+
+
+def resolve_symbol(dx, key):
+    """Maps a symbol_key back to the (obj, is_method) of a freshly loaded Analysis."""
+    try:
+        if key[0] == "method":
+            ma = dx.get_method_analysis_by_name(key[1], key[2], key[3])
+            return (ma.get_method(), True) if ma else None
+        ca = dx.get_class_analysis(key[1])
+        return (ca.get_vm_class(), False) if ca and not ca.is_external() else None
+    except Exception:
+        return None
+
+
+class AnalysisSession:
+    """One opened APK: its analysis objects plus the navigation state of its views."""
+
+    def __init__(self, apk_path=None):
+        self.apk_path = apk_path
+        self.apk = None
+        self.dex_files = None
+        self.dx = None
+        self.apk_hash = None
+        self.cache_key = None
+        self.xrefs_ready = False
+        self.pending_xref_actions = []
+        self.history = []
+        self.history_index = -1
+        # Incremental mode: {class_name: digest} and ClassChanges vs the previous version
+        self.class_digests = {}
+        self.class_changes = None
+        # DecompilerPool running this APK's decompilations out of process
+        self.decompiler_pool = None
+        # TrigramIndex over decompiled sources and the thread filling it
+        self.text_index = None
+        self.index_thread = None
+        # SymbolIndex for search-as-you-type, built once the structure is ready
+        self.symbol_index = None
+        # BytecodeIndex for instruction search, built once cross-references are done
+        self.bytecode_index = None
+        # StringTable behind the Strings tab, built once cross-references are done
+        self.string_table = None
+        self.size_bytes = 0
+        self.last_used = time.monotonic()
+        # "loaded", "spilled" (rebuildable from the analysis cache) or "dropped"
+        self.state = "new"
+        # Symbolic history/open tabs captured on eviction, replayed after rebuild
+        self.saved_state = None
+        # GUI-owned widgets (tabs, tree, dashboard); opaque to the workspace
+        self.views = None
+
+    @property
+    def name(self):
+        return os.path.basename(self.apk_path) if self.apk_path else "(no APK)"
+
+    @property
+    def loaded(self):
+        return self.dx is not None
+
+    def attach(self, apk, dex_files, dx):
+        self.apk, self.dex_files, self.dx = apk, dex_files, dx
+        self.state = "loaded"
+
+    def release(self, state):
+        self.apk = self.dex_files = self.dx = None
+        self.xrefs_ready = False
+        self.pending_xref_actions = []
+        self.history = []
+        self.history_index = -1
+        self.class_digests = {}
+        self.class_changes = None
+        self.symbol_index = None
+        self.bytecode_index = None
+        self.string_table = None
+        self.state = state
+
+
+class Workspace:
+    """Keeps several sessions open and picks LRU victims once over a memory budget."""
+
+    def __init__(self, budget_bytes, cache=None):
+        self.budget_bytes = budget_bytes
+        self.cache = cache
+        self.sessions = []
+
+    def find(self, apk_path):
+        for session in self.sessions:
+            if session.apk_path == apk_path:
+                return session
+        return None
+
+    def add(self, session):
+        self.sessions.append(session)
+        self.touch(session)
+
+    def remove(self, session):
+        if session in self.sessions:
+            self.sessions.remove(session)
+
+    def touch(self, session):
+        session.last_used = time.monotonic()
+
+    def loaded_bytes(self):
+        return sum(s.size_bytes for s in self.sessions if s.loaded)
+
+    def spill_state(self, session):
+        """'spilled' if the session can be rebuilt from the on-disk cache, else 'dropped'."""
+        if self.cache is not None and session.cache_key and self.cache.contains(session.cache_key):
+            return "spilled"
+        return "dropped"
+
+    def sessions_to_evict(self, keep=None):
+        """Least-recently-used loaded sessions to release to get back under budget."""
+        total = self.loaded_bytes()
+        victims = []
+        for session in sorted(self.sessions, key=lambda s: s.last_used):
+            if total <= self.budget_bytes:
+                break
+            if session is keep or not session.loaded:
+                continue
+            victims.append(session)
+            total -= session.size_bytes
+        return victims
@@ -1,10 +1,24 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QTabWidget, 
-                             QFileDialog, QToolBar, QStatusBar, QMessageBox, QDockWidget, QMenu, QApplication, QProgressBar, QTextEdit)
+                             QFileDialog, QToolBar, QStatusBar, QMessageBox, QDockWidget, QMenu, QApplication, QProgressBar, QTextEdit,
+                             QPushButton, QStackedWidget, QComboBox, QLabel)
 from PyQt6.QtGui import QAction, QIcon, QKeySequence, QFont
-from PyQt6.QtCore import Qt, QSize, QSettings
+from PyQt6.QtCore import Qt, QSize, QSettings, QThread, pyqtSignal
+import gc
+import logging
 import os
 
 from core.analyzer import AnalysisThread
+from core.bytecode_index import BytecodeIndexThread
+from core.archive import FAILURES_ENTRY, is_archive_path, zstandard
+from core.cache import AnalysisCache, DEFAULT_CACHE_DIR
+from core.decompile_pool import DecompilerPool
+from core.decompiler_cache import DecompileCache
+from core.incremental import ClassArtifactStore
+from core.instrumentation import format_record
+from core.strings_table import StringTableThread
+from core.symbol_index import SymbolIndexThread
+from core.text_index import IndexBuildThread, TrigramIndex, index_path
+from core.workspace import AnalysisSession, Workspace, estimate_session_bytes, resolve_symbol, symbol_key
 from gui.widgets.info_tab import InfoTab
 from gui.widgets.tree_view import ProjectTree
 from gui.widgets.code_editor import CodeEditorTab
@@ -21,19 +35,46 @@ from gui.widgets.smali_viewer import SmaliViewer
 from gui.widgets.resource_viewer import ResourceViewer
 from gui.widgets.scanner_tab import ScannerTab
 
+logger = logging.getLogger("MainWindow")
+
+def _session_attr(name):
+    # Per-APK state lives on the active session so switching sessions swaps it wholesale
+    return property(lambda self: getattr(self.session, name),
+                    lambda self, value: setattr(self.session, name, value))
+
 class MainWindow(QMainWindow):
+    apk_path = _session_attr("apk_path")
+    dx = _session_attr("dx")
+    xrefs_ready = _session_attr("xrefs_ready")
+    pending_xref_actions = _session_attr("pending_xref_actions")
+    history = _session_attr("history")
+    history_index = _session_attr("history_index")
+    # Emitted from decompiler pool supervisor threads
+    decompileStalled = pyqtSignal(str)
+    # Default worker processes for searches and scans; each one loads a full copy of the analysis
+    DEFAULT_POOL_WORKERS = 4
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Androguard GUI")
         self.resize(1200, 800)
         
         self.settings = QSettings("Gemini", "AndroguardGUI")
-        self.apk_path = None
         self.dark_mode = self.settings.value("darkMode", "True") == "True"
         self.analysis_thread = None
-        self.dx = None
-        self.history = []
-        self.history_index = -1
+        self.export_thread = None
+        # Cancelled/orphaned threads kept alive until they actually stop
+        self.background_threads = []
+        self.analysis_cache = self.create_analysis_cache()
+        self.artifact_store = None
+        self.decompile_cache = self.create_decompile_cache()
+        self.decompile_cache.listeners.append(self.index_decompiled_source)
+        self.decompileStalled.connect(
+            lambda msg: self.log_console.append(f"<font color='orange'>[~] Decompiler stalled: {msg}</font>"))
+        budget_mb = int(self.settings.value("workspaceBudgetMB", 4096))
+        self.workspace = Workspace(budget_mb * 1024 * 1024, cache=self.analysis_cache)
+        # Placeholder session shown before any APK is opened; the first load reuses it
+        self.session = AnalysisSession()
         self.navigating = False
         
         self.setup_ui()
@@ -74,13 +115,202 @@ class MainWindow(QMainWindow):
         else:
             self.setStyleSheet("")
         
-        for i in range(self.central_tabs.count()):
-            widget = self.central_tabs.widget(i)
-            if hasattr(widget, 'dark_mode'):
-                widget.dark_mode = self.dark_mode
-                if hasattr(widget, 'load_manifest'): widget.load_manifest()
-                elif hasattr(widget, 'load_code'): widget.load_code()
-                elif hasattr(widget, 'load_resources'): widget.load_resources()
+        sessions = self.workspace.sessions if self.session in self.workspace.sessions else [self.session]
+        for session in sessions:
+            tabs = session.views[0]
+            for i in range(tabs.count()):
+                widget = tabs.widget(i)
+                if hasattr(widget, 'dark_mode'):
+                    widget.dark_mode = self.dark_mode
+                    if hasattr(widget, 'load_manifest'): widget.load_manifest()
+                    elif hasattr(widget, 'load_code'): widget.load_code()
+                    elif hasattr(widget, 'load_resources'): widget.load_resources()
+
+    def create_analysis_cache(self):
+        if self.settings.value("analysisCache", "True") != "True":
+            return None
+        try:
+            max_mb = int(self.settings.value("analysisCacheMaxMB", 2048))
+            return AnalysisCache(max_bytes=max_mb * 1024 * 1024)
+        except Exception as e:
+            logger.warning(f"Analysis cache disabled: {e}")
+            return None
+
+    def create_decompile_cache(self):
+        max_mb = int(self.settings.value("decompileCacheMB", 64))
+        persist = self.settings.value("analysisCache", "True") == "True"
+        try:
+            return DecompileCache(max_bytes=max_mb * 1024 * 1024, persist=persist)
+        except Exception as e:
+            logger.warning(f"Decompiled source cache not persisted: {e}")
+            return DecompileCache(max_bytes=max_mb * 1024 * 1024, persist=False)
+
+    def decompiler_limits(self):
+        return {
+            "class_timeout": int(self.settings.value("decompileTimeout", 30)),
+            "method_timeout": int(self.settings.value("decompileMethodTimeout", 10)),
+            "memory_limit_mb": int(self.settings.value("decompileMemoryLimitMB", 0)) or None,
+        }
+
+    def open_decompiler_pool(self, session):
+        """Moves decompilation out of process once workers can load the analysis from the cache.
+
+        Until then (or with the cache off) classes are decompiled in-process:
+        each worker would otherwise re-analyze the whole APK, on start and
+        again after every timeout kill.
+        """
+        if not self.isolation_action.isChecked() or not session.apk_hash: return
+        if not self.analysis_cached(session): return
+        analysis_dir = os.path.dirname(self.analysis_cache.cache_dir) if self.analysis_cache else None
+        session.decompiler_pool = DecompilerPool(session.apk_path, 1, analysis_cache_dir=analysis_dir,
+                                                 cache_key=session.cache_key, on_stall=self.decompileStalled.emit,
+                                                 **self.decompiler_limits())
+        self.decompile_cache.backends[session.apk_hash] = session.decompiler_pool
+
+    def analysis_cached(self, session):
+        return bool(session.cache_key) and self.analysis_cache is not None and \
+            self.analysis_cache.contains(session.cache_key)
+
+    def search_pool_options(self, session):
+        """Worker settings for full-text searches, or None to search in-process.
+
+        Each worker holds its own copy of the analysis, so workers are only
+        used when they can load it from the analysis cache, their default
+        number is capped, and the session's decompiler pool is reused (grown
+        for the search) when there is one.
+        """
+        workers = int(self.settings.value("searchWorkers", 0)) or min(self.DEFAULT_POOL_WORKERS, os.cpu_count() or 1)
+        if workers < 2 or not session.apk_path or not self.analysis_cached(session): return None
+        # A pool that shut itself down could not start its workers; new ones would fail the same way
+        if session.decompiler_pool is not None and session.decompiler_pool.closed: return None
+        analysis_dir = os.path.dirname(self.analysis_cache.cache_dir)
+        return dict(pool=session.decompiler_pool, apk_path=session.apk_path, workers=workers,
+                    analysis_cache_dir=analysis_dir, cache_key=session.cache_key,
+                    on_stall=self.decompileStalled.emit, **self.decompiler_limits())
+
+    def scan_pool_options(self, session):
+        """ShardedScan arguments for security scans, or None to scan in-process.
+
+        Like searches, scan workers each load the analysis, so they need it
+        cached and their default number is capped.
+        """
+        workers = int(self.settings.value("scanWorkers", 0)) or min(self.DEFAULT_POOL_WORKERS, os.cpu_count() or 1)
+        if workers < 2 or not session.apk_path or not self.analysis_cached(session): return None
+        analysis_dir = os.path.dirname(self.analysis_cache.cache_dir)
+        dex_classes = [[str(c.get_name()) for c in d.get_classes()] for d in session.dex_files or ()]
+        return dict(apk_path=session.apk_path, workers=workers, analysis_cache_dir=analysis_dir,
+                    cache_key=session.cache_key, dex_classes=dex_classes)
+
+    def close_decompiler_pool(self, session):
+        pool, session.decompiler_pool = session.decompiler_pool, None
+        if pool is None: return
+        if self.decompile_cache.backends.get(session.apk_hash) is pool:
+            del self.decompile_cache.backends[session.apk_hash]
+        pool.close()
+
+    def open_text_index(self, session, dex_files):
+        names = sorted(str(c.get_name()) for d in dex_files for c in d.get_classes())
+        path = None
+        if session.apk_hash and self.settings.value("analysisCache", "True") == "True":
+            path = index_path(session.apk_hash)
+        index = (TrigramIndex.load(path, names) if path else None) or TrigramIndex(names)
+        session.text_index = index
+        if index.complete or self.settings.value("buildTextIndex", "True") != "True": return
+        thread = IndexBuildThread(index, session.dx, self.decompile_cache, session.apk_hash, path)
+        thread.progress.connect(lambda done, total: self.on_index_progress(session, done, total))
+        thread.finished.connect(lambda complete: self.log_console.append(
+            f"[*] Full-text index for {session.name} {'complete' if complete else 'paused'}: "
+            f"{len(index)}/{len(index.names)} classes"))
+        session.index_thread = thread
+        thread.start()
+
+    def build_symbol_index(self, session):
+        thread = SymbolIndexThread(session.dex_files)
+        dex_files = session.dex_files
+
+        def on_built(index):
+            # The session may have been evicted or reloaded meanwhile
+            if session.dex_files is dex_files:
+                session.symbol_index = index
+        thread.finished.connect(on_built)
+        self.background_threads.append(thread)
+        thread.start()
+
+    def build_string_table(self, session, strings_view):
+        dx = session.dx
+        thread = StringTableThread(list(dx.get_strings()))
+
+        def on_built(table):
+            if session.dx is dx:
+                session.string_table = table
+                strings_view.set_table(table)
+        thread.finished.connect(on_built)
+        thread.indexed.connect(strings_view.set_indexed)
+        self.background_threads.append(thread)
+        thread.start()
+
+    def build_bytecode_index(self, session):
+        dex_files = session.dex_files
+        thread = BytecodeIndexThread([c for d in dex_files for c in d.get_classes()])
+
+        def on_built(index):
+            if session.dex_files is dex_files and session.bytecode_index is None:
+                session.bytecode_index = index
+        thread.finished.connect(on_built)
+        self.background_threads.append(thread)
+        thread.start()
+
+    def on_index_progress(self, session, done, total):
+        if session is self.session and self.analysis_thread is None:
+            self.status_bar.showMessage(f"Indexing sources for full-text search: {done}/{total} classes")
+
+    def close_text_index(self, session):
+        thread, session.index_thread = session.index_thread, None
+        if thread is not None and thread.isRunning():
+            # The thread saves what it has indexed so far once it stops
+            thread.requestInterruption()
+            self.background_threads.append(thread)
+        elif session.text_index is not None and session.text_index.dirty and session.apk_hash \
+                and self.settings.value("analysisCache", "True") == "True":
+            try:
+                session.text_index.save(index_path(session.apk_hash))
+            except OSError as e:
+                logger.warning(f"Could not save text index: {e}")
+        session.text_index = None
+
+    def index_decompiled_source(self, apk_hash, name, source):
+        # Called from whichever thread decompiled the class
+        for session in list(self.workspace.sessions):
+            if session.apk_hash == apk_hash and session.text_index is not None:
+                session.text_index.add(name, source)
+
+    def open_artifact_store(self):
+        if self.artifact_store is None:
+            try:
+                self.artifact_store = ClassArtifactStore()
+            except Exception as e:
+                self.log_console.append(f"<font color='red'>[!] Class artifact store unavailable: {e}</font>")
+        return self.artifact_store
+
+    def get_artifact_store(self):
+        if not self.incremental_action.isChecked():
+            return None
+        store = self.open_artifact_store()
+        if store is not None:
+            self.decompile_cache.artifacts = store
+        return store
+
+    def get_scan_store(self):
+        """Store for per-class scan findings: open whenever the analysis cache is, incremental analysis or not."""
+        if self.analysis_cache is None and not self.incremental_action.isChecked():
+            return None
+        return self.open_artifact_store()
+
+    def clear_analysis_cache(self):
+        self.decompile_cache.clear()
+        if not self.analysis_cache: return
+        self.analysis_cache.clear()
+        self.status_bar.showMessage("Analysis cache cleared")
 
     def toggle_dark_mode(self):
         self.dark_mode = not self.dark_mode
@@ -88,22 +318,17 @@ class MainWindow(QMainWindow):
         self.apply_theme()
 
     def setup_ui(self):
-        self.central_tabs = QTabWidget()
-        self.central_tabs.setTabsClosable(True)
-        self.central_tabs.tabCloseRequested.connect(self.close_tab)
-        self.setCentralWidget(self.central_tabs)
+        self.central_stack = QStackedWidget()
+        self.setCentralWidget(self.central_stack)
         
         self.tree_dock = QDockWidget("Project Structure", self)
         self.tree_dock.setAllowedAreas(Qt.DockWidgetArea.LeftDockWidgetArea | Qt.DockWidgetArea.RightDockWidgetArea)
-        self.project_tree = ProjectTree()
-        self.project_tree.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.project_tree.customContextMenuRequested.connect(self.open_tree_context_menu)
-        self.project_tree.itemClicked.connect(self.on_tree_item_clicked)
-        self.tree_dock.setWidget(self.project_tree)
+        self.tree_stack = QStackedWidget()
+        self.tree_dock.setWidget(self.tree_stack)
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.tree_dock)
         
-        self.info_tab = InfoTab()
-        self.central_tabs.addTab(self.info_tab, "Dashboard")
+        self.create_session_views(self.session)
+        self.show_session_views(self.session)
         
         self.log_dock = QDockWidget("Log Console", self)
         self.log_dock.setAllowedAreas(Qt.DockWidgetArea.BottomDockWidgetArea)
@@ -120,8 +345,32 @@ class MainWindow(QMainWindow):
         self.progress_bar.setMaximumWidth(200)
         self.progress_bar.hide()
         self.status_bar.addPermanentWidget(self.progress_bar)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setMaximumHeight(18)
+        self.cancel_button.clicked.connect(self.cancel_analysis)
+        self.cancel_button.hide()
+        self.status_bar.addPermanentWidget(self.cancel_button)
         self.status_bar.showMessage("Ready")
 
+    def create_session_views(self, session):
+        tabs = QTabWidget()
+        tabs.setTabsClosable(True)
+        tabs.tabCloseRequested.connect(self.close_tab)
+        tree = ProjectTree()
+        tree.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        tree.customContextMenuRequested.connect(self.open_tree_context_menu)
+        tree.itemClicked.connect(self.on_tree_item_clicked)
+        info = InfoTab()
+        tabs.addTab(info, "Dashboard")
+        self.central_stack.addWidget(tabs)
+        self.tree_stack.addWidget(tree)
+        session.views = (tabs, tree, info)
+
+    def show_session_views(self, session):
+        self.central_tabs, self.project_tree, self.info_tab = session.views
+        self.central_stack.setCurrentWidget(self.central_tabs)
+        self.tree_stack.setCurrentWidget(self.project_tree)
+
     def setup_menu(self):
         menubar = self.menuBar()
         self.file_menu = menubar.addMenu("&File")
@@ -134,6 +383,36 @@ class MainWindow(QMainWindow):
         export_action = QAction("Export to Java...", self)
         export_action.triggered.connect(self.export_to_java)
         self.file_menu.addAction(export_action)
+        export_archive_action = QAction("Export to Archive (.zip / .tar.zst)...", self)
+        export_archive_action.triggered.connect(self.export_to_archive)
+        self.file_menu.addAction(export_archive_action)
+        close_session_action = QAction("Close Session", self)
+        close_session_action.setShortcut("Ctrl+W")
+        close_session_action.triggered.connect(self.close_session)
+        self.file_menu.addAction(close_session_action)
+        clear_cache_action = QAction("Clear Analysis Cache", self)
+        clear_cache_action.triggered.connect(self.clear_analysis_cache)
+        self.file_menu.addAction(clear_cache_action)
+        self.parallel_action = QAction("Parallel DEX Parsing", self)
+        self.parallel_action.setCheckable(True)
+        self.parallel_action.setChecked(self.settings.value("parallelDexParsing", "True") == "True")
+        self.parallel_action.toggled.connect(lambda on: self.settings.setValue("parallelDexParsing", str(on)))
+        self.file_menu.addAction(self.parallel_action)
+        self.profile_action = QAction("Profile Analysis (cProfile/tracemalloc)", self)
+        self.profile_action.setCheckable(True)
+        self.profile_action.setChecked(self.settings.value("profileAnalysis", "False") == "True")
+        self.profile_action.toggled.connect(lambda on: self.settings.setValue("profileAnalysis", str(on)))
+        self.file_menu.addAction(self.profile_action)
+        self.incremental_action = QAction("Incremental Analysis (reuse unchanged classes)", self)
+        self.incremental_action.setCheckable(True)
+        self.incremental_action.setChecked(self.settings.value("incrementalAnalysis", "False") == "True")
+        self.incremental_action.toggled.connect(lambda on: self.settings.setValue("incrementalAnalysis", str(on)))
+        self.file_menu.addAction(self.incremental_action)
+        self.isolation_action = QAction("Decompile in Worker Process (timeouts, smali fallback)", self)
+        self.isolation_action.setCheckable(True)
+        self.isolation_action.setChecked(self.settings.value("isolatedDecompilation", "True") == "True")
+        self.isolation_action.toggled.connect(lambda on: self.settings.setValue("isolatedDecompilation", str(on)))
+        self.file_menu.addAction(self.isolation_action)
         self.file_menu.addSeparator()
         device_menu = menubar.addMenu("&Device")
         list_packages_action = QAction("&List Packages...", self)
@@ -160,6 +439,12 @@ class MainWindow(QMainWindow):
         device_action.triggered.connect(self.open_device_dialog)
         toolbar.addAction(device_action)
         toolbar.addSeparator()
+        toolbar.addWidget(QLabel(" Session: "))
+        self.session_combo = QComboBox()
+        self.session_combo.setMinimumWidth(200)
+        self.session_combo.activated.connect(self.on_session_combo_activated)
+        toolbar.addWidget(self.session_combo)
+        toolbar.addSeparator()
         self.back_action = QAction("Back", self)
         self.back_action.setShortcut(QKeySequence.StandardKey.Back)
         self.back_action.triggered.connect(self.go_back)
@@ -203,17 +488,71 @@ class MainWindow(QMainWindow):
         if not self.dx:
             QMessageBox.warning(self, "Export", "Analyze an APK first.")
             return
+        # Exporters iterate dx's classes, which the XREF pass is still adding to
+        if not self.xrefs_ready:
+            self.when_xrefs_ready(self.export_to_java)
+            return
         out_dir = QFileDialog.getExistingDirectory(self, "Select Export Directory")
         if not out_dir: return
+        self.start_export(out_dir)
+
+    def export_to_archive(self):
+        if not self.dx:
+            QMessageBox.warning(self, "Export", "Analyze an APK first.")
+            return
+        if not self.xrefs_ready:
+            self.when_xrefs_ready(self.export_to_archive)
+            return
+        default = os.path.splitext(os.path.basename(self.apk_path))[0] + "-sources.zip"
+        path, selected = QFileDialog.getSaveFileName(self, "Export to Archive", default,
+                                                     "Zip archive (*.zip);;Zstandard tarball (*.tar.zst)")
+        if not path: return
+        if not path.lower().endswith((".zip", ".tar.zst")):
+            path += ".tar.zst" if "zst" in selected else ".zip"
+        if path.lower().endswith(".tar.zst") and zstandard is None:
+            QMessageBox.warning(self, "Export", "Install the 'zstandard' package to export .tar.zst archives.")
+            return
+        self.start_export(path, index=self.settings.value("exportArchiveIndex", "True") == "True")
+
+    def start_export(self, out_path, index=False):
         from core.exporter import ExportThread
         from PyQt6.QtWidgets import QProgressDialog
         progress = QProgressDialog("Exporting classes...", "Cancel", 0, 0, self)
         progress.setWindowModality(Qt.WindowModality.WindowModal)
         progress.show()
-        self.export_thread = ExportThread(self.dx, out_dir)
-        self.export_thread.progress.connect(lambda m: progress.setLabelText(f"Exporting: {m}"))
-        self.export_thread.finished.connect(lambda: (progress.cancel(), QMessageBox.information(self, "Export", "Export Complete!")))
-        self.export_thread.start()
+        workers = int(self.settings.value("exportWorkers", 0)) or None
+        thread = ExportThread(self.dx, out_path, self.decompile_cache, self.session.apk_hash, self.apk_path,
+                              max_workers=workers, analysis_cache=self.analysis_cache, cache_key=self.session.cache_key,
+                              index=index, **self.decompiler_limits())
+        self.export_thread = thread
+
+        def on_progress(done, total, message):
+            progress.setMaximum(total)
+            progress.setValue(done)
+            progress.setLabelText(f"Exporting: {message}")
+
+        def on_finished(summary):
+            progress.canceled.disconnect()
+            progress.cancel()
+            text = (f"Exported {summary['exported']} classes in {summary['elapsed']:.1f}s"
+                    f" ({summary['resumed']} already done by a previous run).")
+            if summary["failed"]:
+                where = f"{FAILURES_ENTRY} in " if is_archive_path(out_path) else ""
+                text += f"\n{summary['failed']} classes failed, see {where}{summary['output']}"
+            if summary["partial"]:
+                text += f"\n{summary['partial']} classes stalled and were exported per method or as smali."
+            if summary["cancelled"] and is_archive_path(out_path):
+                text = "Export cancelled, the incomplete archive was discarded.\n" + text
+            elif summary["cancelled"]:
+                text = "Export cancelled. Run it again on the same directory to resume.\n" + text
+            self.log_console.append(f"[*] {text}")
+            QMessageBox.information(self, "Export", text)
+
+        progress.canceled.connect(thread.cancel)
+        thread.stalled.connect(self.decompileStalled.emit)
+        thread.progress.connect(on_progress)
+        thread.finished.connect(on_finished)
+        thread.start()
 
     def open_apk_dialog(self):
         file_name, _ = QFileDialog.getOpenFileName(self, "Open APK", "", "APK Files (*.apk);;All Files (*)")
@@ -228,64 +567,306 @@ class MainWindow(QMainWindow):
         if not self.dx:
             QMessageBox.warning(self, "Search", "Please load and analyze an APK first.")
             return
-        dialog = SearchDialog(self, self.dx)
-        if dialog.exec():
+        # Searches iterate dx's classes, which the XREF pass is still adding to
+        if not self.xrefs_ready:
+            self.when_xrefs_ready(self.open_search_dialog)
+            return
+        session = self.session
+        dialog = SearchDialog(self, self.dx, self.decompile_cache, session.apk_hash, session.text_index,
+                              session.symbol_index, session.bytecode_index,
+                              int(self.settings.value("searchResultLimit", 1000)), self.search_pool_options(session),
+                              session.string_table)
+        accepted = dialog.exec()
+        # A search stopped on close may still be unwinding
+        if dialog.thread is not None and dialog.thread.isRunning():
+            self.background_threads.append(dialog.thread)
+        # Keep an instruction index the dialog had to build itself
+        if session.bytecode_index is None and session.dx is self.dx:
+            session.bytecode_index = dialog.bytecode_index
+        if accepted:
             if dialog.selected_obj:
                 is_method = (dialog.selected_type == 'method')
                 self.open_code_tab(dialog.selected_obj, is_method=is_method)
 
     def load_apk(self, path):
-        self.apk_path = path
         self.add_to_recent_files(path)
-        self.log_console.append(f"<b>Loading {path}...</b>")
-        self.status_bar.showMessage(f"Loading {path}...")
-        self.project_tree.clear()
-        self.history = []
-        self.history_index = -1
+        session = self.workspace.find(path)
+        if session is None:
+            if self.session.apk_path is None and self.session not in self.workspace.sessions:
+                session = self.session
+                session.apk_path = path
+            else:
+                session = AnalysisSession(path)
+                self.create_session_views(session)
+            self.workspace.add(session)
+        self.activate_session(session)
+
+    def activate_session(self, session):
+        if session is not self.session:
+            if self.analysis_thread is not None and self.analysis_thread.isRunning():
+                self.cancel_analysis()
+            self.session = session
+            self.show_session_views(session)
+        self.workspace.touch(session)
         self.update_nav_buttons()
-        while self.central_tabs.count() > 1: self.central_tabs.removeTab(1)
+        self.refresh_session_combo()
+        self.setWindowTitle(f"Androguard GUI - {session.name}")
+        if session.apk_path and not session.loaded and self.analysis_thread is None:
+            self.start_analysis(session)
+
+    def start_analysis(self, session):
+        path = session.apk_path
+        self.prune_background_threads()
+        if session.state in ("spilled", "dropped"):
+            self.log_console.append(f"<b>Rebuilding session {session.name} ({session.state})...</b>")
+        else:
+            self.log_console.append(f"<b>Loading {path}...</b>")
+        self.status_bar.showMessage(f"Loading {path}...")
+        self.reset_analysis_ui()
         self.progress_bar.setValue(0)
         self.progress_bar.show()
-        self.analysis_thread = AnalysisThread(path)
+        self.cancel_button.show()
+        profile_dir = os.path.join(DEFAULT_CACHE_DIR, "profiles") if self.profile_action.isChecked() else None
+        self.analysis_thread = AnalysisThread(path, cache=self.analysis_cache, parallel=self.parallel_action.isChecked(),
+                                              profile_dir=profile_dir, artifacts=self.get_artifact_store())
+        self.analysis_thread.structure_ready.connect(self.on_structure_ready)
         self.analysis_thread.finished.connect(self.on_analysis_finished)
         self.analysis_thread.progress.connect(self.on_analysis_progress)
+        self.analysis_thread.metrics.connect(self.on_analysis_metrics)
         self.analysis_thread.error.connect(self.on_analysis_error)
+        self.analysis_thread.cancelled.connect(self.on_thread_cancelled)
+        self.analysis_thread.class_changes.connect(self.on_class_changes)
         self.analysis_thread.start()
         self.project_tree.setEnabled(False)
 
+    def reset_analysis_ui(self):
+        """Drops every reference the UI holds to the current APK/DEX/Analysis objects."""
+        self.reset_session_views(self.session)
+        self.update_nav_buttons()
+        self.cfg_window = None
+
+    def reset_session_views(self, session):
+        tabs, tree, _ = session.views
+        self.close_text_index(session)
+        self.close_decompiler_pool(session)
+        tree.clear()
+        tree.apk = tree.classes_dex = tree.analysis = None
+        session.release(session.state)
+        while tabs.count() > 1:
+            widget = tabs.widget(1)
+            tabs.removeTab(1)
+            self.retire_widget(widget)
+
+    def save_session_state(self, session):
+        """Captures history and open code tabs as symbolic keys so they survive eviction."""
+        tabs, _, _ = session.views
+        open_tabs = []
+        for i in range(tabs.count()):
+            widget = tabs.widget(i)
+            if isinstance(widget, CodeEditorTab):
+                open_tabs.append(symbol_key(widget.class_obj, widget.is_method))
+        return {
+            "tabs": open_tabs,
+            "history": [symbol_key(obj, is_method) for obj, is_method in session.history],
+            "history_index": session.history_index,
+        }
+
+    def restore_session_state(self, session):
+        saved, session.saved_state = session.saved_state, None
+        if not saved: return
+        self.navigating = True
+        for key in saved["tabs"]:
+            resolved = resolve_symbol(session.dx, key)
+            if resolved: self.open_code_tab(*resolved)
+        self.navigating = False
+        history, index = [], -1
+        for i, key in enumerate(saved["history"]):
+            resolved = resolve_symbol(session.dx, key)
+            if not resolved: continue
+            history.append(resolved)
+            if i <= saved["history_index"]: index = len(history) - 1
+        session.history, session.history_index = history, index
+        self.update_nav_buttons()
+
+    def evict_session(self, session):
+        saved = self.save_session_state(session)
+        self.reset_session_views(session)
+        session.release(self.workspace.spill_state(session))
+        session.saved_state = saved
+        self.log_console.append(f"<font color='orange'>[~] Session {session.name} {session.state} to stay within the memory budget</font>")
+        gc.collect()
+
+    def enforce_memory_budget(self):
+        victims = self.workspace.sessions_to_evict(keep=self.session)
+        for session in victims: self.evict_session(session)
+        if victims: self.refresh_session_combo()
+
+    def close_session(self):
+        session = self.session
+        if session not in self.workspace.sessions: return
+        if self.analysis_thread is not None and self.analysis_thread.isRunning():
+            self.cancel_analysis()
+        self.reset_session_views(session)
+        self.workspace.remove(session)
+        for widget in session.views:
+            widget.setParent(None)
+            widget.deleteLater()
+        session.views = None
+        remaining = sorted(self.workspace.sessions, key=lambda s: s.last_used)
+        if remaining:
+            self.session = remaining[-1]
+        else:
+            self.session = AnalysisSession()
+            self.create_session_views(self.session)
+        self.show_session_views(self.session)
+        gc.collect()
+        self.activate_session(self.session)
+
+    def refresh_session_combo(self):
+        self.session_combo.blockSignals(True)
+        self.session_combo.clear()
+        for session in self.workspace.sessions:
+            label = session.name if session.state in ("loaded", "new") else f"{session.name} ({session.state})"
+            self.session_combo.addItem(label, session.apk_path)
+        if self.session in self.workspace.sessions:
+            self.session_combo.setCurrentIndex(self.workspace.sessions.index(self.session))
+        self.session_combo.blockSignals(False)
+
+    def on_session_combo_activated(self, index):
+        if 0 <= index < len(self.workspace.sessions):
+            self.activate_session(self.workspace.sessions[index])
+
+    def retire_widget(self, widget):
+        # A QThread must outlive its run(), keep busy worker threads until they stop
+        thread = getattr(widget, 'thread', None)
+        if isinstance(thread, QThread) and thread.isRunning():
+            self.background_threads.append(thread)
+        widget.deleteLater()
+
+    def cancel_analysis(self):
+        thread = self.analysis_thread
+        if thread is None: return
+        self.analysis_thread = None
+        for signal in (thread.structure_ready, thread.finished, thread.progress, thread.metrics, thread.error,
+                       thread.class_changes):
+            try: signal.disconnect()
+            except TypeError: pass
+        if thread.isRunning():
+            thread.cancel()
+            self.background_threads.append(thread)
+        self.reset_analysis_ui()
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+        self.project_tree.setEnabled(True)
+        self.status_bar.showMessage("Analysis cancelled")
+        self.log_console.append("<font color='orange'><b>[!] Analysis cancelled</b></font>")
+        gc.collect()
+
+    def on_thread_cancelled(self):
+        thread = self.sender()
+        if thread is not None: thread.wait()
+        self.prune_background_threads()
+
+    def prune_background_threads(self):
+        self.background_threads = [t for t in self.background_threads if t.isRunning()]
+        gc.collect()
+
+    def is_current_analysis(self):
+        # Signals already queued by a cancelled thread may still be delivered
+        return self.sender() is self.analysis_thread
+
     def on_analysis_progress(self, msg, val):
+        if not self.is_current_analysis(): return
         self.status_bar.showMessage(msg)
         self.log_console.append(f"[*] {msg}")
         self.progress_bar.setValue(val)
 
+    def on_analysis_metrics(self, record):
+        if not self.is_current_analysis(): return
+        self.log_console.append(f"<font color='gray'>[t] {format_record(record)}</font>")
+
+    def on_structure_ready(self, apk, classes, dex):
+        if not self.is_current_analysis(): return
+        self.status_bar.showMessage("Structure ready, building cross-references...")
+        self.log_console.append("<font color='green'><b>[+] Structure ready</b></font>")
+        self.session.attach(apk, classes, dex)
+        self.session.apk_hash = self.analysis_thread.apk_hash
+        self.build_symbol_index(self.session)
+        self.project_tree.setEnabled(True)
+        self.project_tree.populate(apk, classes, dex)
+        self.info_tab.update_info(apk)
+        manifest_view = ManifestViewer(apk, dark_mode=self.dark_mode)
+        self.central_tabs.insertTab(1, manifest_view, "Manifest")
+        res_view = ResourceViewer(apk, dark_mode=self.dark_mode)
+        self.central_tabs.addTab(res_view, "Resources")
+        files_view = FilesView(apk)
+        files_view.fileSelected.connect(self.open_hex_tab)
+        self.central_tabs.addTab(files_view, "Files")
+        cert_view = CertViewer(apk)
+        self.central_tabs.addTab(cert_view, "Certificates")
+        self.restore_session_state(self.session)
+
+    def on_class_changes(self, changes):
+        if not self.is_current_analysis(): return
+        self.session.class_digests = changes.digests
+        self.session.class_changes = changes
+        if changes.has_previous:
+            self.log_console.append(f"<font color='cyan'>[Δ] Changes since previous version: {changes.summary()}</font>")
+            self.project_tree.show_changes(changes)
+
     def on_analysis_finished(self, apk, classes, dex):
+        if not self.is_current_analysis(): return
         self.status_bar.showMessage("Analysis Complete")
         self.log_console.append("<font color='green'><b>[+] Analysis Complete!</b></font>")
         self.progress_bar.hide()
-        self.dx = dex 
-        self.project_tree.setEnabled(True)
-        self.project_tree.populate(apk, classes, dex)
-        self.info_tab.update_info(apk)
-        self.manifest_view = ManifestViewer(apk, dark_mode=self.dark_mode)
-        self.central_tabs.insertTab(1, self.manifest_view, "Manifest")
-        self.res_view = ResourceViewer(apk, dark_mode=self.dark_mode)
-        self.central_tabs.addTab(self.res_view, "Resources")
-        self.scanner_view = ScannerTab(dex)
-        self.scanner_view.methodSelected.connect(lambda m: self.open_code_tab(m, is_method=True))
-        self.central_tabs.addTab(self.scanner_view, "Security Scan")
-        self.files_view = FilesView(apk)
-        self.files_view.fileSelected.connect(self.open_hex_tab)
-        self.central_tabs.addTab(self.files_view, "Files")
-        self.cert_view = CertViewer(apk)
-        self.central_tabs.addTab(self.cert_view, "Certificates")
-        self.strings_view = StringsView(dex)
-        self.strings_view.stringClicked.connect(self.open_method_from_string)
-        self.central_tabs.addTab(self.strings_view, "Strings")
+        self.cancel_button.hide()
+        self.xrefs_ready = True
+        scanner_view = ScannerTab(dex, self.get_scan_store(), self.session.class_digests, apk,
+                                  self.settings.value("rulePacks", []) or [], self.apk_path, self.session.apk_hash,
+                                  self.scan_pool_options(self.session))
+        scanner_view.rulePackAdded.connect(self.remember_rule_pack)
+        scanner_view.methodSelected.connect(lambda m: self.open_code_tab(m, is_method=True))
+        self.central_tabs.addTab(scanner_view, "Security Scan")
+        strings_view = StringsView(dex)
+        strings_view.stringClicked.connect(self.open_method_from_string)
+        self.central_tabs.addTab(strings_view, "Strings")
+        self.build_string_table(self.session, strings_view)
+        thread = self.analysis_thread
+        self.session.cache_key = thread.cache_key
+        self.open_decompiler_pool(self.session)
+        self.open_text_index(self.session, classes)
+        self.build_bytecode_index(self.session)
+        self.session.size_bytes = estimate_session_bytes(self.apk_path, thread.recorder.records)
+        # run() is still unwinding; keep the thread object alive until it stops
+        self.background_threads.append(thread)
+        self.analysis_thread = None
+        self.refresh_session_combo()
+        self.enforce_memory_budget()
+        pending, self.pending_xref_actions = self.pending_xref_actions, []
+        for action in pending: action()
+
+    def remember_rule_pack(self, path):
+        packs = list(self.settings.value("rulePacks", []) or [])
+        if path not in packs:
+            self.settings.setValue("rulePacks", packs + [path])
+
+    def when_xrefs_ready(self, action):
+        """Runs action now if XREFs are built, otherwise once they are."""
+        if self.xrefs_ready:
+            action()
+            return
+        self.pending_xref_actions.append(action)
+        self.status_bar.showMessage("Waiting for cross-references to finish...")
 
     def on_analysis_error(self, msg):
+        if not self.is_current_analysis(): return
         self.status_bar.showMessage(f"Error: {msg}")
         self.log_console.append(f"<font color='red'><b>[!] Error: {msg}</b></font>")
         self.progress_bar.hide()
+        self.cancel_button.hide()
+        self.pending_xref_actions = []
+        self.background_threads.append(self.analysis_thread)
+        self.analysis_thread = None
         QMessageBox.critical(self, "Error", f"Failed to analyze APK:\n{msg}")
         self.project_tree.setEnabled(True)
 
@@ -327,6 +908,9 @@ class MainWindow(QMainWindow):
 
     def show_xrefs(self, method_obj):
         if not self.dx: return
+        if not self.xrefs_ready:
+            self.when_xrefs_ready(lambda: self.show_xrefs(method_obj))
+            return
         ma = self.dx.get_method(method_obj)
         if not ma:
             QMessageBox.information(self, "XRefs", "No analysis data for this method.")
@@ -369,10 +953,43 @@ class MainWindow(QMainWindow):
             if self.central_tabs.tabText(i) == name:
                 self.central_tabs.setCurrentIndex(i)
                 return
-        editor = CodeEditorTab(obj, is_method, dx=self.dx, dark_mode=self.dark_mode)
+        digest = None if is_method else self.session.class_digests.get(str(obj.get_name()))
+        editor = CodeEditorTab(obj, is_method, dx=self.dx, dark_mode=self.dark_mode, decompiler=self.decompile_cache,
+                               apk_hash=self.session.apk_hash, digest=digest)
         self.central_tabs.addTab(editor, name)
         self.central_tabs.setCurrentWidget(editor)
 
+    def running_threads(self):
+        """Every worker thread the window or the tabs of any session may still be running."""
+        threads = self.background_threads + [self.analysis_thread, self.export_thread]
+        sessions = self.workspace.sessions if self.session in self.workspace.sessions else [self.session]
+        for session in sessions:
+            if session.views is None: continue
+            tabs = session.views[0]
+            for i in range(tabs.count()):
+                widget = tabs.widget(i)
+                threads.append(getattr(widget, 'thread', None))
+                threads += getattr(widget, 'threads', [])
+        return [t for t in threads if isinstance(t, QThread)]
+
+    def closeEvent(self, event):
+        # Text index threads save their progress once interrupted
+        for session in self.workspace.sessions:
+            self.close_text_index(session)
+        threads = self.running_threads()
+        for thread in threads:
+            # cancel() also releases what a parked search holds
+            cancel = getattr(thread, 'cancel', None)
+            if cancel is not None: cancel()
+            else: thread.requestInterruption()
+        # Resolves pending decompilations so threads waiting on them can stop
+        for session in self.workspace.sessions:
+            self.close_decompiler_pool(session)
+        for thread in threads:
+            thread.wait()
+        self.decompile_cache.flush()
+        super().closeEvent(event)
+
     def close_tab(self, index): self.central_tabs.removeTab(index)
     def add_history(self, obj, is_method):
         self.history = self.history[:self.history_index+1]
@@ -1,5 +1,6 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QTextEdit
 from PyQt6.QtGui import QFont
+from core.report import certificate_info
 
 class CertViewer(QWidget):
     def __init__(self, apk):
@@ -18,8 +19,7 @@ class CertViewer(QWidget):
 
     def load_certs(self):
         try:
-            # Newer androguard might return a generator or a slightly different list
-            certs = list(self.apk.get_certificates())
+            certs = certificate_info(self.apk)
             if not certs:
                 self.editor.setPlainText("No certificates found.")
                 return
@@ -28,34 +28,14 @@ class CertViewer(QWidget):
             for i, cert in enumerate(certs):
                 out.append(f"Certificate #{i}")
                 out.append("-" * 20)
-                
-                # Use getattr to be safe with different androguard versions
-                def get_val(obj, attr):
-                    val = getattr(obj, attr, "N/A")
-                    if callable(val):
-                        try: val = val()
-                        except: val = "N/A"
-                    return str(val)
-
-                # Issuer/Subject might be objects with human_friendly or just strings
-                issuer = getattr(cert, 'issuer', None)
-                if hasattr(issuer, 'human_friendly'):
-                    out.append(f"Issuer: {issuer.human_friendly}")
-                else:
-                    out.append(f"Issuer: {str(issuer)}")
-
-                subject = getattr(cert, 'subject', None)
-                if hasattr(subject, 'human_friendly'):
-                    out.append(f"Subject: {subject.human_friendly}")
-                else:
-                    out.append(f"Subject: {str(subject)}")
-
-                out.append(f"Serial: {get_val(cert, 'serial_number')}")
-                out.append(f"Algorithm: {get_val(cert, 'signature_algo')}")
-                out.append(f"Valid From: {get_val(cert, 'not_before')}")
-                out.append(f"Valid Until: {get_val(cert, 'not_after')}")
-                out.append(f"SHA1: {get_val(cert, 'sha1_fingerprint')}")
-                out.append(f"SHA256: {get_val(cert, 'sha256_fingerprint')}")
+                out.append(f"Issuer: {cert['issuer']}")
+                out.append(f"Subject: {cert['subject']}")
+                out.append(f"Serial: {cert['serial']}")
+                out.append(f"Algorithm: {cert['algorithm']}")
+                out.append(f"Valid From: {cert['valid_from']}")
+                out.append(f"Valid Until: {cert['valid_until']}")
+                out.append(f"SHA1: {cert['sha1']}")
+                out.append(f"SHA256: {cert['sha256']}")
                 out.append("\n")
                 
             self.editor.setPlainText("\n".join(out))
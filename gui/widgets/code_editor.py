@@ -1,38 +1,44 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QTextEdit, QLabel
 from PyQt6.QtGui import QFont
 from PyQt6.QtCore import QThread, pyqtSignal
-from androguard.decompiler.dad.decompile import DvClass, DvMethod
 from pygments import highlight
 from pygments.lexers import JavaLexer
 from pygments.formatters import HtmlFormatter
+from core.decompiler_cache import decompile
 
 class DecompilerThread(QThread):
     finished = pyqtSignal(str)
-    def __init__(self, obj, dx, is_method=False):
+    def __init__(self, obj, dx, is_method=False, decompiler=None, apk_hash=None, digest=None):
         super().__init__()
         self.obj = obj
         self.dx = dx
         self.is_method = is_method
+        self.decompiler = decompiler
+        self.apk_hash = apk_hash
+        self.digest = digest
     def run(self):
         try:
             if not self.dx:
                 self.finished.emit("Analysis object (dx) not available.")
                 return
-            if self.is_method:
-                dv = DvMethod(self.obj, self.dx)
+            if self.decompiler is not None:
+                source = self.decompiler.source(self.apk_hash, self.obj, self.dx, self.is_method, self.digest)
             else:
-                dv = DvClass(self.obj, self.dx)
-            dv.process()
-            self.finished.emit(dv.get_source())
+                source = decompile(self.obj, self.dx, self.is_method)
+            self.finished.emit(source)
         except Exception as e:
             self.finished.emit(f"Decompilation failed: {e}")
 
 class CodeEditorTab(QWidget):
-    def __init__(self, class_obj, is_method=False, dx=None, dark_mode=True):
+    def __init__(self, class_obj, is_method=False, dx=None, dark_mode=True, decompiler=None, apk_hash=None,
+                 digest=None):
         super().__init__()
         self.class_obj = class_obj
         self.dx = dx
         self.is_method = is_method
+        self.decompiler = decompiler
+        self.apk_hash = apk_hash
+        self.digest = digest
         self.dark_mode = dark_mode
         self.setup_ui()
         self.load_code()
@@ -51,7 +57,8 @@ class CodeEditorTab(QWidget):
 
     def load_code(self):
         if self.dx:
-            self.thread = DecompilerThread(self.class_obj, self.dx, self.is_method)
+            self.thread = DecompilerThread(self.class_obj, self.dx, self.is_method, self.decompiler,
+                                           self.apk_hash, self.digest)
             self.thread.finished.connect(self.on_decompile_finished)
             self.thread.start()
         else:
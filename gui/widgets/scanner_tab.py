@@ -1,100 +1,384 @@
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QListWidget, QListWidgetItem, 
-                             QLabel, QPushButton, QProgressBar, QMessageBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableView, QHeaderView, QLineEdit, QComboBox,
+                             QLabel, QPushButton, QProgressBar, QMessageBox, QFileDialog)
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from core.rules import (SEVERITIES, export_findings, load_pack, load_ruleset, scan, scan_digests, scan_marker,
+                        RuleError, ScanCancelled)
+import time
+
+SORT_ROLE = Qt.ItemDataRole.UserRole + 1
+
+class ScanRow:
+    """Findings of one category in one method, merged."""
+    __slots__ = ("severity", "category", "class_name", "method_name", "count", "offset", "method", "rules")
+
+    def __init__(self, finding):
+        method = finding.method
+        self.severity = SEVERITIES.index(finding.rule.severity)
+        self.category = finding.rule.category
+        self.class_name = finding.class_name
+        self.method_name = f"{method.get_name()}{method.get_descriptor()}" if method is not None else ""
+        self.count = 0
+        self.offset = None
+        self.method = method
+        self.rules = set()
+        self.add(finding)
+
+    def add(self, finding):
+        self.severity = max(self.severity, SEVERITIES.index(finding.rule.severity))
+        self.count += finding.count
+        if finding.offset is not None and (self.offset is None or finding.offset < self.offset):
+            self.offset = finding.offset
+        self.rules.add(finding.rule.id)
+
+    def merge(self, other):
+        self.severity = max(self.severity, other.severity)
+        self.count += other.count
+        if other.offset is not None and (self.offset is None or other.offset < self.offset):
+            self.offset = other.offset
+        self.rules |= other.rules
+
+    def copy(self):
+        row = ScanRow.__new__(ScanRow)
+        for attr in ScanRow.__slots__:
+            setattr(row, attr, getattr(self, attr))
+        row.rules = set(self.rules)
+        return row
 
 class ScannerThread(QThread):
-    found = pyqtSignal(str, object, str)
-    finished = pyqtSignal()
+    # [(key, ScanRow)] of rows added or changed since the previous batch
+    batch = pyqtSignal(list)
+    # every Finding, for export; False when the scan was stopped
+    finished = pyqtSignal(list, bool)
     progress = pyqtSignal(int)
 
-    HOTSPOTS = {
-        "Crypto": ["Ljavax/crypto/Cipher;", "Ljava/security/MessageDigest;"],
-        "Network": ["Ljava/net/URL;", "Lokhttp3/OkHttpClient;", "Lorg/apache/http/client/HttpClient;"],
-        "Reflection": ["Ljava/lang/reflect/Method;", "Ljava/lang/Class;->forName"],
-        "Execution": ["Ljava/lang/Runtime;->exec", "Ljava/lang/ProcessBuilder;"],
-        "Webview": ["Landroid/webkit/WebView;->loadUrl", "Landroid/webkit/WebView;->addJavascriptInterface"],
-        "File": ["Ljava/io/File;"],
-        "SMS": ["Landroid/telephony/SmsManager;"]
-    }
-
-    def __init__(self, dx):
+    BATCH_INTERVAL = 0.2
+
+    def __init__(self, dx, ruleset, apk=None, artifacts=None, digests=None, apk_hash=None, parallel=None):
         super().__init__()
         self.dx = dx
+        self.ruleset = ruleset
+        self.apk = apk
+        self.artifacts = artifacts
+        self.digests = digests
+        self.apk_hash = apk_hash
+        self.parallel = parallel
+
+    def check_cancelled(self):
+        if self.isInterruptionRequested():
+            raise ScanCancelled()
 
     def run(self):
-        classes = list(self.dx.get_classes())
-        total = len(classes)
-        
-        for i, c in enumerate(classes):
-            if i % 50 == 0:
-                self.progress.emit(int((i / total) * 100))
-                
-            for method in c.get_methods():
-                m_obj = method.get_method()
-                
-                if not hasattr(m_obj, 'get_code'):
-                    continue
-                    
-                code = m_obj.get_code()
-                if not code: continue
-                
-                # DalvikCode doesn't have get_instructions() in some versions
-                # It has get_instruction() or we can iterate the bytecode
-                for ins in code.get_bc().get_instructions():
-                    output = str(ins.get_output())
-                    for category, keywords in self.HOTSPOTS.items():
-                        for k in keywords:
-                            if k in output:
-                                desc = f"{category} call: {output}"
-                                self.found.emit(category, m_obj, desc)
-        self.finished.emit()
+        digests = self.digests
+        if not digests and self.artifacts is not None:
+            # Per-class findings are cached even without incremental analysis
+            digests = scan_digests(self.dx, self.artifacts, self.apk_hash)
+        # Aggregated here so the GUI thread only sees one row per (category, method)
+        rows = {}
+        changed = set()
+        findings = []
+        last_emit = time.perf_counter()
+        complete = True
+        try:
+            for finding in scan(self.dx, self.ruleset, self.apk, self.progress.emit, self.artifacts, digests,
+                                self.parallel, self.check_cancelled):
+                findings.append(finding)
+                key = (finding.rule.category, finding.location)
+                row = rows.get(key)
+                if row is None:
+                    rows[key] = ScanRow(finding)
+                else:
+                    row.add(finding)
+                changed.add(key)
+                now = time.perf_counter()
+                if now - last_emit >= self.BATCH_INTERVAL:
+                    self.batch.emit([(k, rows[k].copy()) for k in changed])
+                    changed.clear()
+                    last_emit = now
+        except ScanCancelled:
+            complete = False
+        if changed:
+            self.batch.emit([(k, rows[k].copy()) for k in changed])
+        if complete and self.artifacts is not None and self.apk_hash:
+            self.artifacts.put(self.apk_hash, scan_marker(self.ruleset), {"findings": len(findings)})
+        self.finished.emit(findings, complete)
+
+class ScanResultsModel(QAbstractTableModel):
+    HEADERS = ["Severity", "Category", "Class", "Method", "Count", "First Offset"]
+    # Group by: None (one row per category and method), "class" or "category"
+    GROUPINGS = (None, "class", "category")
+
+    def __init__(self):
+        super().__init__()
+        self.base = {}
+        # group key -> keys of the base rows summed into it
+        self.members = {}
+        self.grouping = None
+        self.rows = []
+        self.index_of = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid(): return None
+        row = self.rows[index.row()][1]
+        col = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if col == 0: return SEVERITIES[row.severity]
+            if col == 4: return row.count
+            if col == 5: return f"0x{row.offset:x}" if row.offset is not None else ""
+            return (None, row.category, row.class_name, row.method_name)[col]
+        if role == SORT_ROLE:
+            if col == 0: return row.severity
+            if col == 4: return row.count
+            if col == 5: return row.offset if row.offset is not None else -1
+            return (None, row.category, row.class_name, row.method_name)[col]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return ", ".join(sorted(row.rules))
+        if role == Qt.ItemDataRole.UserRole:
+            return row.method
+        return None
+
+    def group_key(self, key, row):
+        if self.grouping == "category":
+            return (row.category,)
+        if self.grouping == "class":
+            return (row.category, row.class_name)
+        return key
+
+    def grouped(self, key, row):
+        row = row.copy()
+        if self.grouping is not None:
+            row.method_name = ""
+            row.method = None
+            if self.grouping == "category":
+                row.class_name = ""
+        return self.group_key(key, row), row
+
+    def update(self, changes):
+        """Adds or replaces base rows; changes is [(key, ScanRow)]."""
+        if self.grouping is not None:
+            # Grouped rows are sums over base rows; rebuild only the groups that changed
+            affected = set()
+            for key, row in changes:
+                self.base[key] = row
+                group = self.group_key(key, row)
+                self.members.setdefault(group, set()).add(key)
+                affected.add(group)
+            changes = [(group, self.total(group)) for group in affected]
+        else:
+            for key, row in changes:
+                self.base[key] = row
+        new = []
+        for key, row in changes:
+            i = self.index_of.get(key)
+            if i is None:
+                new.append((key, row))
+            else:
+                self.rows[i] = (key, row)
+                self.dataChanged.emit(self.index(i, 0), self.index(i, len(self.HEADERS) - 1))
+        if new:
+            start = len(self.rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(new) - 1)
+            for key, row in new:
+                self.index_of[key] = len(self.rows)
+                self.rows.append((key, row))
+            self.endInsertRows()
+
+    def total(self, group):
+        keys = iter(self.members[group])
+        first = next(keys)
+        total = self.grouped(first, self.base[first])[1]
+        for key in keys:
+            total.merge(self.base[key])
+        return total
+
+    def set_grouping(self, grouping):
+        self.beginResetModel()
+        self.grouping = grouping
+        self.members = {}
+        for key, row in self.base.items():
+            self.members.setdefault(self.group_key(key, row), set()).add(key)
+        self.rows = [(group, self.total(group)) for group in self.members] if grouping else list(self.base.items())
+        self.index_of = {key: i for i, (key, _) in enumerate(self.rows)}
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.base = {}
+        self.members = {}
+        self.rows = []
+        self.index_of = {}
+        self.endResetModel()
 
 class ScannerTab(QWidget):
     methodSelected = pyqtSignal(object)
+    # Path of a rule pack the user added, to be remembered
+    rulePackAdded = pyqtSignal(str)
 
-    def __init__(self, dx):
+    def __init__(self, dx, artifacts=None, digests=None, apk=None, rule_packs=(), apk_path=None, apk_hash=None,
+                 parallel=None):
         super().__init__()
         self.dx = dx
+        self.artifacts = artifacts
+        self.digests = digests
+        self.apk = apk
+        self.apk_path = apk_path
+        self.apk_hash = apk_hash
+        # ShardedScan arguments for scanning large apps in worker processes, or None
+        self.parallel = parallel
+        self.rule_packs = list(rule_packs)
+        self.ruleset = None
+        self.findings = []
+        self.quiet = False
         self.setup_ui()
+        self.restore_previous_scan()
+
+    def restore_previous_scan(self):
+        """Replays the cached results of an earlier scan of this APK with the same rules."""
+        if self.artifacts is None or not self.apk_hash: return
+        self.load_rules()
+        if self.artifacts.get(self.apk_hash, scan_marker(self.ruleset)) is None: return
+        self.quiet = True
+        self.start_scan()
 
     def setup_ui(self):
         layout = QVBoxLayout()
-        
+
+        h_layout = QHBoxLayout()
         self.btn_scan = QPushButton("Start Security Scan")
         self.btn_scan.clicked.connect(self.start_scan)
-        layout.addWidget(self.btn_scan)
-        
+        h_layout.addWidget(self.btn_scan, 1)
+        self.btn_stop = QPushButton("Stop")
+        self.btn_stop.clicked.connect(self.stop_scan)
+        self.btn_stop.hide()
+        h_layout.addWidget(self.btn_stop)
+        btn_rules = QPushButton("Add Rule Pack...")
+        btn_rules.setToolTip("Load rules from a .json or .yml rule pack")
+        btn_rules.clicked.connect(self.add_rule_pack)
+        h_layout.addWidget(btn_rules)
+        self.btn_export = QPushButton("Export...")
+        self.btn_export.setToolTip("Save findings as SARIF or JSON")
+        self.btn_export.clicked.connect(self.export_results)
+        self.btn_export.setEnabled(False)
+        h_layout.addWidget(self.btn_export)
+        layout.addLayout(h_layout)
+
+        f_layout = QHBoxLayout()
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter results...")
+        f_layout.addWidget(self.filter_input, 1)
+        f_layout.addWidget(QLabel("Group by:"))
+        self.group_combo = QComboBox()
+        self.group_combo.addItems(["Method", "Class", "Category"])
+        self.group_combo.currentIndexChanged.connect(self.on_grouping_changed)
+        f_layout.addWidget(self.group_combo)
+        layout.addLayout(f_layout)
+
+        self.rules_label = QLabel("")
+        layout.addWidget(self.rules_label)
+
         self.progress = QProgressBar()
         self.progress.hide()
         layout.addWidget(self.progress)
-        
-        self.results = QListWidget()
-        self.results.itemDoubleClicked.connect(self.on_item_double_clicked)
+
+        self.model = ScanResultsModel()
+        self.proxy = QSortFilterProxyModel()
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setSortRole(SORT_ROLE)
+        self.proxy.setFilterKeyColumn(-1)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.filter_input.textChanged.connect(self.proxy.setFilterFixedString)
+        self.results = QTableView()
+        self.results.setModel(self.proxy)
+        self.results.setSortingEnabled(True)
+        self.results.sortByColumn(0, Qt.SortOrder.DescendingOrder)
+        self.results.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.results.verticalHeader().hide()
+        self.results.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
+        self.results.doubleClicked.connect(self.on_row_double_clicked)
         layout.addWidget(self.results)
-        
+
         self.setLayout(layout)
 
+    def load_rules(self):
+        errors = []
+        self.ruleset = load_ruleset(self.rule_packs, errors)
+        self.rules_label.setText(f"{len(self.ruleset)} rules")
+        if errors:
+            QMessageBox.warning(self, "Rule Packs", "Some rule packs were skipped:\n" + "\n".join(map(str, errors)))
+
+    def add_rule_pack(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Add Rule Pack", "", "Rule Packs (*.json *.yml *.yaml)")
+        if not path: return
+        try:
+            rules = load_pack(path)
+        except RuleError as e:
+            QMessageBox.warning(self, "Rule Packs", str(e))
+            return
+        if path not in self.rule_packs:
+            self.rule_packs.append(path)
+            self.rulePackAdded.emit(path)
+        self.ruleset = None
+        self.rules_label.setText(f"Added {len(rules)} rules from {path}")
+
     def start_scan(self):
-        self.results.clear()
+        if self.ruleset is None:
+            self.load_rules()
+        self.model.clear()
+        self.findings = []
         self.btn_scan.setEnabled(False)
+        self.btn_export.setEnabled(False)
+        self.btn_stop.show()
         self.progress.show()
-        
-        self.thread = ScannerThread(self.dx)
+
+        self.thread = ScannerThread(self.dx, self.ruleset, self.apk, self.artifacts, self.digests, self.apk_hash,
+                                    self.parallel)
         self.thread.progress.connect(self.progress.setValue)
-        self.thread.found.connect(self.on_found)
+        self.thread.batch.connect(self.model.update)
         self.thread.finished.connect(self.on_finished)
         self.thread.start()
 
-    def on_found(self, category, method, desc):
-        item = QListWidgetItem(f"[{category}] {method.get_class_name()}->{method.get_name()}")
-        item.setToolTip(desc)
-        item.setData(Qt.ItemDataRole.UserRole, method)
-        self.results.addItem(item)
+    def on_grouping_changed(self, index):
+        self.model.set_grouping(ScanResultsModel.GROUPINGS[index])
 
-    def on_finished(self):
+    def stop_scan(self):
+        self.thread.requestInterruption()
+        self.btn_stop.setEnabled(False)
+
+    def on_finished(self, findings, complete):
+        self.findings = findings
         self.btn_scan.setEnabled(True)
+        self.btn_export.setEnabled(bool(self.findings))
+        self.btn_stop.hide()
+        self.btn_stop.setEnabled(True)
         self.progress.hide()
-        QMessageBox.information(self, "Scan Complete", f"Found {self.results.count()} hotspots.")
+        methods = len({f.location for f in findings})
+        self.rules_label.setText(f"{len(self.ruleset)} rules, {len(findings)} findings in {methods} locations"
+                                 + ("" if complete else " (stopped)"))
+        if self.quiet or not complete:
+            self.quiet = False
+            return
+        QMessageBox.information(self, "Scan Complete", f"Found {len(findings)} findings in {methods} locations.")
+
+    def export_results(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Findings", "findings.sarif",
+                                              "SARIF (*.sarif);;JSON (*.json)")
+        if not path: return
+        try:
+            export_findings(path, self.findings, self.ruleset, self.apk_path)
+        except OSError as e:
+            QMessageBox.critical(self, "Export", f"Could not write {path}: {e}")
 
-    def on_item_double_clicked(self, item):
-        self.methodSelected.emit(item.data(Qt.ItemDataRole.UserRole))
+    def on_row_double_clicked(self, index):
+        method = index.data(Qt.ItemDataRole.UserRole)
+        if method is not None:
+            self.methodSelected.emit(method)
@@ -1,149 +1,637 @@
-from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QLineEdit, QListWidget, 
-                             QPushButton, QLabel, QProgressBar, QHBoxLayout, QMessageBox, QListWidgetItem,
-                             QComboBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from androguard.decompiler.dad.decompile import DvClass
-
-class SearchThread(QThread):
-    finished = pyqtSignal(list)
-    progress = pyqtSignal(int)
-    
-    def __init__(self, dx, query):
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QLineEdit, QListView,
+                             QPushButton, QLabel, QProgressBar, QHBoxLayout, QMessageBox,
+                             QComboBox, QCheckBox, QWidget)
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QAbstractListModel, QModelIndex
+from core.bytecode_index import BytecodeIndex
+from core.decompile_pool import DecompilerPool, PoolClosed
+from core.decompiler_cache import decompile
+from core.text_index import line_matcher, match_lines
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+import logging
+import re
+import time
+
+logger = logging.getLogger("Search")
+
+class SearchCancelled(Exception):
+    pass
+
+def format_result(result):
+    type_, obj, *detail = result
+    name = str(obj.get_name())
+    if type_ == 'line':
+        line_no, snippet = detail[0]
+        return f"{name}:{line_no}  {snippet}"
+    if type_ == 'bytecode':
+        offset, ins = detail[0]
+        return f"{obj.get_class_name()}->{name}{obj.get_descriptor()} +0x{offset:x}  {ins}"
+    if type_ == 'symbol':
+        kind, display = detail[0]
+        return f"[{kind}] {display}"
+    if type_ == 'string':
+        value, offset = detail[0]
+        where = f" +0x{offset:x}" if offset is not None else ""
+        return f"{obj.get_class_name()}->{name}{obj.get_descriptor()}{where}  {value[:120]!r}"
+    return f"[{type_}] {name}"
+
+def open_type(result):
+    """'method' or 'class': how the main window should open a result."""
+    type_ = result[0]
+    if type_ in ('bytecode', 'string'):
+        return 'method'
+    if type_ == 'symbol':
+        return result[2][0]
+    return type_
+
+class SearchResultsModel(QAbstractListModel):
+    """Result tuples appended in batches; display text is only built for visible rows."""
+
+    def __init__(self):
+        super().__init__()
+        self.results = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.results)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid(): return None
+        result = self.results[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return format_result(result)
+        if role == Qt.ItemDataRole.UserRole:
+            return open_type(result), result[1]
+        return None
+
+    def append(self, results):
+        if not results: return
+        start = len(self.results)
+        self.beginInsertRows(QModelIndex(), start, start + len(results) - 1)
+        self.results.extend(results)
+        self.endInsertRows()
+
+    def set_results(self, results):
+        self.beginResetModel()
+        self.results = list(results)
+        self.endResetModel()
+
+class StreamingSearchThread(QThread):
+    """Runs the generator made by results(), emitting matches in batches as they are found.
+
+    The thread stops after limit results; resume(n) restarts it on the same
+    generator for n more, so "load more" never repeats work already done.
+    The generator may yield None as a heartbeat so pending matches are flushed
+    while it is busy with work that finds nothing.
+    """
+    batch = pyqtSignal(list)
+    progress = pyqtSignal(int, str)
+    # results delivered so far, whether the generator may have more
+    finished = pyqtSignal(int, bool)
+
+    # Seconds between batches; the first match is always sent right away
+    BATCH_INTERVAL = 0.1
+
+    def __init__(self, results, limit=1000):
         super().__init__()
+        self.make_results = results
+        self.limit = limit
+        self.delivered = 0
+        self._results = None
+
+    def check_cancelled(self):
+        if self.isInterruptionRequested():
+            raise SearchCancelled()
+
+    def resume(self, count):
+        self.limit = self.delivered + count
+        self.start()
+
+    def cancel(self):
+        """Stops the search for good, releasing what the generator holds (e.g. worker processes)."""
+        self.requestInterruption()
+        if not self.isRunning() and self._results is not None:
+            self._results.close()
+
+    def run(self):
+        pending = []
+        last_emit = 0.0
+        more = False
+        try:
+            if self._results is None:
+                self._results = self.make_results()
+            for result in self._results:
+                if self.isInterruptionRequested(): break
+                if result is not None:
+                    pending.append(result)
+                    self.delivered += 1
+                now = time.perf_counter()
+                if pending and (not last_emit or now - last_emit >= self.BATCH_INTERVAL):
+                    self.batch.emit(pending)
+                    pending = []
+                    last_emit = now
+                if self.delivered >= self.limit:
+                    more = True
+                    break
+        except SearchCancelled:
+            pass
+        except Exception as e:
+            logger.error(f"Search failed: {type(e).__name__}: {e}")
+        finally:
+            # Always reported, so the dialog never stays in its searching state
+            if self.isInterruptionRequested() and self._results is not None:
+                self._results.close()
+            if pending:
+                self.batch.emit(pending)
+            self.finished.emit(self.delivered, more)
+
+class SearchThread(StreamingSearchThread):
+    def __init__(self, dx, query, limit=1000):
+        super().__init__(self.results, limit)
         self.dx = dx
         self.query = query.lower()
-        
-    def run(self):
-        results = []
+
+    def results(self):
         classes = list(self.dx.get_classes())
         total = len(classes)
-        
+
         for i, c in enumerate(classes):
             if i % 100 == 0:
-                self.progress.emit(int((i / total) * 100))
+                self.progress.emit(int((i / total) * 100), "")
+                yield None
             c_name = str(c.name)
             if self.query in c_name.lower():
-                results.append(('class', c.get_vm_class()))
+                yield ('class', c.get_vm_class())
             for m in c.get_methods():
                 m_name = str(m.name)
                 if self.query in m_name.lower():
-                    results.append(('method', m.get_method()))
-        self.finished.emit(results)
+                    yield ('method', m.get_method())
 
-class FullTextSearchThread(QThread):
-    finished = pyqtSignal(list)
-    progress = pyqtSignal(int, str)
-    
-    def __init__(self, dx, query):
-        super().__init__()
+class FullTextSearchThread(StreamingSearchThread):
+    # Below this many classes to decompile, starting worker processes costs more than it saves
+    PARALLEL_MIN_CLASSES = 200
+
+    def __init__(self, dx, query, decompiler=None, apk_hash=None, index=None, regex=False, limit=1000,
+                 pool_options=None):
+        super().__init__(self.results, limit)
         self.dx = dx
-        self.query = query.lower()
-        
-    def run(self):
-        results = []
-        classes = list(self.dx.get_classes())
-        total = len(classes)
-        
-        for i, c_analysis in enumerate(classes):
+        self.query = query
+        self.decompiler = decompiler
+        self.apk_hash = apk_hash
+        self.index = index
+        self.regex = regex
+        # DecompilerPool arguments (apk_path, workers, limits...) for searching in worker processes
+        self.pool_options = pool_options
+
+    def source_for(self, cls):
+        """(source, complete); fallback sources are searched but not indexed."""
+        if self.decompiler is not None:
+            return self.decompiler.source_complete(self.apk_hash, cls, self.dx)
+        return decompile(cls, self.dx), True
+
+    def cached(self, name):
+        if self.decompiler is None or not self.apk_hash:
+            return None
+        return self.decompiler.get(self.apk_hash, name)
+
+    def remember(self, name, source):
+        # Sources found by a one-off search feed the cache and index for the next one
+        if self.decompiler is not None and self.apk_hash:
+            self.decompiler.put(self.apk_hash, name, source)
+        if self.index is not None:
+            self.index.add(name, source)
+
+    def use_processes(self, names):
+        if not self.pool_options or self.pool_options.get("workers", 1) < 2: return False
+        if len(names) < self.PARALLEL_MIN_CLASSES: return False
+        uncached = len(names)
+        if self.decompiler is not None and self.apk_hash:
+            uncached -= len(self.decompiler.cached_names(self.apk_hash, names))
+        return uncached >= self.PARALLEL_MIN_CLASSES
+
+    def results(self):
+        # results: ('line', class, (line_no, snippet))
+        matcher = line_matcher(self.query, self.regex)
+
+        classes = {str(c.name): c for c in self.dx.get_classes() if not c.is_external()}
+        try:
+            if self.index is not None:
+                self.progress.emit(0, "Querying index...")
+                def cached_source(name):
+                    return self.source_for(classes[name].get_vm_class())[0]
+                for name, line_no, snippet in self.index.search(self.query, cached_source, self.regex,
+                                                                self.check_cancelled):
+                    yield ('line', classes[name].get_vm_class(), (line_no, snippet))
+                # Classes the index has not seen yet are decompiled (and indexed) now
+                remaining = [name for name in classes if not self.index.contains(name)]
+            else:
+                remaining = list(classes)
+
+            if self.use_processes(remaining):
+                yield from self.pool_results(remaining, classes, matcher)
+            else:
+                yield from self.local_results(remaining, classes, matcher)
+        finally:
+            if self.decompiler is not None:
+                self.decompiler.flush()
+
+    def local_results(self, names, classes, matcher):
+        """Decompiles and matches names in this thread."""
+        total = len(names)
+        for i, name in enumerate(names):
+            self.check_cancelled()
             if i % 10 == 0:
-                self.progress.emit(int((i / total) * 100), str(c_analysis.name))
-            
+                self.progress.emit(int((i / total) * 100), name)
+
             try:
-                cls = c_analysis.get_vm_class()
-                dv = DvClass(cls, self.dx)
-                dv.process()
-                source = dv.get_source().lower()
-                
-                if self.query in source:
-                    results.append(('class', cls))
+                cls = classes[name].get_vm_class()
+                source, complete = self.source_for(cls)
+                if complete and self.index is not None:
+                    self.index.add(name, source)
+                matches = list(match_lines(name, source, matcher))
             except Exception:
                 continue
-                
-        self.finished.emit(results)
+            for _, line_no, snippet in matches:
+                yield ('line', cls, (line_no, snippet))
+            yield None
+
+    def open_pool(self):
+        """(pool, release): the session's pool grown to the search's worker count, or a pool of its own."""
+        options = dict(self.pool_options)
+        shared = options.pop("pool", None)
+        if shared is not None:
+            previous = shared.workers
+            shared.resize(max(previous, options["workers"]))
+            return shared, lambda: shared.resize(previous)
+        pool = DecompilerPool(**options)
+        return pool, pool.close
+
+    def pool_results(self, names, classes, matcher):
+        """Decompiles and matches names in worker processes, yielding matches as classes complete.
+
+        Every worker holds a copy of the analysis, so the workers are released
+        as soon as the result limit is reached rather than kept while the
+        search waits for "Load more"; they are started again on resume. If
+        the pool shuts down (its session was evicted, or its workers cannot
+        start), the classes not searched yet are searched in this thread.
+        """
+        pool = release = None
+        pending = deque(names)
+        # Classes the pool returned unsearched because it closed
+        unsearched = []
+        in_flight = {}  # future -> name
+        window = self.pool_options["workers"] * 4
+        total = len(names)
+        done_count = 0
+
+        def park():
+            # Unfinished classes go back to the queue
+            for future, name in in_flight.items():
+                future.cancel()
+                pending.appendleft(name)
+            in_flight.clear()
+            release()
+        try:
+            while True:
+                while len(in_flight) < window and pending and not (pool is not None and pool.closed):
+                    name = pending.popleft()
+                    source = self.cached(name)
+                    if source is not None:
+                        # Cached classes are matched here; no need to ship them to a worker
+                        done_count += 1
+                        for _, line_no, snippet in match_lines(name, source, matcher):
+                            yield ('line', classes[name].get_vm_class(), (line_no, snippet))
+                        continue
+                    if pool is None:
+                        pool, release = self.open_pool()
+                    try:
+                        in_flight[pool.submit_search(name, self.query, self.regex)] = name
+                    except PoolClosed:
+                        pending.appendleft(name)
+                if pool is not None and pool.closed:
+                    logger.warning("Decompiler pool closed during a search, searching the rest in-process")
+                    rest = unsearched + list(in_flight.values()) + list(pending)
+                    in_flight.clear()
+                    release()
+                    pool = None
+                    yield from self.local_results(rest, classes, matcher)
+                    return
+                if not in_flight: return
+                done, _ = wait(list(in_flight), timeout=0.2, return_when=FIRST_COMPLETED)
+                self.check_cancelled()
+                finished = []
+                for future in done:
+                    name = in_flight.pop(future)
+                    done_count += 1
+                    payload, complete = future.result()
+                    if complete:
+                        finished.append((name, payload))
+                    elif pool.closed:
+                        done_count -= 1
+                        unsearched.append(name)
+                workers = pool.workers
+                for name, (matches, source) in finished:
+                    self.remember(name, source)
+                    cls = classes[name].get_vm_class()
+                    for line_no, snippet in matches:
+                        if pool is not None and self.delivered >= self.limit - 1:
+                            # The thread stops after this result
+                            park()
+                            pool = None
+                        yield ('line', cls, (line_no, snippet))
+                self.progress.emit(int(done_count * 100 / total),
+                                   f"{done_count}/{total} classes ({workers} processes)")
+                yield None
+        finally:
+            if pool is not None:
+                park()
+
+class BytecodeSearchThread(StreamingSearchThread):
+    # The BytecodeIndex built by this thread when none was available yet
+    indexed = pyqtSignal(object)
+
+    def __init__(self, dx, index, opcodes, operand, target, limit=1000):
+        super().__init__(self.results, limit)
+        self.dx = dx
+        self.index = index
+        self.opcodes = opcodes
+        self.operand = operand
+        self.target = target
+
+    def results(self):
+        # results: ('bytecode', method, (offset, "opcode operand"))
+        if self.index is None:
+            self.progress.emit(0, "Indexing instructions...")
+            classes = [c.get_vm_class() for c in self.dx.get_classes() if not c.is_external()]
+            self.index = BytecodeIndex.build(classes, self.check_cancelled)
+            self.indexed.emit(self.index)
+        self.progress.emit(50, "Querying bytecode index...")
+        for i in self.index.search(self.opcodes, self.operand, self.target, self.check_cancelled):
+            method, offset, opcode, operand = self.index.entry(i)
+            yield ('bytecode', method, (offset, f"{opcode} {operand}"))
+
+class StringXrefThread(StreamingSearchThread):
+    """Every code reference to the strings matching a query, or to the given StringTable rows."""
+
+    def __init__(self, table, query="", regex=False, rows=None, limit=1000):
+        super().__init__(self.results, limit)
+        self.table = table
+        self.query = query
+        self.regex = regex
+        self.rows = rows
+
+    def results(self):
+        table = self.table
+        rows = self.rows if self.rows is not None else table.query(self.query, self.regex,
+                                                                    check_cancelled=self.check_cancelled)
+        total = len(rows)
+        for n, row in enumerate(rows):
+            if n % 1000 == 0:
+                self.progress.emit(int((n / total) * 100), "")
+                yield None
+            value = table.values[row]
+            for _, method, offset in table.xrefs(row):
+                yield ('string', method, (value, offset))
 
 class SearchDialog(QDialog):
-    def __init__(self, parent, dx):
+    SYMBOLS, FULLTEXT, BYTECODE, STRINGS = range(4)
+
+    def __init__(self, parent, dx, decompiler=None, apk_hash=None, text_index=None, symbol_index=None,
+                 bytecode_index=None, result_limit=1000, pool_options=None, string_table=None):
         super().__init__(parent)
         self.setWindowTitle("Search Symbols & Code")
         self.resize(600, 600)
         self.dx = dx
+        self.decompiler = decompiler
+        self.apk_hash = apk_hash
+        self.text_index = text_index
+        self.symbol_index = symbol_index
+        self.bytecode_index = bytecode_index
+        # StringTable of the analysis; None while it is being built
+        self.string_table = string_table
+        # Results shown per search and per "Load more"
+        self.result_limit = result_limit
+        self.symbol_limit = result_limit
+        # DecompilerPool arguments for full-text searches that have to decompile many classes
+        self.pool_options = pool_options
+        self.thread = None
+        self.search_started = 0.0
         self.selected_obj = None
         self.selected_type = None
-        
+
         self.setup_ui()
 
     def setup_ui(self):
         layout = QVBoxLayout()
-        
+
         h_layout = QHBoxLayout()
         self.search_mode = QComboBox()
-        self.search_mode.addItems(["Symbol Names (Fast)", "Full-Text Code (Slow)"])
+        self.search_mode.addItems(["Symbol Names (Fast)", self.fulltext_label(), "Bytecode Instructions",
+                                   "String References"])
         h_layout.addWidget(QLabel("Mode:"))
         h_layout.addWidget(self.search_mode, 1)
+        self.search_mode.currentIndexChanged.connect(self.on_mode_changed)
+        self.regex_check = QCheckBox("Regex")
+        self.regex_check.setToolTip("Full-text and strings: treat the query as a case-insensitive regular expression")
+        h_layout.addWidget(self.regex_check)
         layout.addLayout(h_layout)
-        
+
         self.query_input = QLineEdit()
         self.query_input.setPlaceholderText("Search query...")
         self.query_input.returnPressed.connect(self.start_search)
+        # With a symbol index, symbol mode filters as you type
+        self.query_input.textChanged.connect(self.on_query_changed)
         layout.addWidget(self.query_input)
-        
+
+        # Bytecode mode: the query is an operand regex, narrowed by opcodes and/or an invoke target
+        self.bytecode_row = QWidget()
+        b_layout = QHBoxLayout(self.bytecode_row)
+        b_layout.setContentsMargins(0, 0, 0, 0)
+        self.opcode_input = QLineEdit()
+        self.opcode_input.setPlaceholderText("Opcodes, e.g. invoke-*, const-string")
+        self.opcode_input.returnPressed.connect(self.start_search)
+        self.target_input = QLineEdit()
+        self.target_input.setPlaceholderText("Invokes, e.g. Ljava/lang/Runtime;->exec")
+        self.target_input.returnPressed.connect(self.start_search)
+        b_layout.addWidget(self.opcode_input)
+        b_layout.addWidget(self.target_input)
+        self.bytecode_row.hide()
+        layout.addWidget(self.bytecode_row)
+
+        btn_layout = QHBoxLayout()
         btn_search = QPushButton("Search")
         btn_search.clicked.connect(self.start_search)
-        layout.addWidget(btn_search)
-        
+        btn_layout.addWidget(btn_search, 1)
+        self.btn_stop = QPushButton("Stop")
+        self.btn_stop.clicked.connect(self.stop_search)
+        self.btn_stop.hide()
+        btn_layout.addWidget(self.btn_stop)
+        layout.addLayout(btn_layout)
+
         self.progress_label = QLabel("")
         self.progress_label.hide()
         layout.addWidget(self.progress_label)
-        
+
         self.progress = QProgressBar()
         self.progress.hide()
         layout.addWidget(self.progress)
-        
-        self.results_list = QListWidget()
-        self.results_list.itemDoubleClicked.connect(self.on_item_double_clicked)
-        layout.addWidget(self.results_list)
-        
+
+        self.model = SearchResultsModel()
+        self.results_view = QListView()
+        # Rows all have one line of text; lets the view skip measuring each of them
+        self.results_view.setUniformItemSizes(True)
+        self.results_view.setModel(self.model)
+        self.results_view.doubleClicked.connect(self.on_result_activated)
+        layout.addWidget(self.results_view)
+
+        self.btn_more = QPushButton("Load more")
+        self.btn_more.clicked.connect(self.load_more)
+        self.btn_more.hide()
+        layout.addWidget(self.btn_more)
+
         self.setLayout(layout)
 
+    def on_mode_changed(self, mode):
+        bytecode = mode == self.BYTECODE
+        self.bytecode_row.setVisible(bytecode)
+        self.regex_check.setEnabled(mode in (self.FULLTEXT, self.STRINGS))
+        self.query_input.setPlaceholderText("Operand regex, e.g. \"https?://" if bytecode else "Search query...")
+        self.on_query_changed(self.query_input.text())
+
+    def on_query_changed(self, text):
+        if self.search_mode.currentIndex() != self.SYMBOLS or self.symbol_index is None: return
+        self.stop_search()
+        self.symbol_limit = self.result_limit
+        self.show_symbols(text)
+
+    def show_symbols(self, text):
+        started = time.perf_counter()
+        ids = self.symbol_index.search(text, self.symbol_limit)
+        results = []
+        for i in ids:
+            kind, display, obj = self.symbol_index.entry(i)
+            results.append(('symbol', obj, (kind, display)))
+        self.model.set_results(results)
+        self.btn_more.setVisible(len(ids) >= self.symbol_limit)
+        if text.strip():
+            elapsed = (time.perf_counter() - started) * 1000
+            self.progress_label.setText(f"{len(ids)} best matches ({elapsed:.0f} ms)")
+            self.progress_label.show()
+        else:
+            self.progress_label.hide()
+
+    def fulltext_label(self):
+        index = self.text_index
+        if index is None or not index.names:
+            return "Full-Text Code (Slow)"
+        if index.complete:
+            return "Full-Text Code (Indexed)"
+        return f"Full-Text Code (index {len(index) * 100 // len(index.names)}% built)"
+
     def start_search(self):
         query = self.query_input.text().strip()
-        if not query: return
-        
-        self.results_list.clear()
-        self.progress.setValue(0)
-        self.progress.show()
-        
-        if self.search_mode.currentIndex() == 0:
-            self.progress_label.hide()
-            self.thread = SearchThread(self.dx, query)
-            self.thread.progress.connect(self.progress.setValue)
+        mode = self.search_mode.currentIndex()
+        if mode == self.BYTECODE:
+            if not (query or self.opcode_input.text().strip() or self.target_input.text().strip()): return
+        elif not query: return
+        regex = ((mode in (self.FULLTEXT, self.STRINGS) and self.regex_check.isChecked())
+                 or (mode == self.BYTECODE and bool(query)))
+        if regex:
+            try:
+                re.compile(query)
+            except re.error as e:
+                QMessageBox.warning(self, "Search", f"Invalid regular expression: {e}")
+                return
+        if mode == self.STRINGS and self.string_table is None:
+            QMessageBox.information(self, "Search", "Strings are still being loaded; try again in a moment.")
+            return
+
+        self.stop_search()
+        self.model.set_results([])
+        self.btn_more.hide()
+
+        if mode == self.SYMBOLS and self.symbol_index is not None:
+            self.symbol_limit = self.result_limit
+            self.show_symbols(query)
+            return
+        if mode == self.SYMBOLS:
+            self.thread = SearchThread(self.dx, query, self.result_limit)
+        elif mode == self.BYTECODE:
+            self.thread = BytecodeSearchThread(self.dx, self.bytecode_index, self.opcode_input.text(), query,
+                                               self.target_input.text(), self.result_limit)
+            self.thread.indexed.connect(self.on_bytecode_indexed)
+        elif mode == self.STRINGS:
+            self.thread = StringXrefThread(self.string_table, query, regex, limit=self.result_limit)
         else:
-            self.progress_label.show()
-            self.thread = FullTextSearchThread(self.dx, query)
-            self.thread.progress.connect(self.on_fulltext_progress)
-            
+            self.search_mode.setItemText(self.FULLTEXT, self.fulltext_label())
+            self.thread = FullTextSearchThread(self.dx, query, self.decompiler, self.apk_hash,
+                                               self.text_index, regex, self.result_limit, self.pool_options)
+
+        self.thread.progress.connect(self.on_search_progress)
+        self.thread.batch.connect(self.on_batch)
         self.thread.finished.connect(self.on_search_finished)
-        self.thread.start()
+        self.run_thread(self.thread.start)
+
+    def run_thread(self, start):
+        self.progress.setValue(0)
+        self.progress.show()
+        self.progress_label.setText("Searching...")
+        self.progress_label.show()
+        self.btn_stop.show()
+        self.search_started = time.perf_counter()
+        start()
+
+    def load_more(self):
+        if self.search_mode.currentIndex() == self.SYMBOLS and self.symbol_index is not None:
+            self.symbol_limit += self.result_limit
+            self.show_symbols(self.query_input.text())
+            return
+        if self.thread is None or self.thread.isRunning(): return
+        self.btn_more.hide()
+        self.run_thread(lambda: self.thread.resume(self.result_limit))
+
+    def stop_search(self):
+        """Stops the current search; results found so far stay listed."""
+        if self.thread is not None:
+            self.thread.cancel()
+
+    def is_current_search(self):
+        # Batches already queued by a stopped thread may still be delivered
+        return self.sender() is self.thread
 
-    def on_fulltext_progress(self, val, cls_name):
+    def on_bytecode_indexed(self, index):
+        self.bytecode_index = index
+
+    def on_search_progress(self, val, cls_name):
+        if not self.is_current_search(): return
         self.progress.setValue(val)
-        self.progress_label.setText(f"Searching: {cls_name}")
+        if cls_name:
+            self.progress_label.setText(f"Searching: {cls_name}")
+
+    def on_batch(self, results):
+        if not self.is_current_search(): return
+        self.model.append(results)
 
-    def on_search_finished(self, results):
+    def on_search_finished(self, count, more):
+        if not self.is_current_search(): return
         self.progress.hide()
-        self.progress_label.hide()
-        if not results:
+        self.btn_stop.hide()
+        elapsed = time.perf_counter() - self.search_started
+        stopped = " (stopped)" if self.thread.isInterruptionRequested() else ""
+        if not count and not stopped:
+            self.progress_label.hide()
             QMessageBox.information(self, "Search", "No results found.")
             return
-            
-        for type_, obj in results:
-            name = str(obj.get_name())
-            item = QListWidgetItem(f"[{type_}] {name}")
-            item.setData(Qt.ItemDataRole.UserRole, (type_, obj))
-            self.results_list.addItem(item)
-
-    def on_item_double_clicked(self, item):
-        type_, obj = item.data(Qt.ItemDataRole.UserRole)
+        self.btn_more.setVisible(more)
+        self.progress_label.setText(f"{count} results in {elapsed:.1f}s{stopped}"
+                                    + (", more available" if more else ""))
+        self.progress_label.show()
+
+    def on_result_activated(self, index):
+        type_, obj = index.data(Qt.ItemDataRole.UserRole)
         self.selected_type = type_
         self.selected_obj = obj
-        self.accept()
\ No newline at end of file
+        self.accept()
+
+    def done(self, result):
+        self.stop_search()
+        super().done(result)
@@ -1,67 +1,244 @@
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLineEdit, QTableWidget, 
-                             QTableWidgetItem, QHeaderView, QPushButton, QHBoxLayout)
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLineEdit, QTableView, QHeaderView, QHBoxLayout, QLabel,
+                             QCheckBox, QComboBox, QDialog, QListView)
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal, QAbstractTableModel, QModelIndex
+from array import array
+import re
+from core.string_features import CHARSETS, HIGH_ENTROPY, KIND_LABELS
+from core.strings_table import StringTable
+from gui.widgets.search_dialog import SearchResultsModel, StringXrefThread
+
+class FilterCancelled(Exception):
+    pass
+
+class StringsModel(QAbstractTableModel):
+    """Rows of a StringTable, as an array of row ids; cells are read from the table on demand."""
+    # (column, descending) requested through the header; sorting runs off the GUI thread
+    sortRequested = pyqtSignal(int, bool)
+
+    def __init__(self):
+        super().__init__()
+        self.table = None
+        self.rows = array("I")
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(StringTable.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return StringTable.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid(): return None
+        row = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            value = self.table.cell(row, index.column())
+            return value[:500] if index.column() == 0 else value
+        if role == Qt.ItemDataRole.ToolTipRole and index.column() == 0:
+            return self.table.values[row][:2000]
+        if role == Qt.ItemDataRole.UserRole:
+            return self.table.objects[row]
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.sortRequested.emit(column, order == Qt.SortOrder.DescendingOrder)
+
+    def set_rows(self, table, rows):
+        self.beginResetModel()
+        self.table = table
+        self.rows = rows
+        self.endResetModel()
+
+class StringFilterThread(QThread):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, table, text, column=None, descending=False, regex=False, kind=None, charset=None):
+        super().__init__()
+        self.table = table
+        self.text = text
+        self.column = column
+        self.descending = descending
+        self.regex = regex
+        self.kind = kind
+        self.charset = charset
+
+    def check_cancelled(self):
+        if self.isInterruptionRequested():
+            raise FilterCancelled()
+
+    def run(self):
+        try:
+            rows = self.table.query(self.text, self.regex, self.kind, self.charset, self.check_cancelled)
+            if self.column is not None:
+                self.check_cancelled()
+                rows = self.table.sort(rows, self.column, self.descending)
+        except FilterCancelled:
+            return
+        except re.error as e:
+            self.failed.emit(f"Invalid regex: {e}")
+            return
+        self.finished.emit(rows)
+
+class StringXrefsDialog(QDialog):
+    """Lists every method referencing one string, filled in by a background thread."""
+    methodSelected = pyqtSignal(object)
+
+    def __init__(self, parent, table, row):
+        super().__init__(parent)
+        self.setWindowTitle(f"References to {table.values[row][:60]!r}")
+        self.resize(700, 400)
+        layout = QVBoxLayout()
+        self.label = QLabel(f"{table.xref_count(row)} references")
+        layout.addWidget(self.label)
+        self.model = SearchResultsModel()
+        view = QListView()
+        view.setUniformItemSizes(True)
+        view.setModel(self.model)
+        view.doubleClicked.connect(self.on_result_activated)
+        layout.addWidget(view)
+        self.setLayout(layout)
+
+        self.thread = StringXrefThread(table, rows=[row], limit=table.xref_count(row))
+        self.thread.batch.connect(self.model.append)
+        self.thread.start()
+
+    def on_result_activated(self, index):
+        _, method = index.data(Qt.ItemDataRole.UserRole)
+        self.methodSelected.emit(method)
+
+    def done(self, result):
+        self.thread.cancel()
+        self.thread.wait()
+        super().done(result)
 
 class StringsView(QWidget):
     stringClicked = pyqtSignal(object)
 
+    FILTER_DELAY_MS = 200
+
     def __init__(self, analysis):
         super().__init__()
         self.analysis = analysis
+        self.table = None
+        self.sort_column = None
+        self.sort_descending = False
+        self.filter_thread = None
+        # Superseded filter threads and xref listings stay referenced until they stop
+        self.threads = []
         self.setup_ui()
-        self.populate()
 
     def setup_ui(self):
         layout = QVBoxLayout()
-        
+
+        h_layout = QHBoxLayout()
         self.filter_input = QLineEdit()
         self.filter_input.setPlaceholderText("Search strings...")
-        self.filter_input.textChanged.connect(self.filter_strings)
-        layout.addWidget(self.filter_input)
-        
-        self.table = QTableWidget()
-        self.table.setColumnCount(1)
-        self.table.setHorizontalHeaderLabels(["String"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table.cellDoubleClicked.connect(self.on_cell_double_clicked)
-        layout.addWidget(self.table)
-        
+        h_layout.addWidget(self.filter_input, 1)
+        self.regex_check = QCheckBox("Regex")
+        self.regex_check.toggled.connect(self.run_filter)
+        h_layout.addWidget(self.regex_check)
+        # Facets are filled in once the strings are classified
+        self.kind_combo = QComboBox()
+        self.kind_combo.addItem("All kinds", None)
+        self.kind_combo.setEnabled(False)
+        self.kind_combo.currentIndexChanged.connect(self.run_filter)
+        h_layout.addWidget(self.kind_combo)
+        self.charset_combo = QComboBox()
+        self.charset_combo.addItem("Any charset", None)
+        self.charset_combo.setEnabled(False)
+        self.charset_combo.currentIndexChanged.connect(self.run_filter)
+        h_layout.addWidget(self.charset_combo)
+        self.count_label = QLabel("Loading strings...")
+        h_layout.addWidget(self.count_label)
+        layout.addLayout(h_layout)
+
+        # Filtering starts once typing pauses
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(self.FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self.run_filter)
+        self.filter_input.textChanged.connect(lambda: self.filter_timer.start())
+
+        self.model = StringsModel()
+        self.model.sortRequested.connect(self.on_sort_requested)
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        # Unsorted (row order) until a header is clicked
+        self.view.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.view.setSortingEnabled(True)
+        self.view.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.view.setWordWrap(False)
+        self.view.verticalHeader().hide()
+        self.view.verticalHeader().setDefaultSectionSize(self.view.fontMetrics().height() + 6)
+        self.view.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.view.doubleClicked.connect(self.on_row_double_clicked)
+        layout.addWidget(self.view)
+
         self.setLayout(layout)
 
-    def populate(self):
-        if not self.analysis:
-            return
-            
-        
-        
-        self.strings = []
-        for s in self.analysis.get_strings():
-            self.strings.append(s)
-            
-        self.update_table(self.strings)
-
-    def update_table(self, strings_list):
-        self.table.setRowCount(0)
-        limit = 1000
-        self.table.setRowCount(min(len(strings_list), limit))
-        
-        for i, s in enumerate(strings_list[:limit]):
-            val = str(s.get_value())
-            item = QTableWidgetItem(val)
-            item.setData(Qt.ItemDataRole.UserRole, s)
-            self.table.setItem(i, 0, item)
-
-    def filter_strings(self, text):
-        filtered = [s for s in self.strings if text.lower() in str(s.get_value()).lower()]
-        self.update_table(filtered)
-
-    def on_cell_double_clicked(self, row, col):
-        item = self.table.item(row, 0)
-        s_obj = item.data(Qt.ItemDataRole.UserRole)
-        
-        xrefs = s_obj.get_xref_from()
-        
-        if xrefs:
-            class_analysis, method_analysis, offset = next(iter(xrefs))
-            
-            self.stringClicked.emit(method_analysis.get_method())
+    def set_table(self, table):
+        self.table = table
+        self.run_filter()
+
+    def set_indexed(self, table):
+        """Offers the facets of a classified table."""
+        if table is not self.table: return
+        for combo in (self.kind_combo, self.charset_combo):
+            combo.blockSignals(True)
+            while combo.count() > 1:
+                combo.removeItem(1)
+        labels = dict(KIND_LABELS, entropy=f"High entropy (≥ {HIGH_ENTROPY})")
+        for kind, label in labels.items():
+            self.kind_combo.addItem(f"{label} ({table.kind_counts[kind]})", kind)
+        for name in CHARSETS:
+            if table.charset_counts[name]:
+                self.charset_combo.addItem(f"{name.capitalize()} ({table.charset_counts[name]})", name)
+        for combo in (self.kind_combo, self.charset_combo):
+            combo.blockSignals(False)
+            combo.setEnabled(True)
+        # Entropy and kind columns are now filled
+        self.run_filter()
+
+    def run_filter(self):
+        if self.table is None: return
+        if self.filter_thread is not None:
+            self.filter_thread.requestInterruption()
+        self.threads = [t for t in self.threads if t.isRunning()]
+        self.filter_thread = StringFilterThread(self.table, self.filter_input.text(), self.sort_column,
+                                                self.sort_descending, self.regex_check.isChecked(),
+                                                self.kind_combo.currentData(), self.charset_combo.currentData())
+        self.filter_thread.finished.connect(self.on_filtered)
+        self.filter_thread.failed.connect(self.on_filter_failed)
+        self.threads.append(self.filter_thread)
+        self.filter_thread.start()
+
+    def on_filtered(self, rows):
+        if self.sender() is not self.filter_thread: return
+        self.model.set_rows(self.table, rows)
+        self.count_label.setText(f"{len(rows)} of {len(self.table)} strings")
+
+    def on_filter_failed(self, message):
+        if self.sender() is not self.filter_thread: return
+        self.count_label.setText(message)
+
+    def on_sort_requested(self, column, descending):
+        self.sort_column = column if column >= 0 else None
+        self.sort_descending = descending
+        self.run_filter()
+
+    def on_row_double_clicked(self, index):
+        row = self.model.rows[index.row()]
+        count = self.table.xref_count(row)
+        if count == 1:
+            _, method, _ = next(self.table.xrefs(row))
+            self.stringClicked.emit(method)
+        elif count:
+            dialog = StringXrefsDialog(self, self.table, row)
+            dialog.methodSelected.connect(self.stringClicked)
+            dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+            self.threads.append(dialog.thread)
+            dialog.show()
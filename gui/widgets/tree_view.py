@@ -51,10 +51,12 @@ class ProjectTree(QTreeWidget):
         dex_root = QTreeWidgetItem(self, ["Classes"])
         
         self.item_cache = {"": dex_root}
+        self.class_objs = {}
         
         for d in classes_dex:
             for cls in d.get_classes():
                 name = str(cls.get_name())
+                self.class_objs[name] = cls
                 clean_name = name[1:-1]
                 
                 parts = [str(p) for p in clean_name.split('/')]
@@ -79,3 +81,24 @@ class ProjectTree(QTreeWidget):
         new_item = QTreeWidgetItem(parent_item, [current_dir])
         self.item_cache[package_path] = new_item
         return new_item
+
+    def show_changes(self, changes):
+        """Adds a 'Changed Classes' root listing what differs from the previous version."""
+        root = QTreeWidgetItem(self, [f"Changed Classes ({changes.summary()})"])
+        root.setToolTip(0, f"Compared with previous version {changes.previous_hash[:12]}")
+        for label, names in (("Modified", changes.modified), ("Added", changes.added), ("Removed", changes.removed)):
+            if not names: continue
+            group = QTreeWidgetItem(root, [f"{label} ({len(names)})"])
+            for name in names:
+                item = QTreeWidgetItem(group, [name[1:-1].replace('/', '.')])
+                cls = self.class_objs.get(name)
+                if cls is not None:
+                    item.setData(0, Qt.ItemDataRole.UserRole, {'type': 'class', 'obj': cls})
+                else:
+                    item.setDisabled(True)
+                new_strings = changes.new_strings.get(name)
+                if new_strings:
+                    shown = "\n".join(new_strings[:30])
+                    more = f"\n... {len(new_strings) - 30} more" if len(new_strings) > 30 else ""
+                    item.setToolTip(0, f"New strings:\n{shown}{more}")
+        root.setExpanded(True)
@@ -10,7 +10,7 @@ echo "Installing Androguard GUI..."
 
 # Install Dependencies
 echo "Installing Python dependencies..."
-pip3 install androguard PyQt6 Pygments
+pip3 install "androguard>=3.3.5,<4" PyQt6 Pygments
 
 # Install Directory
 INSTALL_DIR="/opt/androguard_gui"
@@ -1,8 +1,7 @@
 import sys
+import argparse
 import logging
 import traceback
-from PyQt6.QtWidgets import QApplication, QMessageBox
-from gui.main_window import MainWindow
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,21 +15,48 @@ logger = logging.getLogger("Main")
 
 def exception_hook(exctype, value, tb):
     """Global exception handler to show a dialog instead of silent crash."""
+    from PyQt6.QtWidgets import QApplication, QMessageBox
     error_msg = "".join(traceback.format_exception(exctype, value, tb))
     logger.error(f"Uncaught exception:\n{error_msg}")
-    
+
     if QApplication.instance():
-        QMessageBox.critical(None, "Critical Error", 
+        QMessageBox.critical(None, "Critical Error",
                            f"An unexpected error occurred:\n{value}\n\nCheck androguard_gui.log for details.")
     sys.__excepthook__(exctype, value, tb)
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Androguard GUI")
+    parser.add_argument("--batch", metavar="DIR", help="Analyze every APK under DIR headlessly and exit")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes for --batch (default: CPU count)")
+    parser.add_argument("--out", default="reports", help="Output directory for --batch JSON reports")
+    parser.add_argument("--timeout", type=int, default=600, help="Per-APK timeout in seconds for --batch")
+    parser.add_argument("--memory-limit", type=int, default=None, metavar="MB",
+                        help="Per-APK address space limit in MB for --batch")
+    # Unknown arguments are left for Qt
+    return parser.parse_known_args(argv)
+
+def run_batch(args):
+    from core.batch import run_batch as run
+    summary = run(args.batch, args.out, jobs=args.jobs, timeout=args.timeout,
+                  memory_limit_mb=args.memory_limit)
+    logger.info(f"Batch finished: {summary['total']} APKs, {summary['statuses']}, "
+                f"{summary['apks_per_min']:.2f} APKs/min")
+    return 0 if summary["statuses"].get("ok", 0) == summary["total"] else 1
+
 def main():
+    args, qt_args = parse_args(sys.argv[1:])
+    if args.batch:
+        sys.exit(run_batch(args))
+
+    from PyQt6.QtWidgets import QApplication
+    from gui.main_window import MainWindow
+
     sys.excepthook = exception_hook
-    
-    app = QApplication(sys.argv)
+
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setApplicationName("Androguard GUI")
     app.setOrganizationName("Gemini")
-    
+
     try:
         window = MainWindow()
         window.showMaximized()